@@ -19,7 +19,6 @@ from .models import (
 admin.site.register(Location)
 admin.site.register(Hobbies)
 admin.site.register(EmailLog)
-admin.site.register(Personnel)
 admin.site.register(PersonnelAssignment)
 admin.site.register(FamilyMember)
 admin.site.register(SecondaryFamilyMember)
@@ -30,3 +29,20 @@ admin.site.register(Payments)
 admin.site.register(Sessions)
 admin.site.register(SessionTeams)
 admin.site.register(PlayerAssignment)
+
+
+@admin.register(Personnel)
+class PersonnelAdmin(admin.ModelAdmin):
+    list_display = ('first_name', 'last_name', 'role', 'location')
+    search_fields = ('first_name', 'last_name', 'email')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_current_assignment()
+
+    @admin.display(description='Current role', ordering='current_role_name')
+    def role(self, obj):
+        return obj.current_role()
+
+    @admin.display(description='Current location', ordering='current_location_name')
+    def location(self, obj):
+        return obj.current_location_name
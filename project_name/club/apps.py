@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class ClubConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'club'
+
+    def ready(self):
+        from . import signals
+        from .sqlite import apply_performance_profile
+        connection_created.connect(apply_performance_profile, dispatch_uid='sqlite_performance_profile')
+        post_migrate.connect(signals.restore_search_triggers, sender=self, dispatch_uid='restore_search_triggers')
+
@@ -0,0 +1,106 @@
+"""
+Lookups behind the autocomplete widgets of the team formation and player assignment forms.
+
+A source answers what the user typed with at most one page of (id, label) pairs, read through an index whatever
+the size of its table: the person search index for members and coaches, the index on the lowercased name for
+locations and the starts_at index for sessions, which are looked up by a date prefix such as 2025-06 or by type.
+The forms validate a submitted id against the same querysets, with one lookup by primary key.
+"""
+import re
+from datetime import date, datetime, time, timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .models import ClubMember, Location, Personnel, Sessions
+from .search import search_people
+
+AUTOCOMPLETE_PAGE_SIZE = 20
+# Person search matches read per result wanted, as the inactive members and personnel who do not coach are skipped
+PERSON_CANDIDATES = 5
+COACH_ROLES = ('coach', 'assistant coach', 'captain')
+# Sorts after any other character in SQLite's binary collation, so that [prefix, prefix + LAST_CHARACTER) holds
+# every string starting with prefix there
+LAST_CHARACTER = '\U0010ffff'
+
+_DATE_PREFIX = re.compile(r'(\d{4})(?:-(\d{1,2}))?(?:-(\d{1,2}))?')
+
+
+def active_members():
+    return ClubMember.objects.filter(activity=True)
+
+
+def current_coaches():
+    return Personnel.objects.filter(
+        personnelassignment__role__in=COACH_ROLES,
+        personnelassignment__end_date__isnull=True
+    ).distinct()
+
+
+def _people(kind, queryset, term, limit):
+    ids = [result['id'] for result in search_people(term, kinds=[kind], limit=limit * PERSON_CANDIDATES)]
+    found = queryset.in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found][:limit]
+
+
+def _locations(queryset, term, limit):
+    queryset = queryset.annotate(name_lower=Lower('name')).order_by('name_lower', 'pk')
+    if term:
+        prefix = term.lower()
+        queryset = queryset.filter(name_lower__startswith=prefix)
+        if connections[queryset.db].vendor == 'sqlite':
+            # SQLite's LIKE ignores case, so it can only scan the binary expression index: the same prefix as a
+            # range makes it a search. MySQL's LIKE is a range already, where this bound would not be valid utf8mb3.
+            queryset = queryset.filter(name_lower__gte=prefix, name_lower__lt=prefix + LAST_CHARACTER)
+    return list(queryset[:limit])
+
+
+def _aware(day):
+    value = datetime.combine(day, time.min)
+    return timezone.make_aware(value) if settings.USE_TZ else value
+
+
+def _date_range(year, month=None, day=None):
+    """[start, end) of a year, a month or a day; ValueError when there is no such date"""
+    if day is not None:
+        start = date(year, month, day)
+        end = start + timedelta(days=1)
+    elif month is not None:
+        start = date(year, month, 1)
+        end = date(year + month // 12, month % 12 + 1, 1)
+    else:
+        start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    return _aware(start), _aware(end)
+
+
+def _sessions(queryset, term, limit):
+    """Sessions on a YYYY, YYYY-MM or YYYY-MM-DD date prefix, else the upcoming ones whose type starts with term"""
+    queryset = queryset.order_by('starts_at', 'pk')
+    match = _DATE_PREFIX.fullmatch(term)
+    if match:
+        try:
+            start, end = _date_range(*(int(part) if part else None for part in match.groups()))
+        except (ValueError, OverflowError):
+            return []
+        return list(queryset.filter(starts_at__gte=start, starts_at__lt=end)[:limit])
+    if term:
+        queryset = queryset.filter(session_type__startswith=term.lower())
+    return list(queryset.filter(starts_at__gte=_aware(timezone.localdate()))[:limit])
+
+
+# source -> (queryset of the choices, lookup(queryset, term, limit) returning the matching objects in order)
+SOURCES = {
+    'members': (active_members, partial(_people, 'member')),
+    'coaches': (current_coaches, partial(_people, 'personnel')),
+    'locations': (Location.objects.all, _locations),
+    'sessions': (Sessions.objects.all, _sessions),
+}
+
+
+def autocomplete(source, term, limit=AUTOCOMPLETE_PAGE_SIZE):
+    """The choices of source matching term, as dicts with the id and text of the option; KeyError if no source"""
+    queryset, lookup = SOURCES[source]
+    return [{'id': obj.pk, 'text': str(obj)} for obj in lookup(queryset(), (term or '').strip(), limit)]
@@ -0,0 +1,82 @@
+"""
+MySQL backend drawing its connections from a ConnectionPool shared by the threads of the process.
+
+Use ENGINE 'club.backends.mysql_pool' with the pool settings in OPTIONS['pool'], e.g.
+{'max_size': 10, 'timeout': 30, 'max_idle': 300, 'max_lifetime': 3600}, or True for the defaults of
+club/backends/pool.py. Closing the Django connection at the end of a request returns it to the pool, so
+CONN_MAX_AGE must stay 0.
+"""
+import threading
+from functools import partial
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.mysql import base
+
+from ..pool import ConnectionPool
+
+# Database alias -> pool, created at the first connection of any thread
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _ping(connection):
+    connection.ping()
+
+
+def pool_stats():
+    """Size, counters and recent checkout wait times of the pool of each database alias"""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
+
+
+def close_pools():
+    """Close the idle connections of every pool"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_idle()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, settings_dict, *args, **kwargs):
+        super().__init__(settings_dict, *args, **kwargs)
+        if self.settings_dict.get('CONN_MAX_AGE'):
+            raise ImproperlyConfigured('Pooled MySQL connections are returned at the end of each request, '
+                                       'set CONN_MAX_AGE to 0')
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def _pool(self, conn_params):
+        with _pools_lock:
+            if self.alias not in _pools:
+                options = self.settings_dict['OPTIONS'].get('pool')
+                _pools[self.alias] = ConnectionPool(
+                    partial(super().get_new_connection, conn_params),
+                    check=_ping,
+                    **(options if isinstance(options, dict) else {}),
+                )
+            return _pools[self.alias]
+
+    def get_new_connection(self, conn_params):
+        # Django runs init_connection_state() on every checkout, so a reused connection gets its session reset
+        return self._pool(conn_params).acquire()
+
+    def _close(self):
+        if self.connection is None:
+            return
+        pool = self._pool(self.get_connection_params())
+        if self.in_atomic_block:
+            # Django keeps a reference to a connection closed inside atomic(), it must not be handed out again
+            pool.release(self.connection, discard=True)
+            return
+        try:
+            with self.wrap_database_errors:
+                self.connection.rollback()
+        except Exception:
+            pool.release(self.connection, discard=True)
+        else:
+            pool.release(self.connection)
@@ -0,0 +1,170 @@
+"""
+Bounded pool of DB-API connections shared by the threads of a process.
+
+A checkout reuses the most recently returned idle connection after checking it is still alive; connections idle
+or open for too long are closed instead. When every connection is in use, the checkout waits for one to be
+returned, up to a timeout. The time spent waiting is recorded so that an undersized pool shows up in stats().
+"""
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger('club.db.pool')
+
+# Number of recent checkouts the wait percentiles are computed over
+WAIT_SAMPLES = 1000
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection was returned to a full pool within the timeout"""
+
+
+class ConnectionPool:
+    def __init__(self, connect, max_size=10, timeout=30.0, max_idle=300.0, max_lifetime=3600.0, check=None,
+                 slow_wait=0.1):
+        """
+        connect() opens a new connection and check(connection) raises if a connection is no longer usable.
+        Times are in seconds; a connection idle longer than max_idle or opened more than max_lifetime ago is
+        closed at its next checkout rather than reused. Waits longer than slow_wait are logged.
+        """
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check = check
+        self.slow_wait = slow_wait
+        self._lock = threading.Condition()
+        # Idle connections as (connection, opened at, returned at), the most recently returned last
+        self._idle = []
+        # id(connection) -> opened at, for the connections checked out
+        self._in_use = {}
+        # Connections being opened, counted in the size of the pool so that max_size holds
+        self._opening = 0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._counters = {'checkouts': 0, 'waited': 0, 'timeouts': 0, 'opened': 0, 'discarded': 0}
+
+    @property
+    def size(self):
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _expired(self, opened_at, returned_at, now):
+        return now - returned_at > self.max_idle or now - opened_at > self.max_lifetime
+
+    def acquire(self):
+        """Check out a live connection, opening one if the pool is not full; raises PoolTimeout"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        while True:
+            with self._lock:
+                while not self._idle and self.size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['timeouts'] += 1
+                        logger.warning('No connection returned to the pool of %d within %.1fs',
+                                       self.max_size, self.timeout)
+                        raise PoolTimeout(f'No connection available within {self.timeout}s')
+                    waited = True
+                    self._lock.wait(remaining)
+                if self._idle:
+                    connection, opened_at, returned_at = self._idle.pop()
+                    self._in_use[id(connection)] = opened_at
+                else:
+                    connection = None
+                    self._opening += 1
+                wait = time.monotonic() - started
+
+            if connection is None:
+                return self._open(wait, waited)
+            if self._expired(opened_at, returned_at, time.monotonic()) or not self._alive(connection):
+                self._discard(connection)
+                continue
+            self._checked_out(wait, waited)
+            return connection
+
+    def _open(self, wait, waited):
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self._lock:
+                self._opening -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._opening -= 1
+            self._in_use[id(connection)] = time.monotonic()
+            self._counters['opened'] += 1
+        self._checked_out(wait, waited)
+        return connection
+
+    def _alive(self, connection):
+        if self.check is None:
+            return True
+        try:
+            self.check(connection)
+        except Exception:
+            logger.info('Discarding a pooled connection that failed its health check', exc_info=True)
+            return False
+        return True
+
+    def _checked_out(self, wait, waited):
+        with self._lock:
+            self._counters['checkouts'] += 1
+            self._counters['waited'] += waited
+            self._waits.append(wait)
+        if waited and wait > self.slow_wait:
+            logger.warning('Waited %.1fms for a connection from the pool of %d', wait * 1000, self.max_size)
+
+    def release(self, connection, discard=False):
+        """Return a checked out connection; discard it instead when it is broken or in an unknown state"""
+        if discard:
+            self._discard(connection)
+            return
+        with self._lock:
+            opened_at = self._in_use.pop(id(connection))
+            self._idle.append((connection, opened_at, time.monotonic()))
+            self._lock.notify()
+
+    def _discard(self, connection):
+        with self._lock:
+            self._in_use.pop(id(connection), None)
+            self._counters['discarded'] += 1
+            self._lock.notify()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_idle(self):
+        """Close every idle connection, e.g. at shutdown; checked out connections are left alone"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._lock.notify_all()
+        for connection, _, _ in idle:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        """Pool size, counters and the wait times of recent checkouts in milliseconds"""
+        with self._lock:
+            waits = [wait * 1000 for wait in self._waits]
+            stats = {
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'max_size': self.max_size,
+                **self._counters,
+            }
+        if len(waits) >= 2:
+            cuts = statistics.quantiles(waits, n=100, method='inclusive')
+            stats.update(wait_p50_ms=cuts[49], wait_p95_ms=cuts[94], wait_max_ms=max(waits))
+        else:
+            stats.update(wait_p50_ms=None, wait_p95_ms=None, wait_max_ms=max(waits, default=None))
+        return stats
@@ -0,0 +1,154 @@
+"""
+Streaming export of the club tables to compressed files, used by `manage.py export_tables`.
+
+Each table is read in chunks of primary keys, `WHERE pk > last ORDER BY pk LIMIT n`, which walks the primary key
+index: every chunk is a short query, whatever the size of the table, and at most one chunk per table being
+exported is in memory. Chunks are appended to the file as they are read: a row group of a Parquet file or a
+record batch of an Arrow IPC file when pyarrow is installed, otherwise lines of a gzipped CSV file.
+
+An export can start after a primary key watermark, so that only the rows inserted since the previous export
+are read. Rows updated or deleted after being exported are not exported again.
+"""
+import csv
+import gzip
+import os
+import time
+from collections import namedtuple
+
+from django.db import DEFAULT_DB_ALIAS
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+FORMATS = ('parquet', 'arrow', 'csv')
+EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrow', 'csv': 'csv.gz'}
+DEFAULT_CHUNK_SIZE = 10000
+
+TableExport = namedtuple('TableExport', ['table', 'path', 'rows', 'watermark', 'seconds'])
+
+# Arrow types of the Django internal field types, foreign keys taking the type of their target; the fields
+# without one are exported as strings
+_INTEGER_TYPES = {
+    'AutoField', 'BigAutoField', 'SmallAutoField', 'IntegerField', 'BigIntegerField', 'SmallIntegerField',
+    'PositiveIntegerField', 'PositiveBigIntegerField', 'PositiveSmallIntegerField',
+}
+# Django internal field type -> name of the pyarrow type factory
+_ARROW_TYPES = {
+    'BooleanField': 'bool_',
+    'FloatField': 'float64',
+    'DateField': 'date32',
+}
+
+
+def default_format():
+    return 'parquet' if pyarrow is not None else 'csv'
+
+
+def _arrow_type(field):
+    if field.is_relation:
+        field = field.target_field
+    internal_type = field.get_internal_type()
+    if internal_type in _INTEGER_TYPES:
+        return pyarrow.int64()
+    if internal_type in _ARROW_TYPES:
+        return getattr(pyarrow, _ARROW_TYPES[internal_type])()
+    if internal_type == 'DecimalField':
+        return pyarrow.decimal128(field.max_digits, field.decimal_places)
+    if internal_type == 'DateTimeField':
+        return pyarrow.timestamp('us', tz='UTC')
+    if internal_type == 'TimeField':
+        return pyarrow.time64('us')
+    return pyarrow.string()
+
+
+class _CsvWriter:
+    def __init__(self, path, fields):
+        self.file = gzip.open(path, 'wt', encoding='utf-8', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([field.column for field in fields])
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class _ArrowWriter:
+    def __init__(self, path, fields, file_format):
+        self.schema = pyarrow.schema([
+            pyarrow.field(field.column, _arrow_type(field), nullable=field.null) for field in fields
+        ])
+        # Values of the fields exported as strings, e.g. UUIDs, are converted with str()
+        self.as_string = [arrow_field.type == pyarrow.string() for arrow_field in self.schema]
+        if file_format == 'parquet':
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression='zstd')
+            self.sink = None
+        else:
+            self.sink = pyarrow.OSFile(path, 'wb')
+            options = pyarrow.ipc.IpcWriteOptions(compression='zstd')
+            self.writer = pyarrow.ipc.new_file(self.sink, self.schema, options=options)
+
+    def write(self, rows):
+        columns = []
+        for values, arrow_field, as_string in zip(zip(*rows), self.schema, self.as_string):
+            if as_string:
+                values = [None if value is None else str(value) for value in values]
+            columns.append(pyarrow.array(values, type=arrow_field.type))
+        self.writer.write_table(pyarrow.Table.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+        if self.sink is not None:
+            self.sink.close()
+
+
+def _writer(path, fields, file_format):
+    if file_format == 'csv':
+        return _CsvWriter(path, fields)
+    if pyarrow is None:
+        raise ImportError(f'Exporting to {file_format} requires pyarrow, install it or use the csv format')
+    return _ArrowWriter(path, fields, file_format)
+
+
+def export_table(model, directory, file_format=None, after=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                 using=DEFAULT_DB_ALIAS):
+    """
+    Write the rows of model whose primary key is greater than after, all of them when after is None, to a file
+    of directory named after the table. Returns a TableExport whose watermark is the last primary key written,
+    or after when there was no new row. The file is written under a temporary name and renamed when complete.
+    """
+    file_format = file_format or default_format()
+    fields = model._meta.concrete_fields
+    pk_name = model._meta.pk.attname
+    pk_index = [field.attname for field in fields].index(pk_name)
+    suffix = '' if after is None else f'.after-{after}'
+    path = os.path.join(directory, f'{model._meta.db_table}{suffix}.{EXTENSIONS[file_format]}')
+    partial_path = f'{path}.partial'
+
+    started = time.monotonic()
+    rows_written = 0
+    watermark = after
+    queryset = model._default_manager.using(using).order_by(pk_name).values_list(
+        *(field.attname for field in fields))
+    writer = _writer(partial_path, fields, file_format)
+    try:
+        while True:
+            chunk = queryset if watermark is None else queryset.filter(pk__gt=watermark)
+            rows = list(chunk[:chunk_size])
+            if not rows:
+                break
+            writer.write(rows)
+            rows_written += len(rows)
+            watermark = rows[-1][pk_index]
+    except BaseException:
+        writer.close()
+        os.remove(partial_path)
+        raise
+    writer.close()
+    os.replace(partial_path, path)
+    return TableExport(model._meta.db_table, path, rows_written, watermark, time.monotonic() - started)
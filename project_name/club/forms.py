@@ -1,7 +1,10 @@
 from django import forms
-from .models import ClubMember, Location, Personnel, FamilyMember, SecondaryFamilyMember, SessionTeams, PlayerAssignment
+from .models import MINIMUM_MEMBER_AGE, ClubMember, Location, Personnel, FamilyMember, SecondaryFamilyMember, SessionTeams, PlayerAssignment
 from datetime import date
 
+from .autocomplete import active_members, current_coaches
+from .widgets import AutocompleteSelect
+
 
 class PersonnelForm(forms.ModelForm):
     class Meta:
@@ -57,29 +60,40 @@ class ClubMemberForm(forms.ModelForm):
         if date_of_birth:
             today = date.today()
             age = today.year - date_of_birth.year - ((today.month, today.day) < (date_of_birth.month, date_of_birth.day))
-            if age < 11:
-                raise forms.ValidationError("Club member must be at least 11 years old")
+            if age < MINIMUM_MEMBER_AGE:
+                raise forms.ValidationError(f"Club member must be at least {MINIMUM_MEMBER_AGE} years old")
             if date_of_birth > today:
                 raise forms.ValidationError("Date of birth cannot be in the future")
         return date_of_birth
 
+    def clean_location(self):
+        location = self.cleaned_data.get('location')
+        moving_in = location and (self.instance._state.adding or self.instance.location_id != location.pk)
+        # member_count is a counter cache, so this does not count the location's members
+        if moving_in and location.is_full:
+            raise forms.ValidationError(f"{location.name} is full ({location.capacity} members)")
+        return location
+
+
+class MemberImportForm(forms.Form):
+    file = forms.FileField(help_text='UTF-8 CSV with a header row, see the README for its columns')
+
 
 class SessionTeamsForm(forms.ModelForm):
     class Meta:
         model = SessionTeams
         fields = '__all__'
+        # The options are loaded as the user types, see club/autocomplete.py
         widgets = {
-            'session_date': forms.DateInput(attrs={'type': 'date'}),
-            'start_time': forms.TimeInput(attrs={'type': 'time'}),
+            'session': AutocompleteSelect('sessions'),
+            'location': AutocompleteSelect('locations'),
+            'head_coach': AutocompleteSelect('coaches'),
         }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Filter head_coach to only show Personnel with Coach roles
-        self.fields['head_coach'].queryset = Personnel.objects.filter(
-            personnelassignment__role__in=['coach', 'assistant coach', 'captain'],
-            personnelassignment__end_date__isnull=True
-        ).distinct()
+        self.fields['head_coach'].queryset = current_coaches()
 
     def clean_session_date(self):
         session_date = self.cleaned_data.get('session_date')
@@ -92,8 +106,11 @@ class PlayerAssignmentForm(forms.ModelForm):
     class Meta:
         model = PlayerAssignment
         fields = ['member', 'position']
+        widgets = {
+            'member': AutocompleteSelect('members'),
+        }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Only show active club members
-        self.fields['member'].queryset = ClubMember.objects.filter(activity=True)
+        self.fields['member'].queryset = active_members()
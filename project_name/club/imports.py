@@ -0,0 +1,282 @@
+"""
+Bulk import of club members from a CSV file, used by `manage.py import_members` and the member_import view.
+
+The file is read one row at a time. A row is validated with the model fields' own clean() and against the
+locations, SSNs and medicare numbers read once at the start, so validating runs no query. Valid rows are
+collected into batches, and each batch is written with bulk_create in one transaction. Rejected rows are copied
+to an error CSV with their line number and the reasons.
+
+A minor's row may also register a family member: the family_* columns describe them and relationship_type
+links them to the minor. When family_ssn is already known, from the database or an earlier row, the
+existing family member is linked and their other columns are ignored.
+"""
+import csv
+import time
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+
+from .models import (
+    MAJORITY_AGE, MINIMUM_MEMBER_AGE, ClubMember, FamilyMember, FamilyRelationship, Location, LocationStats
+)
+from queries_asked.cache import invalidate_tables
+
+# Columns every file must have, validated with the ClubMember field of the same name; location is a location
+# id or name
+MEMBER_COLUMNS = (
+    'first_name', 'last_name', 'birthdate', 'ssn', 'medicare_number', 'phone', 'address', 'city', 'province',
+    'postal_code', 'email', 'height', 'weight', 'gender',
+)
+REQUIRED_COLUMNS = MEMBER_COLUMNS + ('location',)
+# Optional columns: activity defaults to false and the flag `minor` is always derived from birthdate
+FAMILY_COLUMNS = (
+    'first_name', 'last_name', 'birthdate', 'ssn', 'medicare_number', 'phone', 'email',
+)
+# Family member columns that default to the minor's own value
+FAMILY_ADDRESS_COLUMNS = ('address', 'city', 'province', 'postal_code')
+ERROR_COLUMNS = ('line', 'errors')
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+FALSE_VALUES = {'', '0', 'false', 'f', 'no', 'n'}
+BOOLEAN_VALUES = TRUE_VALUES | FALSE_VALUES
+
+
+class MemberImportError(ValueError):
+    """Raised when the file cannot be imported at all, e.g. when required columns are missing"""
+
+
+def _age(birthdate, today):
+    return today.year - birthdate.year - ((today.month, today.day) < (birthdate.month, birthdate.day))
+
+
+class MemberImporter:
+    """
+    Imports the rows of one CSV file. The SSNs, medicare numbers and location member counts read at the start
+    are kept current as rows are accepted, so duplicates within the file and locations filling up are caught too.
+    """
+
+    def __init__(self, batch_size=1000, today=None, log=None):
+        self.batch_size = batch_size
+        self.today = today or date.today()
+        self.log = log
+        self.counts = {'rows': 0, 'imported': 0, 'rejected': 0, 'family_members': 0, 'relationships': 0}
+        self.member_fields = [(name, ClubMember._meta.get_field(name)) for name in MEMBER_COLUMNS]
+        self.family_fields = [
+            (name, FamilyMember._meta.get_field(name)) for name in FAMILY_COLUMNS + FAMILY_ADDRESS_COLUMNS
+        ]
+        self.relationship_type = FamilyRelationship._meta.get_field('relationship_type')
+        self.touched_locations = set()
+
+    def _prefetch(self):
+        self.locations = {}
+        names = {}
+        for location in Location.objects.values('pk', 'name', 'capacity', 'member_count'):
+            self.locations[str(location['pk'])] = location
+            names.setdefault(location['name'].strip().casefold(), []).append(location)
+        for name, matches in names.items():
+            # An ambiguous name cannot be resolved; the row must give the location id
+            self.locations.setdefault(name, matches[0] if len(matches) == 1 else None)
+        self.member_ssns = set()
+        self.member_medicare_numbers = set()
+        for ssn, medicare_number in ClubMember.objects.values_list('ssn', 'medicare_number').iterator():
+            self.member_ssns.add(ssn)
+            self.member_medicare_numbers.add(medicare_number)
+        # SSN -> member_id, None for the family members of the current batch until they are inserted
+        self.family_ids = {}
+        self.family_medicare_numbers = set()
+        for pk, ssn, medicare_number in FamilyMember.objects.values_list('pk', 'ssn', 'medicare_number').iterator():
+            self.family_ids[ssn] = pk
+            self.family_medicare_numbers.add(medicare_number)
+
+    def run(self, lines, errors_file):
+        """
+        Import the CSV rows read from the iterable of lines, writing the rejected ones to the text file
+        errors_file. Returns the counts of rows read, imported and rejected and of family members and
+        relationships created. Raises MemberImportError when the header lacks required columns.
+        """
+        started = time.monotonic()
+        reader = csv.DictReader(lines)
+        header = [column.strip() for column in reader.fieldnames or []]
+        missing = [column for column in REQUIRED_COLUMNS if column not in header]
+        if missing:
+            raise MemberImportError(f'Missing columns: {", ".join(missing)}')
+        reader.fieldnames = header
+        errors = csv.DictWriter(errors_file, fieldnames=list(ERROR_COLUMNS) + header, extrasaction='ignore')
+        errors.writeheader()
+
+        self._prefetch()
+        batch = []
+        try:
+            for row in reader:
+                self.counts['rows'] += 1
+                accepted, problems = self._clean_row(row)
+                if problems:
+                    self.counts['rejected'] += 1
+                    errors.writerow({**row, 'line': reader.line_num, 'errors': '; '.join(problems)})
+                    continue
+                batch.append(accepted)
+                if len(batch) == self.batch_size:
+                    self._insert(batch)
+                    batch = []
+                    self._progress(started)
+            if batch:
+                self._insert(batch)
+                self._progress(started)
+        finally:
+            # bulk_create sends no signals, so the summaries and cached reports are brought up to date here
+            if self.counts['imported']:
+                LocationStats.refresh(self.touched_locations)
+                invalidate_tables([
+                    model._meta.db_table for model in (ClubMember, FamilyMember, FamilyRelationship, Location)
+                ])
+        return self.counts
+
+    def _progress(self, started):
+        if self.log:
+            self.log(f'{self.counts["rows"]} rows read, {self.counts["imported"]} imported, '
+                     f'{self.counts["rejected"]} rejected in {time.monotonic() - started:.1f}s')
+
+    def _clean_fields(self, row, fields, prefix, problems, defaults=None):
+        values = {}
+        for name, field in fields:
+            value = (row.get(prefix + name) or '').strip()
+            if not value and defaults and name in defaults:
+                values[name] = defaults[name]
+                continue
+            if not value:
+                problems.append(f'{prefix}{name}: This field is required.')
+                continue
+            try:
+                values[name] = field.clean(value, None)
+            except ValidationError as e:
+                problems.extend(f'{prefix}{name}: {message}' for message in e.messages)
+        return values
+
+    def _clean_row(self, row):
+        """((ClubMember, (FamilyMember or None, relationship values) or None) or None, problems found)"""
+        problems = []
+        values = self._clean_fields(row, self.member_fields, '', problems)
+
+        birthdate = values.get('birthdate')
+        if birthdate:
+            # The rules of ClubMemberForm
+            if birthdate > self.today:
+                problems.append('birthdate: Date of birth cannot be in the future')
+            elif _age(birthdate, self.today) < MINIMUM_MEMBER_AGE:
+                problems.append(f'birthdate: Club member must be at least {MINIMUM_MEMBER_AGE} years old')
+        if values.get('ssn') in self.member_ssns:
+            problems.append('ssn: A club member with this SSN already exists.')
+        if values.get('medicare_number') in self.member_medicare_numbers:
+            problems.append('medicare_number: A club member with this medicare number already exists.')
+
+        activity = (row.get('activity') or '').strip().lower()
+        if activity not in BOOLEAN_VALUES:
+            problems.append(f'activity: “{activity}” value must be either true or false.')
+
+        location_key = (row.get('location') or '').strip()
+        location = self.locations.get(location_key) or self.locations.get(location_key.casefold())
+        if not location_key:
+            problems.append('location: This field is required.')
+        elif location is None:
+            problems.append(f'location: No location with the id or unique name “{location_key}”.')
+        elif location['member_count'] >= location['capacity']:
+            problems.append(f'location: {location["name"]} is full ({location["capacity"]} members)')
+
+        is_minor = birthdate is not None and _age(birthdate, self.today) < MAJORITY_AGE
+        family = self._clean_family(row, values, is_minor, problems)
+        if problems:
+            return None, problems
+
+        member = ClubMember(
+            **values,
+            location_id=location['pk'],
+            activity=activity in TRUE_VALUES,
+            minor=is_minor,
+        )
+        self.member_ssns.add(member.ssn)
+        self.member_medicare_numbers.add(member.medicare_number)
+        location['member_count'] += 1
+        if family is not None:
+            family_member, relationship = family
+            if family_member is not None:
+                family_member.location_id = location['pk']
+                self.family_ids[family_member.ssn] = None
+                self.family_medicare_numbers.add(family_member.medicare_number)
+            family = (family_member, relationship)
+        return (member, family), problems
+
+    def _clean_family(self, row, member_values, is_minor, problems):
+        """(FamilyMember to create or None, relationship values) when the row names a family member, else None"""
+        if not any((row.get(column) or '').strip() for column in row if column and column.startswith('family_')):
+            return None
+        if not is_minor:
+            problems.append('family: Only the rows of minors can register a family member.')
+            return None
+
+        relationship = {}
+        relationship_type = (row.get('relationship_type') or '').strip()
+        try:
+            relationship['relationship_type'] = self.relationship_type.clean(relationship_type, None)
+        except ValidationError as e:
+            problems.extend(f'relationship_type: {message}' for message in e.messages)
+        start_date = (row.get('relationship_start_date') or '').strip()
+        try:
+            relationship['start_date'] = (
+                FamilyRelationship._meta.get_field('start_date').clean(start_date, None) if start_date else self.today
+            )
+        except ValidationError as e:
+            problems.extend(f'relationship_start_date: {message}' for message in e.messages)
+
+        ssn = (row.get('family_ssn') or '').strip()
+        relationship['family_ssn'] = ssn
+        if ssn in self.family_ids:
+            return None, relationship
+
+        defaults = {name: member_values.get(name) for name in FAMILY_ADDRESS_COLUMNS if member_values.get(name)}
+        values = self._clean_fields(row, self.family_fields, 'family_', problems, defaults)
+        if values.get('medicare_number') in self.family_medicare_numbers:
+            problems.append('family_medicare_number: A family member with this medicare number already exists.')
+        return FamilyMember(**values), relationship
+
+    def _insert(self, batch):
+        members = [member for member, _ in batch]
+        family_members = [family[0] for _, family in batch if family and family[0] is not None]
+        relationships = [(member, family[1]) for member, family in batch if family]
+        with transaction.atomic():
+            if family_members:
+                FamilyMember.objects.bulk_create(family_members)
+            ClubMember.objects.bulk_create(members)
+            if relationships:
+                self._link(relationships, family_members)
+            added = {}
+            for member in members:
+                added[member.location_id] = added.get(member.location_id, 0) + 1
+            for location_id, count in added.items():
+                Location.objects.filter(pk=location_id).update(member_count=F('member_count') + count)
+        self.touched_locations.update(added)
+        self.counts['imported'] += len(members)
+        self.counts['family_members'] += len(family_members)
+        self.counts['relationships'] += len(relationships)
+
+    def _link(self, relationships, family_members):
+        # Not every backend returns the primary keys of bulk inserted rows, so they are read back by SSN
+        member_ids = dict(ClubMember.objects.filter(
+            ssn__in=[member.ssn for member, _ in relationships]).values_list('ssn', 'pk'))
+        if family_members:
+            self.family_ids.update(FamilyMember.objects.filter(
+                ssn__in=[family_member.ssn for family_member in family_members]).values_list('ssn', 'pk'))
+        rows = []
+        for member, values in relationships:
+            values = dict(values)
+            rows.append(FamilyRelationship(
+                minor_id=member_ids[member.ssn],
+                major_id=self.family_ids[values.pop('family_ssn')],
+                # Numbers the relationships of the minor, who has no other yet
+                relationship_id=1,
+                is_primary=True,
+                emergency_contact=True,
+                **values,
+            ))
+        FamilyRelationship.objects.bulk_create(rows)
@@ -0,0 +1,167 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date
+from io import StringIO
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import QueryDict
+
+from club.models import ClubMember
+from club.sqlite import PERFORMANCE_PRAGMAS, apply_pragmas
+from club.synthetic import SyntheticDataGenerator
+from queries_asked.reports import REPORTS
+
+# (profile name, PRAGMAs of every benchmark connection); journal_mode is set once on the database file
+PROFILES = [
+    ('default', {'journal_mode': 'DELETE'}),
+    ('performance', PERFORMANCE_PRAGMAS),
+]
+
+# Lock wait of the default profile, the timeout Django's SQLite backend passes to sqlite3.connect()
+DEFAULT_TIMEOUT = 5.0
+
+
+def _p95(samples):
+    if len(samples) < 2:
+        return samples[0] if samples else 0.0
+    return statistics.quantiles(samples, n=100, method='inclusive')[94]
+
+
+class Command(BaseCommand):
+    help = ('Measure SQLite throughput under concurrent report readers and member/payment writers, with the '
+            'default settings and with the performance profile of club/sqlite.py, each on a copy of the database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1,
+                            help='Synthetic dataset size, see `populate --scale` (default: 1)')
+        parser.add_argument('--seed', type=int, default=353)
+        parser.add_argument('--use-current-db', action='store_true',
+                            help='Copy the configured database instead of seeding a throwaway one')
+        parser.add_argument('--readers', type=int, default=4, help='Threads running reports (default: 4)')
+        parser.add_argument('--writers', type=int, default=2,
+                            help='Threads updating members and recording payments (default: 2)')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per profile (default: 5)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'benchmark_concurrency only applies to SQLite, not {connection.vendor}')
+        if options['readers'] < 0 or options['writers'] < 0 or options['readers'] + options['writers'] == 0:
+            raise CommandError('--readers and --writers cannot be negative and need at least one thread')
+        if options['duration'] <= 0:
+            raise CommandError('--duration must be positive')
+
+        old_name = None
+        if not options['use_current_db']:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            if old_name is not None:
+                self.stdout.write(f'Seeding scale {options["scale"]}...')
+                SyntheticDataGenerator(options['scale'], seed=options['seed'], log=StringIO().write).run()
+            member_ids = list(ClubMember.objects.values_list('pk', flat=True))
+            if not member_ids:
+                raise CommandError('The database has no members to update')
+            results = {}
+            with tempfile.TemporaryDirectory() as tmp:
+                for name, pragmas in PROFILES:
+                    path = os.path.join(tmp, f'{name}.sqlite3')
+                    self._copy_database(path, pragmas['journal_mode'])
+                    results[name] = stats = self._run(path, pragmas, member_ids, options)
+                    self.stdout.write(
+                        f'  {name:<12} reads {stats["reads_per_s"]:8.1f}/s (p95 {stats["read_p95_ms"]:7.2f}ms)  '
+                        f'writes {stats["writes_per_s"]:8.1f}/s (p95 {stats["write_p95_ms"]:7.2f}ms)  '
+                        f'{stats["errors"]} lock errors'
+                    )
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        default, performance = results['default'], results['performance']
+        self.stdout.write(
+            f'Performance profile: reads x{performance["reads_per_s"] / max(default["reads_per_s"], 1e-9):.2f}, '
+            f'writes x{performance["writes_per_s"] / max(default["writes_per_s"], 1e-9):.2f}'
+        )
+
+    def _copy_database(self, path, journal_mode):
+        """Copy the database through the SQLite backup API; the journal mode is stored in the copy"""
+        connection.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            connection.connection.backup(target)
+            target.execute(f'PRAGMA journal_mode = {journal_mode}')
+        finally:
+            target.close()
+
+    def _run(self, path, pragmas, member_ids, options):
+        pragmas = {name: value for name, value in pragmas.items() if name != 'journal_mode'}
+        # Reports bound by name with sqlite3's :name placeholders
+        reports = []
+        for report in REPORTS.values():
+            params = report.clean_params(QueryDict())
+            reports.append((report.sql % {name: f':{name}' for name in params}, params))
+
+        def read(db, rng):
+            sql, params = rng.choice(reports)
+            db.execute(sql, params).fetchall()
+
+        def write(db, rng):
+            member_id = rng.choice(member_ids)
+            db.execute('BEGIN IMMEDIATE')
+            db.execute('UPDATE club_clubmember SET phone = ? WHERE member_id = ?',
+                       (f'514-555-{rng.randrange(10000):04d}', member_id))
+            db.execute(
+                'INSERT INTO club_payments (member_id, payment_date, amount, payment_method, membership_year, '
+                "payment_type) VALUES (?, ?, 50, 'cash', ?, 'donation')",
+                (member_id, date.today().isoformat(), date.today().year),
+            )
+            db.execute('COMMIT')
+
+        workers = [('read', read)] * options['readers'] + [('write', write)] * options['writers']
+        samples = {'read': [], 'write': []}
+        errors = []
+        start = threading.Barrier(len(workers) + 1)
+        deadline = []
+
+        def worker(index, kind, operation):
+            db = sqlite3.connect(path, timeout=DEFAULT_TIMEOUT, isolation_level=None, check_same_thread=False)
+            apply_pragmas(db.cursor(), pragmas)
+            rng = random.Random(options['seed'] + index)
+            timings, failures = [], 0
+            start.wait()
+            try:
+                while time.perf_counter() < deadline[0]:
+                    started = time.perf_counter()
+                    try:
+                        operation(db, rng)
+                    except sqlite3.OperationalError:  # database is locked
+                        failures += 1
+                        if db.in_transaction:
+                            db.execute('ROLLBACK')
+                        continue
+                    timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                db.close()
+            samples[kind].extend(timings)
+            errors.append(failures)
+
+        threads = [threading.Thread(target=worker, args=(index, kind, operation))
+                   for index, (kind, operation) in enumerate(workers)]
+        for thread in threads:
+            thread.start()
+        deadline.append(time.perf_counter() + options['duration'])
+        start.wait()
+        for thread in threads:
+            thread.join()
+
+        return {
+            'reads_per_s': len(samples['read']) / options['duration'],
+            'writes_per_s': len(samples['write']) / options['duration'],
+            'read_p95_ms': _p95(samples['read']),
+            'write_p95_ms': _p95(samples['write']),
+            'errors': sum(errors),
+        }
@@ -0,0 +1,201 @@
+import json
+import platform
+import statistics
+import time
+from datetime import datetime
+from io import StringIO
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from club.models import ClubMember, Location
+from club.synthetic import SyntheticDataGenerator
+from queries_asked.cache import invalidate_tables
+from queries_asked.signals import REPORT_TABLES
+
+# (benchmark name, url name, url args, context key holding the rows that were rendered)
+# Args given as a callable are resolved against the seeded data before each scale is measured.
+BENCHMARKS = [
+    *((f'query_{n}', 'queries_asked:query', [n], 'rows')
+      for n in ['8', '9', '10', '12', '13', '14', '15', '16', '17', '18']),
+    ('club_member_list', 'club_member_list', [], 'club_members'),
+    ('member_list', 'member_list', [], 'members'),
+    ('personnel_list', 'personnel_list', [], 'personnel_list'),
+    ('team_formation_list', 'team_formation_list', [], 'formations'),
+    ('location_report', 'location_report', [], 'location_data'),
+    ('club_member_detail', 'club_member_detail',
+     lambda: [ClubMember.objects.filter(playerassignment__isnull=False).values_list('pk', flat=True).first()],
+     'team_assignments'),
+]
+
+
+def _member_fees_with_properties():
+    """Minor count and fee total computed from the ClubMember properties, one instance at a time"""
+    members = list(ClubMember.objects.all())
+    sum(member.annual_fee for member in members)
+    sum(1 for member in members if member.is_minor)
+    return len(members)
+
+
+def _member_fees_in_database():
+    """The same figures aggregated by the database from ClubMember.objects.with_age()"""
+    ClubMember.objects.with_age().aggregate(
+        fees=Sum('annual_fee_amount'), minors=Count('pk', filter=Q(is_minor_now=True)))
+    return 1
+
+
+# (benchmark name, callable returning the number of rows it produced) for code paths that are not views
+CODE_BENCHMARKS = [
+    ('member_age_properties', _member_fees_with_properties),
+    ('member_age_annotated', _member_fees_in_database),
+]
+
+# Differences below this many milliseconds are treated as noise when comparing against a baseline
+NOISE_FLOOR_MS = 2.0
+
+
+def _percentiles(samples):
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return {'p50_ms': cuts[49], 'p95_ms': cuts[94], 'p99_ms': cuts[98]}
+
+
+class Command(BaseCommand):
+    help = ('Seed synthetic datasets at increasing scales, time every report, key club view and model code path, '
+            'and optionally compare the results against a saved baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='1,5,20',
+                            help='Comma-separated scale factors, see `populate --scale` (default: 1,5,20)')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per benchmark (default: 20)')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed runs per benchmark (default: 2)')
+        parser.add_argument('--seed', type=int, default=353)
+        parser.add_argument('--only', help='Comma-separated benchmark names to run')
+        parser.add_argument('--output', help='Write the results to this JSON file (use it as a baseline later)')
+        parser.add_argument('--baseline', help='Fail if a benchmark regressed compared to this JSON file')
+        parser.add_argument('--threshold', type=float, default=1.5,
+                            help='Allowed p95 slowdown factor against the baseline (default: 1.5)')
+        parser.add_argument('--use-current-db', action='store_true',
+                            help='Seed and measure in the configured database instead of a throwaway test database')
+
+    def handle(self, *args, **options):
+        scales = sorted({int(scale) for scale in options['scales'].split(',')})
+        if options['repeat'] < 2:
+            raise CommandError('--repeat must be at least 2 to compute percentiles')
+        benchmarks = BENCHMARKS
+        code_benchmarks = CODE_BENCHMARKS
+        if options['only']:
+            wanted = set(options['only'].split(','))
+            benchmarks = [benchmark for benchmark in BENCHMARKS if benchmark[0] in wanted]
+            code_benchmarks = [benchmark for benchmark in CODE_BENCHMARKS if benchmark[0] in wanted]
+
+        old_name = None
+        if not options['use_current_db']:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            setup_test_environment()
+            test_environment = True
+        except RuntimeError:  # Already set up, e.g. when called from the test suite
+            test_environment = False
+        try:
+            results = self._run(scales, benchmarks, code_benchmarks, options)
+        finally:
+            if test_environment:
+                teardown_test_environment()
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            'meta': {
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'vendor': connection.vendor,
+                'python': platform.python_version(),
+                'repeat': options['repeat'],
+                'seed': options['seed'],
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = compare(baseline['results'], results, options['threshold'])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(regression))
+            if regressions:
+                raise CommandError(f'{len(regressions)} benchmark(s) regressed against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def _run(self, scales, benchmarks, code_benchmarks, options):
+        client = Client()
+        results = {}
+        seeded = Location.objects.count()
+        for scale in scales:
+            if scale > seeded:
+                self.stdout.write(f'Seeding up to scale {scale}...')
+                SyntheticDataGenerator(scale - seeded, seed=options['seed'] + seeded, log=StringIO().write).run()
+                seeded = scale
+            self.stdout.write(f'Scale {scale} ({ClubMember.objects.count()} members)')
+            runs = [
+                (name, self._view_runner(client, url_name, url_args, rows_key))
+                for name, url_name, url_args, rows_key in benchmarks
+            ] + code_benchmarks
+            results[str(scale)] = {}
+            for name, run in runs:
+                stats = self._measure(run, options['warmup'], options['repeat'])
+                results[str(scale)][name] = stats
+                self.stdout.write(
+                    f'  {name:<22} p50 {stats["p50_ms"]:8.2f}ms  p95 {stats["p95_ms"]:8.2f}ms  '
+                    f'p99 {stats["p99_ms"]:8.2f}ms  {stats["queries"]:4d} queries  {stats["rows"]:7d} rows'
+                )
+        return results
+
+    def _view_runner(self, client, url_name, url_args, rows_key):
+        """A callable requesting the view and returning how many rows it rendered; reports are measured uncached"""
+        url = reverse(url_name, args=url_args() if callable(url_args) else url_args)
+
+        def run():
+            invalidate_tables(REPORT_TABLES)
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f'{url} returned HTTP {response.status_code}')
+            rows = response.context[rows_key] if response.context else None
+            return len(rows) if rows is not None else 0
+        return run
+
+    def _measure(self, run, warmup, repeat):
+        for _ in range(warmup):
+            run()
+        samples = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                rows = run()
+                samples.append((time.perf_counter() - started) * 1000)
+        return {
+            **_percentiles(samples),
+            'mean_ms': statistics.fmean(samples),
+            'queries': len(queries),
+            'rows': rows,
+        }
+
+
+def compare(baseline, results, threshold):
+    """List the benchmarks whose p95 latency or query count got worse than the baseline allows"""
+    regressions = []
+    for scale, benchmarks in results.items():
+        for name, stats in benchmarks.items():
+            before = baseline.get(scale, {}).get(name)
+            if before is None:
+                continue
+            if stats['p95_ms'] > before['p95_ms'] * threshold and stats['p95_ms'] - before['p95_ms'] > NOISE_FLOOR_MS:
+                regressions.append(f'scale {scale} {name}: p95 {before["p95_ms"]:.2f}ms -> {stats["p95_ms"]:.2f}ms')
+            if stats['queries'] > before['queries']:
+                regressions.append(f'scale {scale} {name}: {before["queries"]} -> {stats["queries"]} queries')
+    return regressions
@@ -0,0 +1,107 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from club.exports import DEFAULT_CHUNK_SIZE, FORMATS, default_format, export_table, pyarrow
+
+
+class Command(BaseCommand):
+    help = ('Export the club tables to one compressed file each, Parquet by default when pyarrow is installed and '
+            'gzipped CSV otherwise, reading them in primary key order one chunk at a time. With --watermarks, only '
+            'the rows added since the previous export are written.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory the files are written to, created if needed')
+        parser.add_argument('--tables', nargs='+', metavar='TABLE',
+                            help='Model or table names to export (default: every club table)')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='File format (default: parquet with pyarrow installed, csv otherwise)')
+        parser.add_argument('--watermarks', metavar='PATH',
+                            help='JSON file with the last primary key exported of each table: only later rows are '
+                                 'exported, and the file is updated afterwards')
+        parser.add_argument('--jobs', type=int, default=1, help='Tables exported in parallel (default: 1)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help=f'Rows read and written at a time per table (default: {DEFAULT_CHUNK_SIZE})')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if options['jobs'] < 1:
+            raise CommandError('--jobs must be positive')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        self.verbosity = options['verbosity']
+        file_format = options['format'] or default_format()
+        if file_format != 'csv' and pyarrow is None:
+            raise CommandError(f'The {file_format} format requires pyarrow, install it or use --format csv')
+        models = self._models(options['tables'])
+        watermarks = self._read_watermarks(options['watermarks'])
+        os.makedirs(options['directory'], exist_ok=True)
+
+        def export(model):
+            try:
+                return export_table(
+                    model, options['directory'], file_format, after=watermarks.get(model._meta.db_table),
+                    chunk_size=options['chunk_size'], using=options['database'],
+                )
+            finally:
+                if options['jobs'] > 1:
+                    # Each worker thread opened its own connection
+                    connections.close_all()
+
+        exported = []
+        try:
+            if options['jobs'] == 1:
+                for model in models:
+                    exported.append(export(model))
+                    self._report(exported[-1])
+            else:
+                with ThreadPoolExecutor(max_workers=options['jobs']) as executor:
+                    for result in executor.map(export, models):
+                        exported.append(result)
+                        self._report(result)
+        finally:
+            # The tables exported before a failure keep their new watermark
+            if options['watermarks'] and exported:
+                watermarks.update({result.table: result.watermark for result in exported
+                                   if result.watermark is not None})
+                self._write_watermarks(options['watermarks'], watermarks)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {sum(result.rows for result in exported)} rows of {len(exported)} tables '
+            f'to {options["directory"]} as {file_format}'
+        ))
+
+    def _models(self, names):
+        models = list(apps.get_app_config('club').get_models())
+        if not names:
+            return models
+        by_name = {}
+        for model in models:
+            by_name[model.__name__.lower()] = model
+            by_name[model._meta.db_table] = model
+        unknown = [name for name in names if name.lower() not in by_name]
+        if unknown:
+            raise CommandError(f'Unknown tables: {", ".join(unknown)}')
+        return list(dict.fromkeys(by_name[name.lower()] for name in names))
+
+    def _read_watermarks(self, path):
+        if not path or not os.path.exists(path):
+            return {}
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read the watermarks in {path}: {e}')
+
+    def _write_watermarks(self, path, watermarks):
+        with open(f'{path}.partial', 'w') as f:
+            json.dump(watermarks, f, indent=2, sort_keys=True)
+        os.replace(f'{path}.partial', path)
+
+    def _report(self, result):
+        if self.verbosity >= 1:
+            self.stdout.write(f'- {result.table}: {result.rows} rows in {result.seconds:.2f}s -> {result.path}')
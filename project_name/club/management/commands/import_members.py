@@ -0,0 +1,54 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from club.imports import MemberImporter, MemberImportError
+
+
+class Command(BaseCommand):
+    help = ('Import club members from a CSV file with a header row, validated and inserted in batches. '
+            'Rejected rows are written to an error CSV with their line number and the reasons.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file to import, UTF-8 encoded')
+        parser.add_argument('--errors', help='Where to write the rejected rows (default: <path>.errors.csv)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows validated and inserted together in one transaction (default: 1000)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        path = Path(options['path'])
+        errors_path = Path(options['errors'] or f'{path}.errors.csv')
+        log = self.stdout.write if options['verbosity'] >= 1 else None
+        importer = MemberImporter(batch_size=options['batch_size'], log=log)
+
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as rows, \
+                    open(errors_path, 'w', encoding='utf-8', newline='') as errors:
+                counts = importer.run(rows, errors)
+        except OSError as e:
+            raise CommandError(f'Cannot import {path}: {e}')
+        except MemberImportError as e:
+            raise CommandError(f'{path}: {e}')
+        except DatabaseError as e:
+            raise CommandError(f'Import stopped after {importer.counts["imported"]} committed members: {e}') from e
+        except UnicodeDecodeError as e:
+            counts = importer.counts
+            rejected = f', {counts["rejected"]} rows rejected, see {errors_path}' if counts['rejected'] else ''
+            if not counts['rejected']:
+                errors_path.unlink()
+            raise CommandError(
+                f'{path} is not UTF-8 encoded after {counts["rows"]} rows: import stopped after {counts["imported"]} '
+                f'committed members{rejected}'
+            ) from e
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {counts["imported"]} of {counts["rows"]} members, with {counts["family_members"]} new '
+            f'family members and {counts["relationships"]} family relationships'
+        ))
+        if counts['rejected']:
+            self.stdout.write(self.style.WARNING(f'{counts["rejected"]} rows rejected, see {errors_path}'))
+        else:
+            errors_path.unlink()
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from club.models import Location, LocationStats, SessionTeams
+from queries_asked.cache import invalidate_tables
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the LocationStats summary table and the member/player counter caches from the source tables '
+            'and report any drift')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only compare the stored statistics with fresh ones; exit with an error if they differ',
+        )
+
+    def handle(self, *args, **options):
+        fresh = LocationStats.compute()
+        stored = {
+            stats.pk: {field: getattr(stats, field) for field in LocationStats.TRACKED_FIELDS}
+            for stats in LocationStats.objects.all()
+        }
+
+        drifted = []
+        for location_id, values in fresh.items():
+            if stored.get(location_id) != values:
+                drifted.append(location_id)
+                self.stdout.write(f'Location {location_id}: stored {stored.get(location_id)} != actual {values}')
+        stale = set(stored) - set(fresh)
+
+        if options['check']:
+            member_counts = Location.recount_members(fix=False)
+            player_counts = SessionTeams.recount_players(fix=False)
+            if drifted or stale or member_counts or player_counts:
+                raise CommandError(
+                    f'{len(drifted)} location(s) drifted, {len(stale)} stale row(s), '
+                    f'{member_counts} wrong member count(s), {player_counts} wrong player count(s)'
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f'LocationStats and counter caches are up to date ({len(fresh)} locations)'
+            ))
+            return
+
+        with transaction.atomic():
+            LocationStats.objects.all().delete()
+            LocationStats.objects.bulk_create(
+                LocationStats(location_id=location_id, **values) for location_id, values in fresh.items()
+            )
+            member_counts = Location.recount_members()
+            player_counts = SessionTeams.recount_players()
+        invalidate_tables([LocationStats._meta.db_table, Location._meta.db_table, SessionTeams._meta.db_table])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt LocationStats for {len(fresh)} locations ({len(drifted)} had drifted), '
+            f'fixed {member_counts} member count(s) and {player_counts} player count(s)'
+        ))
@@ -0,0 +1,8 @@
+from club.management.rebuild import SummaryTableCommand
+from club.models import MemberPlayStats
+
+
+class Command(SummaryTableCommand):
+    help = 'Repair the MemberPlayStats table from the rosters and game outcomes and report any drift'
+    model = MemberPlayStats
+    label = 'members'
@@ -9,12 +9,35 @@ from club.models import (
     Sessions, SessionTeams, PlayerAssignment, Payments,
     FamilyRelationship, MemberHobbies, EmailLog
 )
+from club.synthetic import MEMBERS_PER_LOCATION, SyntheticDataGenerator
 
 
 class Command(BaseCommand):
     help = 'Populate the database with clean demo data for testing purposes'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=int,
+            default=0,
+            help=f'Generate synthetic data instead of the demo rows: N locations with '
+                 f'{MEMBERS_PER_LOCATION} members each and their related records',
+        )
+        parser.add_argument('--seed', type=int, default=353, help='Random seed for --scale (default: 353)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert for --scale')
+
     def handle(self, *args, **kwargs):
+        if kwargs['scale'] > 0:
+            self.stdout.write(f'Generating synthetic data at scale {kwargs["scale"]} (seed {kwargs["seed"]})...')
+            SyntheticDataGenerator(
+                kwargs['scale'],
+                seed=kwargs['seed'],
+                batch_size=kwargs['batch_size'],
+                log=self.stdout.write,
+            ).run()
+            self.stdout.write(self.style.SUCCESS('Successfully populated database with synthetic data.'))
+            return
+
         self.stdout.write('Starting database population...')
 
         # Create locations
@@ -0,0 +1,60 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, Max, Min, OuterRef
+
+from club.models import ClubMember, Location, LocationStats, Payments
+from queries_asked.cache import invalidate_tables
+
+
+class Command(BaseCommand):
+    help = ('Recompute the stored ClubMember.minor flag from birthdate and ClubMember.activity from the '
+            'current year\'s membership payments, using set-based UPDATE statements over member id ranges')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50000,
+                            help='Member ids covered by each group of UPDATE statements (default: 50000)')
+        parser.add_argument('--today', type=date.fromisoformat,
+                            help='Reference date as YYYY-MM-DD (default: today)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the rows that would change')
+
+    def handle(self, *args, **options):
+        today = options['today'] or date.today()
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        paid_this_year = Exists(Payments.objects.filter(
+            member=OuterRef('pk'), membership_year=today.year, payment_type='membership'))
+        members = ClubMember.objects.all()
+        # (flag, new value, members whose stored flag must become that value)
+        changes = [
+            ('minor', True, members.minors(today).exclude(minor=True)),
+            ('minor', False, members.majors(today).exclude(minor=False)),
+            ('activity', True, members.filter(paid_this_year, activity=False)),
+            ('activity', False, members.filter(~paid_this_year, activity=True)),
+        ]
+
+        bounds = members.aggregate(first=Min('pk'), last=Max('pk'))
+        changed = {'minor': 0, 'activity': 0}
+        if bounds['first'] is not None:
+            for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+                id_range = (start, start + batch_size - 1)
+                with transaction.atomic():
+                    for flag, value, queryset in changes:
+                        queryset = queryset.filter(pk__range=id_range)
+                        changed[flag] += queryset.count() if options['dry_run'] else queryset.update(**{flag: value})
+
+        if options['dry_run']:
+            self.stdout.write(f'Would update minor on {changed["minor"]} and activity on {changed["activity"]} members')
+            return
+        # Bulk updates bypass the signals that keep the minor/major counts of LocationStats and the report cache current
+        if changed['minor']:
+            LocationStats.refresh(Location.objects.values_list('pk', flat=True))
+        if changed['minor'] or changed['activity']:
+            invalidate_tables([ClubMember._meta.db_table])
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated minor on {changed["minor"]} and activity on {changed["activity"]} members'
+        ))
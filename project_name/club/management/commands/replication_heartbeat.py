@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from club.models import ReplicationHeartbeat
+
+
+class Command(BaseCommand):
+    help = ('Write the current time to the ReplicationHeartbeat row of the primary database; the read replica\'s '
+            'copy of it tells how far replication lags behind')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help='Keep beating every this many seconds instead of writing once')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        if interval is not None and interval <= 0:
+            raise CommandError('--interval must be positive')
+        while True:
+            ReplicationHeartbeat.beat_now()
+            if interval is None:
+                break
+            time.sleep(interval)
+        self.stdout.write(self.style.SUCCESS('Heartbeat written'))
@@ -0,0 +1,124 @@
+import heapq
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+from club.management.sqlscript import SQLScriptError, iter_statements
+from queries_asked.cache import invalidate_tables
+from queries_asked.signals import REPORT_TABLES
+
+DEFAULT_SCRIPT = Path(__file__).resolve().parent.parent / 'sql' / 'my_long_script.sql'
+
+# Slowest statements listed at the end of a run
+SLOWEST_SHOWN = 5
+
+
+def _preview(sql, length=70):
+    sql = ' '.join(sql[:length * 4].split())
+    return sql if len(sql) <= length else sql[:length - 3] + '...'
+
+
+class Command(BaseCommand):
+    help = ('Run a SQL script statement by statement without loading it into memory, committing every '
+            '--batch-size statements. After a failure, the failed batch is rolled back and the command prints '
+            'the --start-at value resuming from it. DDL statements commit implicitly on MySQL.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default=str(DEFAULT_SCRIPT),
+                            help='SQL script to run (default: club/management/sql/my_long_script.sql)')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Statements per transaction (default: 100)')
+        parser.add_argument('--start-at', type=int, default=1,
+                            help='Number of the first statement to run, skipping the ones before (default: 1)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only split the script and list its statements')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        if options['start_at'] < 1:
+            raise CommandError('--start-at must be positive')
+        self.verbosity = options['verbosity']
+        self.database = options['database']
+        connection = connections[self.database]
+        path = options['path']
+
+        try:
+            with open(path, encoding='utf-8') as script:
+                statements = (
+                    statement for statement in iter_statements(script, mysql=connection.vendor == 'mysql')
+                    if statement.number >= options['start_at']
+                )
+                if options['dry_run']:
+                    self._list(statements)
+                else:
+                    self._run(connection, statements, options['batch_size'])
+        except OSError as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+        except SQLScriptError as e:
+            raise CommandError(f'{path}: {e}')
+
+    def _list(self, statements):
+        count = 0
+        for statement in statements:
+            count += 1
+            self.stdout.write(f'#{statement.number} line {statement.line}: {_preview(statement.sql)}')
+        self.stdout.write(f'{count} statements would run')
+
+    def _run(self, connection, statements, batch_size):
+        self.started = time.monotonic()
+        self.executed = 0
+        # (duration, number, line, preview) of the slowest statements so far
+        self.slowest = []
+        batch = []
+        try:
+            for statement in statements:
+                batch.append(statement)
+                if len(batch) == batch_size:
+                    self._run_batch(connection, batch)
+                    batch = []
+            if batch:
+                self._run_batch(connection, batch)
+        finally:
+            # Raw SQL bypasses the signals keeping the report cache current
+            if self.executed:
+                invalidate_tables(REPORT_TABLES)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Ran {self.executed} statements in {time.monotonic() - self.started:.1f}s'
+        ))
+        if self.slowest:
+            self.stdout.write('Slowest statements:')
+        for duration, number, line, preview in sorted(self.slowest, reverse=True):
+            self.stdout.write(f'  {duration:9.1f}ms  #{number} line {line}: {preview}')
+
+    def _run_batch(self, connection, batch):
+        with transaction.atomic(using=self.database), connection.cursor() as cursor:
+            for statement in batch:
+                started = time.perf_counter()
+                try:
+                    cursor.execute(statement.sql)
+                except DatabaseError as e:
+                    raise CommandError(
+                        f'Statement #{statement.number} (line {statement.line}) failed: {e}\n'
+                        f'Statements #{batch[0].number}-#{batch[-1].number} were rolled back, the ones before '
+                        f'are committed; rerun with --start-at {batch[0].number} to resume'
+                    ) from e
+                duration = (time.perf_counter() - started) * 1000
+                entry = (duration, statement.number, statement.line, _preview(statement.sql))
+                if len(self.slowest) < SLOWEST_SHOWN:
+                    heapq.heappush(self.slowest, entry)
+                else:
+                    heapq.heappushpop(self.slowest, entry)
+                if self.verbosity >= 2:
+                    self.stdout.write(f'  #{statement.number} line {statement.line} {duration:.1f}ms: '
+                                      f'{_preview(statement.sql)}')
+        self.executed += len(batch)
+        if self.verbosity >= 1:
+            self.stdout.write(
+                f'Committed #{batch[0].number}-#{batch[-1].number} (through line {batch[-1].line}), '
+                f'{self.executed} statements in {time.monotonic() - self.started:.1f}s'
+            )
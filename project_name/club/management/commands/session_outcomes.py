@@ -0,0 +1,13 @@
+from club.management.rebuild import KEY_BATCH_SIZE, SummaryTableCommand
+from club.models import MemberPlayStats, SessionOutcome
+
+
+class Command(SummaryTableCommand):
+    help = 'Repair the SessionOutcome table from the team scores and report any drift'
+    model = SessionOutcome
+    label = 'games'
+
+    def changed(self, keys):
+        # Bulk writes send no signals, so the wins and losses of the players of those games are refreshed here
+        for start in range(0, len(keys), KEY_BATCH_SIZE):
+            MemberPlayStats.refresh_sessions(keys[start:start + KEY_BATCH_SIZE])
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = ('Refresh the SQLite query planner statistics with PRAGMA optimize and checkpoint the WAL file back '
+            'into the database; meant to run periodically, e.g. hourly from cron')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkpoint-mode', default='TRUNCATE',
+                            choices=['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'],
+                            help='PRAGMA wal_checkpoint mode; TRUNCATE also empties the WAL file (default: TRUNCATE)')
+        parser.add_argument('--analyze', action='store_true',
+                            help='Run a full ANALYZE instead of letting PRAGMA optimize pick the tables')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'sqlite_maintenance only applies to SQLite, not {connection.vendor}')
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE' if options['analyze'] else 'PRAGMA optimize')
+            self.stdout.write('Analyzed every table' if options['analyze'] else 'Ran PRAGMA optimize')
+
+            cursor.execute('PRAGMA journal_mode')
+            if cursor.fetchone()[0].lower() != 'wal':
+                self.stdout.write('Not in WAL mode, nothing to checkpoint')
+                return
+            cursor.execute(f'PRAGMA wal_checkpoint({options["checkpoint_mode"]})')
+            busy, wal_pages, checkpointed = cursor.fetchone()
+        if busy:
+            self.stdout.write(self.style.WARNING(
+                f'Checkpoint blocked by other connections: {checkpointed} of {wal_pages} WAL pages copied'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Checkpointed {checkpointed} of {wal_pages} WAL pages'))
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from queries_asked.cache import invalidate_tables
+
+# Primary keys per statement, below the bound parameter limits of every backend
+KEY_BATCH_SIZE = 500
+
+
+class SummaryTableCommand(BaseCommand):
+    """
+    Base for the commands repairing a summary table keyed by a one-to-one primary key, such as SessionOutcome.
+    The model provides TRACKED_FIELDS and compute() returning {pk: {field: value}}; only the rows that differ
+    from a fresh computation are written, so a repair costs in proportion to the drift.
+    """
+    model = None
+    label = 'rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only compare the stored rows with fresh ones; exit with an error if they differ',
+        )
+
+    def changed(self, keys):
+        """Called with the primary keys whose row was created, updated or deleted"""
+
+    def handle(self, *args, **options):
+        model = self.model
+        key = model._meta.pk.attname
+        fresh = model.compute()
+        stored = {
+            row.pop(key): row
+            for row in model.objects.values(key, *model.TRACKED_FIELDS).iterator(chunk_size=5000)
+        }
+        drifted = [pk for pk, values in fresh.items() if stored.get(pk) != values]
+        stale = sorted(set(stored) - set(fresh))
+
+        name = model.__name__
+        if options['check']:
+            if drifted or stale:
+                raise CommandError(f'{len(drifted)} {self.label} drifted, {len(stale)} stale row(s) in {name}')
+            self.stdout.write(self.style.SUCCESS(f'{name} is up to date ({len(fresh)} {self.label})'))
+            return
+
+        with transaction.atomic():
+            for start in range(0, len(stale), KEY_BATCH_SIZE):
+                model.objects.filter(pk__in=stale[start:start + KEY_BATCH_SIZE]).delete()
+            model.objects.bulk_update(
+                [model(**{key: pk}, **fresh[pk]) for pk in drifted if pk in stored],
+                model.TRACKED_FIELDS, batch_size=2000,
+            )
+            model.objects.bulk_create(
+                [model(**{key: pk}, **fresh[pk]) for pk in drifted if pk not in stored], batch_size=2000,
+            )
+            self.changed(drifted + stale)
+        invalidate_tables([model._meta.db_table])
+        self.stdout.write(self.style.SUCCESS(
+            f'{name} is up to date ({len(fresh)} {self.label}); {len(drifted)} row(s) written, {len(stale)} removed'
+        ))
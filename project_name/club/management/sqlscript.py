@@ -0,0 +1,146 @@
+"""
+Streaming splitter for SQL scripts, used by `run_sql`.
+
+The script is read one line at a time and each statement is yielded as soon as its terminator is read, so
+memory use is bounded by the largest statement rather than the size of the file.
+"""
+import re
+from collections import namedtuple
+
+Statement = namedtuple('Statement', ['number', 'line', 'sql'])
+
+
+class SQLScriptError(ValueError):
+    """Raised when a script ends inside a string literal, a quoted identifier or a block comment"""
+
+
+# Statements whose BEGIN ... END body holds semicolons: the body ends at an END right after a semicolon
+_COMPOUND = re.compile(
+    r'\s*CREATE\s+(?:(?:TEMP|TEMPORARY)\s+)?(?:DEFINER\s*=\s*\S+\s+)?(?:TRIGGER|PROCEDURE|FUNCTION|EVENT)\b', re.I)
+_BEGIN = re.compile(r'\bBEGIN\b', re.I)
+# MySQL client directive changing the statement terminator, e.g. DELIMITER $$
+_DELIMITER = re.compile(r'\s*DELIMITER\s+(\S+)\s*$', re.I)
+
+_QUOTE_NAMES = {"'": 'a string literal', '"': 'a quoted identifier', '`': 'a quoted identifier',
+                '/*': 'a block comment'}
+
+
+def _special_tokens(delimiter, mysql):
+    tokens = [re.escape(delimiter), '--', r'/\*', "'", '"', '`'] + (['#'] if mysql else [])
+    return re.compile('|'.join(tokens))
+
+
+def iter_statements(lines, mysql=False):
+    """
+    Yield the statements of an iterable of lines as Statement(number, line, sql), numbered from 1, with the
+    line each starts on. Semicolons inside string literals, quoted identifiers, comments and the BEGIN ... END
+    body of triggers and routines do not end a statement. With mysql, DELIMITER lines change the terminator,
+    # starts a comment and a backslash escapes the next character of a quoted string, as in the MySQL client.
+    """
+    delimiter = ';'
+    special = _special_tokens(delimiter, mysql)
+    number = 0
+    # Text of the current statement, its code without literals and comments, and the code since its last ';'
+    text, code, since_semicolon = [], [], []
+    # Line of the first code of the current statement, None while it only holds whitespace and comments
+    start_line = None
+    state = None
+    opened_at = None
+
+    def finish():
+        nonlocal number, start_line
+        statement = None
+        if start_line is not None:
+            number += 1
+            statement = Statement(number, start_line, ''.join(text).strip())
+        text.clear()
+        code.clear()
+        since_semicolon.clear()
+        start_line = None
+        return statement
+
+    def ends_statement():
+        if delimiter != ';':
+            return True
+        statement_code = ''.join(code)
+        if _COMPOUND.match(statement_code) and _BEGIN.search(statement_code):
+            return ''.join(since_semicolon).strip().upper() == 'END'
+        return True
+
+    for line_number, line in enumerate(lines, start=1):
+        if state is None and start_line is None:
+            directive = _DELIMITER.match(line) if mysql else None
+            if directive:
+                delimiter = directive[1]
+                special = _special_tokens(delimiter, mysql)
+                finish()
+                continue
+
+        pos = 0
+        while pos < len(line):
+            if state is None:
+                match = special.search(line, pos)
+                chunk = line[pos:match.start() if match else len(line)]
+                if start_line is None and chunk.strip():
+                    start_line = line_number
+                text.append(chunk)
+                code.append(chunk)
+                since_semicolon.append(chunk)
+                if match is None:
+                    break
+                token, pos = match[0], match.end()
+                if token == delimiter:
+                    if ends_statement():
+                        statement = finish()
+                        if statement is not None:
+                            yield statement
+                    else:
+                        text.append(token)
+                        code.append(token)
+                        since_semicolon.clear()
+                    continue
+                if token in ('--', '#'):
+                    text.append(line[match.start():])
+                    break
+                if start_line is None and token != '/*':
+                    start_line = line_number
+                # A literal or comment separates the words around it
+                text.append(token)
+                code.append(' ')
+                since_semicolon.append(' ')
+                state, opened_at = token, line_number
+            elif state == '/*':
+                end = line.find('*/', pos)
+                if end < 0:
+                    text.append(line[pos:])
+                    break
+                text.append(line[pos:end + 2])
+                pos = end + 2
+                state = None
+            else:
+                scan = pos
+                while True:
+                    end = line.find(state, scan)
+                    if mysql and state in ("'", '"'):
+                        escape = line.find('\\', scan)
+                        if escape >= 0 and (end < 0 or escape < end):
+                            scan = escape + 2
+                            continue
+                    if end < 0:
+                        text.append(line[pos:])
+                        pos = len(line)
+                        break
+                    if line.startswith(state, end + 1):  # Doubled quote
+                        scan = end + 2
+                        continue
+                    text.append(line[pos:end + 1])
+                    pos = end + 1
+                    state = None
+                    break
+
+    if state is not None:
+        raise SQLScriptError(f'The script ends inside {_QUOTE_NAMES[state]} opened on line {opened_at}')
+    # The last statement may omit its terminator
+    statement = finish()
+    if statement is not None:
+        yield statement
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('club', '0002_alter_clubmember_table_alter_emaillog_table_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clubmember',
+            index=models.Index(fields=['last_name', 'first_name', 'member_id'], name='clubmember_name_keyset_idx'),
+        ),
+    ]
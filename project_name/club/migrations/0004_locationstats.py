@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Concat
+
+
+def populate_location_stats(apps, schema_editor):
+    # The computation of LocationStats.compute, on the models as of this migration
+    Location = apps.get_model('club', 'Location')
+    current_manager = apps.get_model('club', 'PersonnelAssignment').objects.filter(
+        location=OuterRef('pk'), role='general manager', end_date__isnull=True
+    ).order_by('-start_date', '-pk')
+    team_count = apps.get_model('club', 'SessionTeams').objects.filter(location=OuterRef('pk')).order_by().values(
+        'location').annotate(total=Count('pk')).values('total')
+    rows = Location.objects.annotate(
+        minor_members=Count('clubmember', filter=Q(clubmember__minor=True)),
+        major_members=Count('clubmember', filter=Q(clubmember__minor=False)),
+        team_count=Coalesce(Subquery(team_count), 0),
+        general_manager_id=Subquery(current_manager.values('personnel_id')[:1]),
+        general_manager_name=Subquery(current_manager.annotate(
+            full_name=Concat('personnel__first_name', Value(' '), 'personnel__last_name')
+        ).values('full_name')[:1]),
+    ).values('pk', 'minor_members', 'major_members', 'team_count', 'general_manager_id', 'general_manager_name')
+    LocationStats = apps.get_model('club', 'LocationStats')
+    LocationStats.objects.bulk_create(
+        [LocationStats(location_id=row.pop('pk'), **row) for row in rows.iterator(chunk_size=2000)],
+        batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('club', '0003_clubmember_name_keyset_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationStats',
+            fields=[
+                ('location', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='club.location')),
+                ('minor_members', models.PositiveIntegerField(default=0)),
+                ('major_members', models.PositiveIntegerField(default=0)),
+                ('team_count', models.PositiveIntegerField(default=0)),
+                ('general_manager_name', models.CharField(blank=True, max_length=101, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('general_manager', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='club.personnel')),
+            ],
+        ),
+        migrations.RunPython(populate_location_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:26
+
+from datetime import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_starts_at(apps, schema_editor):
+    Sessions = apps.get_model('club', 'Sessions')
+    batch = []
+    for session in Sessions.objects.only('session_date', 'session_time').iterator(chunk_size=2000):
+        starts_at = datetime.combine(session.session_date, session.session_time)
+        session.starts_at = timezone.make_aware(starts_at) if settings.USE_TZ else starts_at
+        batch.append(session)
+        if len(batch) >= 2000:
+            Sessions.objects.bulk_update(batch, ['starts_at'])
+            batch = []
+    if batch:
+        Sessions.objects.bulk_update(batch, ['starts_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('club', '0004_locationstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessions',
+            name='starts_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_starts_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    for model_name, counter, counted_name, foreign_key in [
+        ('Location', 'member_count', 'ClubMember', 'location'),
+        ('SessionTeams', 'player_count', 'PlayerAssignment', 'team'),
+    ]:
+        counted = apps.get_model('club', counted_name).objects.filter(**{foreign_key: OuterRef('pk')})
+        apps.get_model('club', model_name).objects.update(**{counter: Coalesce(Subquery(
+            counted.order_by().values(foreign_key).annotate(total=Count('pk')).values('total')
+        ), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('club', '0005_sessions_starts_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='sessionteams',
+            name='player_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_outcomes(apps, schema_editor):
+    SessionTeams = apps.get_model('club', 'SessionTeams')
+    SessionOutcome = apps.get_model('club', 'SessionOutcome')
+    scored = {}
+    for session_id, team_id, score in SessionTeams.objects.filter(
+            session__session_type='game', score__isnull=False).values_list('session_id', 'team_id', 'score'):
+        scored.setdefault(session_id, []).append((team_id, score))
+    outcomes = []
+    for session_id, teams in scored.items():
+        if len(teams) != 2:
+            continue
+        (winner_id, winner_score), (loser_id, loser_score) = sorted(teams, key=lambda team: -team[1])
+        if winner_score == loser_score:
+            outcomes.append(SessionOutcome(session_id=session_id, is_tie=True))
+        else:
+            outcomes.append(SessionOutcome(session_id=session_id, winner_id=winner_id, loser_id=loser_id,
+                                           margin=winner_score - loser_score))
+    SessionOutcome.objects.bulk_create(outcomes, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('club', '0006_counter_caches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionOutcome',
+            fields=[
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='outcome', serialize=False, to='club.sessions')),
+                ('is_tie', models.BooleanField(default=False)),
+                ('margin', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('loser', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='club.sessionteams')),
+                ('winner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='club.sessionteams')),
+            ],
+        ),
+        migrations.RunPython(populate_outcomes, migrations.RunPython.noop),
+    ]
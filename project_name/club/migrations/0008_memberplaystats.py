@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_play_stats(apps, schema_editor):
+    PlayerAssignment = apps.get_model('club', 'PlayerAssignment')
+    MemberPlayStats = apps.get_model('club', 'MemberPlayStats')
+    choices = PlayerAssignment._meta.get_field('position').choices
+    bits = {position: 1 << i for i, (position, _) in enumerate(choices)}
+    stats = {}
+    for member_id, position, team_id, session_type, winner_id, loser_id in PlayerAssignment.objects.values_list(
+            'member_id', 'position', 'team_id', 'team__session__session_type',
+            'team__session__outcome__winner_id', 'team__session__outcome__loser_id').iterator(chunk_size=5000):
+        row = stats.setdefault(member_id, MemberPlayStats(member_id=member_id))
+        bit = bits.get(position, 1 << len(bits))
+        if session_type == 'game':
+            row.games_played += 1
+            row.game_positions |= bit
+            row.wins += team_id == winner_id
+            row.losses += team_id == loser_id
+        else:
+            row.trainings_played += 1
+            row.training_positions |= bit
+    MemberPlayStats.objects.bulk_create(stats.values(), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('club', '0007_sessionoutcome'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberPlayStats',
+            fields=[
+                ('member', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='play_stats', serialize=False, to='club.clubmember')),
+                ('games_played', models.PositiveIntegerField(default=0)),
+                ('trainings_played', models.PositiveIntegerField(default=0)),
+                ('game_positions', models.PositiveSmallIntegerField(default=0)),
+                ('training_positions', models.PositiveSmallIntegerField(default=0)),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('losses', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(populate_play_stats, migrations.RunPython.noop),
+    ]
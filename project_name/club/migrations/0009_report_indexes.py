@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('club', '0008_memberplaystats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='clubmember',
+            index=models.Index(fields=['activity', 'location'], name='clubmember_activity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emaillog',
+            index=models.Index(fields=['receiver_member', 'email_date'], name='emaillog_receiver_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payments',
+            index=models.Index(fields=['member', 'membership_year'], name='payments_member_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personnelassignment',
+            index=models.Index(fields=['location', 'role', 'end_date'], name='personnel_location_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playerassignment',
+            index=models.Index(fields=['member', 'position'], name='playerassignment_member_idx'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:40
+
+from django.db import migrations
+
+SEARCH_TABLE = 'club_person_search'
+# (table, primary key, kind code); the index rowid of a person is primary key * 4 + kind code, see club/search.py
+SOURCES = [
+    ('club_clubmember', 'member_id', 1),
+    ('club_familymember', 'member_id', 2),
+    ('club_personnel', 'personnel_id', 3),
+]
+INDEXED_COLUMNS = 'first_name, last_name, email, phone, postal_code'
+
+
+def _digits(column):
+    """SQL expression of a phone number without its punctuation, so that 5145550100 finds 514-555-0100"""
+    expression = column
+    for character in ('-', ' ', '(', ')', '.', '+'):
+        expression = f"replace({expression}, '{character}', '')"
+    return expression
+
+
+def _index_row(row, pk, code):
+    return (f'{row}.{pk} * 4 + {code}, {row}.first_name, {row}.last_name, {row}.email, {row}.phone, '
+            f'{_digits(f"{row}.phone")}, {row}.postal_code')
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        # Prefix indexes of up to 3 characters make short prefix queries as fast as whole words
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5('
+            f'first_name, last_name, email, phone, phone_digits, postal_code, '
+            f"tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3')"
+        )
+        insert = f'INSERT INTO {SEARCH_TABLE} (rowid, first_name, last_name, email, phone, phone_digits, postal_code)'
+        for table, pk, code in SOURCES:
+            schema_editor.execute(f'{insert} SELECT {_index_row(table, pk, code)} FROM {table}')
+            schema_editor.execute(
+                f'CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN '
+                f'{insert} VALUES ({_index_row("new", pk, code)}); END'
+            )
+            schema_editor.execute(
+                f'CREATE TRIGGER {table}_search_update AFTER UPDATE OF {INDEXED_COLUMNS} ON {table} BEGIN '
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = old.{pk} * 4 + {code}; '
+                f'{insert} VALUES ({_index_row("new", pk, code)}); END'
+            )
+            schema_editor.execute(
+                f'CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN '
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = old.{pk} * 4 + {code}; END'
+            )
+    elif vendor == 'mysql':
+        # InnoDB maintains FULLTEXT indexes itself
+        for table, _, _ in SOURCES:
+            schema_editor.execute(f'ALTER TABLE {table} ADD FULLTEXT INDEX {table}_search ({INDEXED_COLUMNS})')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for table, _, _ in SOURCES:
+            for event in ('insert', 'update', 'delete'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_search_{event}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+    elif vendor == 'mysql':
+        for table, _, _ in SOURCES:
+            schema_editor.execute(f'ALTER TABLE {table} DROP INDEX {table}_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('club', '0010_replicationheartbeat'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
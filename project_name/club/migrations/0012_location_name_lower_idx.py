@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:39
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('club', '0011_person_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='location_name_lower_idx'),
+        ),
+    ]
@@ -1,8 +1,66 @@
 import uuid
 
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import (
+    BooleanField, Case, Count, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Value, When
+)
+from django.db.models.functions import Coalesce, Concat, ExtractYear, Lower
 from django.core.exceptions import ValidationError
-from datetime import date, timedelta
+from django.utils import timezone
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+MAJORITY_AGE = 18
+MINIMUM_MEMBER_AGE = 11
+MINOR_ANNUAL_FEE = Decimal('100.00')
+MAJOR_ANNUAL_FEE = Decimal('200.00')
+
+
+def majority_cutoff(today=None):
+    """Latest birthdate of a person who is an adult on `today` (members born after it are minors)"""
+    today = today or date.today()
+    try:
+        return today.replace(year=today.year - MAJORITY_AGE)
+    except ValueError:  # 29 February in a leap year
+        return today.replace(year=today.year - MAJORITY_AGE, day=28)
+
+def _recount(model, counter, counted_model, foreign_key, fix=True):
+    """
+    Set a counter-cache column to the actual number of related rows, only on the rows where it differs.
+    Returns the number of rows that had drifted; with fix=False they are only counted.
+    """
+    actual = Coalesce(Subquery(
+        counted_model.objects.filter(**{foreign_key: OuterRef('pk')}).order_by().values(foreign_key)
+        .annotate(total=Count('pk')).values('total')
+    ), 0)
+    drifted = model.objects.annotate(actual=actual).exclude(**{counter: F('actual')}).values('pk')
+    if not fix:
+        return drifted.count()
+    return model.objects.filter(pk__in=drifted).update(**{counter: actual})
+
+
+def _save_keeping_counter(instance, counter, save, *args, **kwargs):
+    """
+    Save an instance holding a counter-cache column without overwriting the counter with the value loaded into
+    memory, which may be stale: club.signals adjusts it in the database. update_fields leaves the counter out. A
+    full save of a stored row reads the counter again first, locking the row until the save is done, so that it
+    keeps Model.save()'s semantics, e.g. inserting the row again if it was deleted. Inserts, and saves to another
+    database than the instance was read from, keep the value of the instance.
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None:
+        return save(*args, **{**kwargs, 'update_fields': [name for name in update_fields if name != counter]})
+    using = kwargs.get('using') or instance._state.db
+    if instance._state.adding or kwargs.get('force_insert') or using != instance._state.db:
+        return save(*args, **kwargs)
+    with transaction.atomic(using=using):
+        current = type(instance)._base_manager.using(using).select_for_update().filter(
+            pk=instance.pk).values_list(counter, flat=True).first()
+        if current is not None:
+            setattr(instance, counter, current)
+        save(*args, **kwargs)
+
 
 class Person(models.Model):
     """
@@ -42,10 +100,30 @@ class Location(models.Model):
     web_address = models.URLField(max_length=255, blank=True, null=True)
     type = models.CharField(max_length=10, choices=TYPE_CHOICES)
     capacity = models.PositiveIntegerField()
+    # Counter cache of the members of the location, maintained by club.signals
+    member_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Case-insensitive prefix lookups of the location autocomplete, as a range on the lowercased name
+            models.Index(Lower('name'), name='location_name_lower_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.type})"
 
+    def save(self, *args, **kwargs):
+        _save_keeping_counter(self, 'member_count', super().save, *args, **kwargs)
+
+    @property
+    def is_full(self):
+        return self.member_count >= self.capacity
+
+    @classmethod
+    def recount_members(cls, fix=True):
+        """Recompute member_count from club_clubmember; returns the number of locations that had drifted"""
+        return _recount(cls, 'member_count', ClubMember, 'location', fix)
+
 
 class Hobbies(models.Model):
     """
@@ -84,26 +162,62 @@ class EmailLog(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     session = models.ForeignKey('Sessions', on_delete=models.CASCADE, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # A member's email history, newest first
+            models.Index(fields=['receiver_member', 'email_date'], name='emaillog_receiver_date_idx'),
+        ]
+
     def __str__(self):
         return f"Email to {self.receiver_email} on {self.email_date}"
 
+class PersonnelQuerySet(models.QuerySet):
+    def with_current_assignment(self):
+        """
+        Annotate the role, location id and location name of each person's current (open-ended)
+        assignment using subqueries, so listing personnel with their role costs a single query
+        """
+        current = PersonnelAssignment.objects.filter(
+            personnel=OuterRef('pk'), end_date__isnull=True
+        ).order_by('-start_date', '-pk')
+        return self.annotate(
+            current_role_name=Subquery(current.values('role')[:1]),
+            current_location_id=Subquery(current.values('location_id')[:1]),
+            current_location_name=Subquery(current.values('location__name')[:1]),
+        )
+
+
 class Personnel(Person):
     """
     Represents a person working at a club location
     """
     personnel_id = models.AutoField(primary_key=True)
 
+    objects = PersonnelQuerySet.as_manager()
+
     def __str__(self):
         return f"Personnel: {self.first_name} {self.last_name}"
 
+    def _current_assignment(self):
+        return self.personnelassignment_set.filter(end_date__isnull=True).order_by(
+            '-start_date', '-pk').select_related('location').first()
+
     def current_role(self):
         """Get current active role"""
-        current_assignment = self.personnelassignment_set.filter(end_date__isnull=True).first()
+        if hasattr(self, 'current_role_name'):
+            return self.current_role_name
+        current_assignment = self._current_assignment()
         return current_assignment.role if current_assignment else None
 
     def current_location(self):
         """Get current active location"""
-        current_assignment = self.personnelassignment_set.filter(end_date__isnull=True).first()
+        if hasattr(self, 'current_location_id'):
+            if self.current_location_id is None:
+                return None
+            # Only id and name are loaded; other fields are deferred
+            return Location.from_db(self._state.db, ['location_id', 'name'],
+                                    [self.current_location_id, self.current_location_name])
+        current_assignment = self._current_assignment()
         return current_assignment.location if current_assignment else None
 
 class PersonnelAssignment(models.Model):
@@ -145,6 +259,10 @@ class PersonnelAssignment(models.Model):
                 name='unique_personnel_start_date'
             )
         ]
+        indexes = [
+            # Current holder of a role at a location (end_date IS NULL), e.g. its general manager
+            models.Index(fields=['location', 'role', 'end_date'], name='personnel_location_role_idx'),
+        ]
 
     def __str__(self):
         return f"{self.personnel} as {self.role} at {self.location} from {self.start_date}"
@@ -185,6 +303,34 @@ class SecondaryFamilyMember(models.Model):
     def __str__(self):
         return f"Secondary Contact {self.first_name} {self.last_name}"
 
+class ClubMemberQuerySet(models.QuerySet):
+    def with_age(self, today=None):
+        """
+        Annotate age_years, is_minor_now and annual_fee_amount computed by the database.
+        Uses portable date extracts so it works the same on SQLite and MySQL.
+        """
+        today = today or date.today()
+        cutoff = majority_cutoff(today)
+        birthday_not_reached = Q(birthdate__month__gt=today.month) | Q(birthdate__month=today.month,
+                                                                       birthdate__day__gt=today.day)
+        return self.annotate(
+            age_years=Value(today.year) - ExtractYear('birthdate') - Case(
+                When(birthday_not_reached, then=Value(1)), default=Value(0), output_field=IntegerField()),
+            is_minor_now=Case(When(birthdate__gt=cutoff, then=Value(True)), default=Value(False),
+                              output_field=BooleanField()),
+            annual_fee_amount=Case(When(birthdate__gt=cutoff, then=Value(MINOR_ANNUAL_FEE)),
+                                   default=Value(MAJOR_ANNUAL_FEE),
+                                   output_field=DecimalField(max_digits=10, decimal_places=2)),
+        )
+
+    def minors(self, today=None):
+        """Members under 18 on `today`; a plain range filter on birthdate, so it can use an index"""
+        return self.filter(birthdate__gt=majority_cutoff(today))
+
+    def majors(self, today=None):
+        return self.filter(birthdate__lte=majority_cutoff(today))
+
+
 class ClubMember(Person):
     """
     Represents a club member who can be a minor or an adult
@@ -203,26 +349,42 @@ class ClubMember(Person):
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES)
     minor = models.BooleanField(null=True, blank=True)
 
+    objects = ClubMemberQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Backs keyset pagination of the member lists
+            models.Index(fields=['last_name', 'first_name', 'member_id'], name='clubmember_name_keyset_idx'),
+            # Active members, overall or of one location: the starting point of most reports
+            models.Index(fields=['activity', 'location'], name='clubmember_activity_idx'),
+        ]
+
     def __str__(self):
         return f"Member: {self.first_name} {self.last_name}"
 
+    # The properties below use the values annotated by ClubMember.objects.with_age() when present
+
     @property
     def age(self):
+        if hasattr(self, 'age_years'):
+            return self.age_years
         today = date.today()
         return today.year - self.birthdate.year - ((today.month, today.day) < (self.birthdate.month, self.birthdate.day))
 
     @property
     def is_minor(self):
-        return self.age < 18
+        if hasattr(self, 'is_minor_now'):
+            return self.is_minor_now
+        return self.age < MAJORITY_AGE
 
     @property
     def is_major(self):
-        return self.age >= 18
+        return not self.is_minor
 
     @property
     def annual_fee(self):
         """Constraint: $100 for minors, $200 for majors"""
-        return 100.00 if self.is_minor else 200.00
+        return float(MINOR_ANNUAL_FEE if self.is_minor else MAJOR_ANNUAL_FEE)
 
 
 class MemberHobbies(models.Model):
@@ -316,6 +478,10 @@ class Payments(models.Model):
                 name='valid_installment_number'
             )
         ]
+        indexes = [
+            # Whether a member paid a given membership year
+            models.Index(fields=['member', 'membership_year'], name='payments_member_year_idx'),
+        ]
 
 
 class Sessions(models.Model):
@@ -342,10 +508,28 @@ class Sessions(models.Model):
     postal_code = models.CharField(max_length=10, null=True, blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='scheduled')
     created_date = models.DateTimeField(auto_now_add=True)
+    # session_date + session_time stored as one indexed column so date-range reports can use an index range scan
+    starts_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
 
     def __str__(self):
         return f"{self.session_type.title()} on {self.session_date} at {self.session_time}"
 
+    def compute_starts_at(self):
+        """Combine session_date and session_time into the value stored in starts_at"""
+        session_date = self._meta.get_field('session_date').to_python(self.session_date)
+        session_time = self._meta.get_field('session_time').to_python(self.session_time)
+        if session_date is None or session_time is None:
+            return None
+        starts_at = datetime.combine(session_date, session_time)
+        return timezone.make_aware(starts_at) if settings.USE_TZ else starts_at
+
+    def save(self, *args, **kwargs):
+        self.starts_at = self.compute_starts_at()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'session_date', 'session_time'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'starts_at'}
+        super().save(*args, **kwargs)
+
 class SessionTeams(models.Model):
     """
     Represents teams for a specific session
@@ -363,6 +547,8 @@ class SessionTeams(models.Model):
     team_number = models.PositiveSmallIntegerField()
     score = models.PositiveIntegerField(null=True, blank=True, default=None)
     gender = models.CharField(max_length=1, choices=GENDER_CHOICES)
+    # Counter cache of the team's roster, maintained by club.signals
+    player_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         constraints = [
@@ -379,6 +565,14 @@ class SessionTeams(models.Model):
     def __str__(self):
         return f"{self.team_name} (Team {self.team_number}) - {self.session}"
 
+    def save(self, *args, **kwargs):
+        _save_keeping_counter(self, 'player_count', super().save, *args, **kwargs)
+
+    @classmethod
+    def recount_players(cls, fix=True):
+        """Recompute player_count from club_playerassignment; returns the number of teams that had drifted"""
+        return _recount(cls, 'player_count', PlayerAssignment, 'team', fix)
+
 
 class PlayerAssignment(models.Model):
     """
@@ -406,6 +600,216 @@ class PlayerAssignment(models.Model):
                 name='unique_member_team'
             )
         ]
+        indexes = [
+            # Positions a member played, read without touching the table
+            models.Index(fields=['member', 'position'], name='playerassignment_member_idx'),
+        ]
 
     def __str__(self):
         return f"{self.member.first_name} as {self.position} in {self.team.team_name}"
+
+    @classmethod
+    def position_bit(cls, position):
+        """Bit of a position in the position masks of MemberPlayStats; unknown positions share the last bit"""
+        return POSITION_BITS.get(position, OTHER_POSITION_BIT)
+
+
+# Bit of each position in MemberPlayStats.game_positions/training_positions, in POSITION_CHOICES order
+POSITION_BITS = {position: 1 << i for i, (position, _) in enumerate(PlayerAssignment.POSITION_CHOICES)}
+OTHER_POSITION_BIT = 1 << len(POSITION_BITS)
+# The four positions report 16 looks for
+KEY_POSITIONS_MASK = sum(
+    POSITION_BITS[position] for position in ('Setter', 'Libero', 'Outside Hitter', 'Opposite Hitter')
+)
+
+
+class LocationStats(models.Model):
+    """
+    Summary row per location used by report 8 and the location report.
+    Kept up to date by the signal handlers in club.signals; bulk_create/update bypass them,
+    so `manage.py location_stats --check` can be used to detect and repair drift.
+    """
+    location = models.OneToOneField(Location, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    minor_members = models.PositiveIntegerField(default=0)
+    major_members = models.PositiveIntegerField(default=0)
+    team_count = models.PositiveIntegerField(default=0)
+    general_manager = models.ForeignKey(Personnel, on_delete=models.SET_NULL, null=True, blank=True,
+                                        related_name='+')
+    general_manager_name = models.CharField(max_length=101, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    TRACKED_FIELDS = ('minor_members', 'major_members', 'team_count', 'general_manager_id', 'general_manager_name')
+
+    def __str__(self):
+        return f"Stats for {self.location}"
+
+    @classmethod
+    def compute(cls, location_ids=None):
+        """Compute fresh statistics from the source tables, returned as {location_id: {field: value}}"""
+        locations = Location.objects.all()
+        if location_ids is not None:
+            locations = locations.filter(pk__in=location_ids)
+        current_manager = PersonnelAssignment.objects.filter(
+            location=OuterRef('pk'), role='general manager', end_date__isnull=True
+        ).order_by('-start_date', '-pk')
+        team_count = SessionTeams.objects.filter(location=OuterRef('pk')).order_by().values(
+            'location').annotate(total=Count('pk')).values('total')
+        rows = locations.annotate(
+            stat_minor_members=Count('clubmember', filter=Q(clubmember__minor=True)),
+            stat_major_members=Count('clubmember', filter=Q(clubmember__minor=False)),
+            stat_team_count=Coalesce(Subquery(team_count), 0),
+            stat_general_manager_id=Subquery(current_manager.values('personnel_id')[:1]),
+            stat_general_manager_name=Subquery(current_manager.annotate(
+                full_name=Concat('personnel__first_name', Value(' '), 'personnel__last_name')
+            ).values('full_name')[:1]),
+        ).values('pk', *(f'stat_{field}' for field in cls.TRACKED_FIELDS))
+        return {
+            row['pk']: {field: row[f'stat_{field}'] for field in cls.TRACKED_FIELDS}
+            for row in rows
+        }
+
+    @classmethod
+    def refresh(cls, location_ids):
+        """Recompute and store the statistics of the given locations"""
+        location_ids = {location_id for location_id in location_ids if location_id is not None}
+        if not location_ids:
+            return
+        for location_id, values in cls.compute(location_ids).items():
+            cls.objects.update_or_create(location_id=location_id, defaults=values)
+
+
+class SessionOutcome(models.Model):
+    """
+    Result of a game session whose two teams have a score, used by report 18.
+    Kept up to date by the signal handlers in club.signals when a team's score or session changes;
+    `manage.py session_outcomes --check` detects and repairs drift after bulk loads.
+    """
+    session = models.OneToOneField(Sessions, on_delete=models.CASCADE, primary_key=True, related_name='outcome')
+    # Both are empty for a tie
+    winner = models.ForeignKey(SessionTeams, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    loser = models.ForeignKey(SessionTeams, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    is_tie = models.BooleanField(default=False)
+    margin = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    TRACKED_FIELDS = ('winner_id', 'loser_id', 'is_tie', 'margin')
+
+    def __str__(self):
+        return f"Outcome of {self.session}"
+
+    @staticmethod
+    def decide(scored_teams):
+        """Outcome fields for the [(team_id, score), ...] of one session, or None unless exactly two teams scored"""
+        if len(scored_teams) != 2:
+            return None
+        (first_id, first_score), (second_id, second_score) = sorted(scored_teams, key=lambda team: -team[1])
+        if first_score == second_score:
+            return {'winner_id': None, 'loser_id': None, 'is_tie': True, 'margin': 0}
+        return {'winner_id': first_id, 'loser_id': second_id, 'is_tie': False, 'margin': first_score - second_score}
+
+    @classmethod
+    def compute(cls, session_ids=None):
+        """
+        Compute the outcomes of decided game sessions, returned as {session_id: {field: value}}.
+        session_ids may be any iterable of ids or a queryset of session primary keys.
+        """
+        teams = SessionTeams.objects.filter(session__session_type='game', score__isnull=False)
+        if session_ids is not None:
+            teams = teams.filter(session_id__in=session_ids)
+        scored = {}
+        for session_id, team_id, score in teams.order_by('session_id', 'team_number').values_list(
+                'session_id', 'team_id', 'score').iterator(chunk_size=5000):
+            scored.setdefault(session_id, []).append((team_id, score))
+        outcomes = {session_id: cls.decide(teams) for session_id, teams in scored.items()}
+        return {session_id: values for session_id, values in outcomes.items() if values is not None}
+
+    @classmethod
+    def refresh(cls, session_ids):
+        """Recompute and store the outcomes of the given sessions, removing those no longer decided"""
+        session_ids = {session_id for session_id in session_ids if session_id is not None}
+        if not session_ids:
+            return
+        outcomes = cls.compute(session_ids)
+        cls.objects.filter(session_id__in=session_ids - set(outcomes)).delete()
+        for session_id, values in outcomes.items():
+            cls.objects.update_or_create(session_id=session_id, defaults=values)
+
+
+class MemberPlayStats(models.Model):
+    """
+    What a member has played, used by reports 15, 16 and 18: sessions, positions as bitmasks (see POSITION_BITS)
+    and game results. Refreshed per member by club.signals when their roster entries, the sessions or the
+    outcomes change; `manage.py play_stats --check` detects and repairs drift after bulk loads.
+    Members who were never on a roster have no row.
+    """
+    member = models.OneToOneField(ClubMember, on_delete=models.CASCADE, primary_key=True, related_name='play_stats')
+    games_played = models.PositiveIntegerField(default=0)
+    trainings_played = models.PositiveIntegerField(default=0)
+    game_positions = models.PositiveSmallIntegerField(default=0)
+    training_positions = models.PositiveSmallIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    losses = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    TRACKED_FIELDS = ('games_played', 'trainings_played', 'game_positions', 'training_positions', 'wins', 'losses')
+
+    def __str__(self):
+        return f"Play stats for {self.member}"
+
+    @classmethod
+    def compute(cls, member_ids=None):
+        """
+        Compute fresh statistics from the rosters, returned as {member_id: {field: value}}.
+        member_ids may be any iterable of ids or a queryset of member primary keys.
+        """
+        assignments = PlayerAssignment.objects.all()
+        if member_ids is not None:
+            assignments = assignments.filter(member_id__in=member_ids)
+        rows = assignments.order_by().values_list(
+            'member_id', 'position', 'team_id', 'team__session__session_type',
+            'team__session__outcome__winner_id', 'team__session__outcome__loser_id',
+        )
+        stats = {}
+        for member_id, position, team_id, session_type, winner_id, loser_id in rows.iterator(chunk_size=5000):
+            values = stats.setdefault(member_id, dict.fromkeys(cls.TRACKED_FIELDS, 0))
+            if session_type == 'game':
+                values['games_played'] += 1
+                values['game_positions'] |= PlayerAssignment.position_bit(position)
+                values['wins'] += team_id == winner_id
+                values['losses'] += team_id == loser_id
+            else:
+                values['trainings_played'] += 1
+                values['training_positions'] |= PlayerAssignment.position_bit(position)
+        return stats
+
+    @classmethod
+    def refresh(cls, member_ids):
+        """Recompute and store the statistics of the given members, removing those no longer on any roster"""
+        member_ids = {member_id for member_id in member_ids if member_id is not None}
+        if not member_ids:
+            return
+        stats = cls.compute(member_ids)
+        cls.objects.filter(member_id__in=member_ids - set(stats)).delete()
+        for member_id, values in stats.items():
+            cls.objects.update_or_create(member_id=member_id, defaults=values)
+
+    @classmethod
+    def refresh_sessions(cls, session_ids):
+        """Refresh the members on the rosters of the given sessions"""
+        cls.refresh(
+            PlayerAssignment.objects.filter(team__session_id__in=session_ids).values_list('member_id', flat=True)
+        )
+
+
+class ReplicationHeartbeat(models.Model):
+    """
+    Single row whose timestamp is refreshed on the primary by `replication_heartbeat`; the age of its copy on the
+    read replica measures the replication lag (see club/routers.py)
+    """
+    SINGLETON_ID = 1
+
+    beat = models.DateTimeField()
+
+    @classmethod
+    def beat_now(cls):
+        cls.objects.update_or_create(pk=cls.SINGLETON_ID, defaults={'beat': timezone.now()})
@@ -0,0 +1,75 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(values):
+    """Encode the keyset values of the last row of a page into an opaque cursor string"""
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    """Decode a cursor produced by encode_cursor and check it has the expected number of values"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise InvalidCursor('Malformed cursor')
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursor('Malformed cursor')
+    return values
+
+
+def keyset_filter(fields, values):
+    """
+    Build the "row comes after (values)" predicate for an ascending keyset ordering.
+    For fields (a, b, c) this is: a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+    """
+    condition = Q()
+    for i, field in enumerate(fields):
+        clause = Q(**{f'{field}__gt': values[i]})
+        for previous_field, previous_value in zip(fields[:i], values[:i]):
+            clause &= Q(**{previous_field: previous_value})
+        condition |= clause
+    return condition
+
+
+def page_size_from(request, default=DEFAULT_PAGE_SIZE):
+    """Read the requested page size from the query string, clamped to [1, MAX_PAGE_SIZE]"""
+    try:
+        size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def keyset_page(queryset, fields, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Return one page of queryset ordered by fields (the last field must be unique) starting after cursor.
+    Only page_size + 1 rows are fetched, so the cost of a page does not depend on its position in the table.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    queryset = queryset.order_by(*fields)
+    if cursor:
+        try:
+            queryset = queryset.filter(keyset_filter(fields, decode_cursor(cursor, len(fields))))
+        except (TypeError, ValueError, ValidationError):
+            # Decodable, but with values the keyset fields cannot compare with, e.g. a name where a number goes
+            raise InvalidCursor('Malformed cursor')
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field) for field in fields)
+    return rows, next_cursor
@@ -0,0 +1,151 @@
+"""
+Per-request SQL query counting and N+1 detection.
+
+Views declare how many queries they may run with @query_budget(n). QueryCountMiddleware records every
+statement of a request (in DEBUG only) and logs a warning when the budget is exceeded or when the same
+statement shape repeats, together with the template line that triggered it. QueryBudgetTestMixin
+enforces the same rules in the test suite.
+"""
+import logging
+import re
+import sys
+from collections import Counter, namedtuple
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import resolve
+
+logger = logging.getLogger('club.queries')
+
+# A statement shape seen this many times in one request is reported as an N+1 pattern
+N_PLUS_ONE_THRESHOLD = 3
+
+RecordedQuery = namedtuple('RecordedQuery', ['sql', 'shape', 'origin'])
+RepeatedQuery = namedtuple('RepeatedQuery', ['shape', 'count', 'origins'])
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+_SAME_BUDGET = object()
+
+
+def query_budget(limit, post=_SAME_BUDGET):
+    """
+    Declare the maximum number of SQL queries a view may run for one request. post is the budget of its POST
+    requests when it differs: None for a view whose writes grow with the submitted data, such as an import,
+    whose POST requests are then not checked.
+    """
+    def decorator(view):
+        view.query_budget = limit
+        if post is not _SAME_BUDGET:
+            view.query_budget_post = post
+        return view
+    return decorator
+
+
+def normalize_sql(sql):
+    """Reduce a statement to its shape so that queries differing only by their values compare equal"""
+    shape = _STRING_LITERAL.sub('?', sql)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _PLACEHOLDER_LIST.sub('(...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+def _template_origin():
+    """'template.html:line' of the innermost template node being rendered, if any"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                return f'{origin.template_name}:{token.lineno}'
+        frame = frame.f_back
+    return None
+
+
+class QueryRecorder:
+    """Database execute wrapper collecting every statement with the template line that ran it"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(RecordedQuery(sql, normalize_sql(sql), _template_origin()))
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """Statement shapes run at least threshold times, most frequent first"""
+        counts = Counter(query.shape for query in self.queries)
+        return [
+            RepeatedQuery(shape, count, Counter(q.origin for q in self.queries if q.shape == shape))
+            for shape, count in counts.most_common() if count >= threshold
+        ]
+
+    def report(self):
+        lines = [f'{self.count} queries']
+        for repeated in self.repeated():
+            origins = ', '.join(f'{origin or "view code"} x{count}' for origin, count in repeated.origins.items())
+            lines.append(f'  N+1: {repeated.count}x {repeated.shape[:200]} (from {origins})')
+        return '\n'.join(lines)
+
+
+@contextmanager
+def record_queries():
+    """Record the queries run on every configured database inside the block"""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+class QueryCountMiddleware:
+    """Adds an X-Query-Count header and logs budget overruns and N+1 patterns; only active when DEBUG is on"""
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        response['X-Query-Count'] = str(recorder.count)
+        view = getattr(request.resolver_match, 'func', None)
+        budget = getattr(view, 'query_budget', None)
+        if request.method == 'POST' and hasattr(view, 'query_budget_post'):
+            budget = view.query_budget_post
+            if budget is None:
+                return response
+        if budget is not None and recorder.count > budget:
+            logger.warning('%s ran %d queries, over its budget of %d\n%s',
+                           request.path, recorder.count, budget, recorder.report())
+        elif recorder.repeated():
+            logger.warning('%s has repeated queries\n%s', request.path, recorder.report())
+        return response
+
+
+class QueryBudgetTestMixin:
+    """TestCase mixin checking that a GET stays within its view's declared budget and has no N+1 pattern"""
+
+    def assertWithinQueryBudget(self, url, budget=None):
+        if budget is None:
+            budget = getattr(resolve(url.split('?')[0]).func, 'query_budget', None)
+            self.assertIsNotNone(budget, f'{url} has no declared query budget')
+        with record_queries() as recorder:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(recorder.count, budget, f'{url} is over its query budget:\n{recorder.report()}')
+        self.assertEqual(recorder.repeated(), [], f'{url} has an N+1 pattern:\n{recorder.report()}')
+        return response
@@ -0,0 +1,117 @@
+"""
+Read/write routing between the primary database and an optional read replica.
+
+Writes always go to 'default'. Reads go to the 'replica' alias only while a view decorated with
+@replica_reads runs (reports and list views), only when that alias is configured and only while the replica is
+fresh: its copy of the ReplicationHeartbeat row, written on the primary by `replication_heartbeat`, must be less
+than REPLICA_MAX_LAG seconds old. Otherwise, and for the rest of a request after it wrote anything, reads fall
+back to 'default'. Raw SQL run by those views picks its connection with read_database().
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils import timezone
+
+logger = logging.getLogger('club.routers')
+
+REPLICA_DB_ALIAS = 'replica'
+
+# Seconds a replica lag measurement is reused before measuring again
+LAG_CHECK_INTERVAL = 5.0
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+_wrote = contextvars.ContextVar('wrote', default=False)
+
+_lag_lock = threading.Lock()
+_last_check = {'at': None, 'fresh': False}
+
+
+@contextmanager
+def replica_reads():
+    """Send the reads of the enclosed block to the replica when it is fresh enough"""
+    reads_token = _replica_reads.set(True)
+    wrote_token = _wrote.set(False)
+    try:
+        yield
+    finally:
+        _wrote.reset(wrote_token)
+        _replica_reads.reset(reads_token)
+
+
+def use_replica(view):
+    """View decorator running the whole view, template rendering included, under replica_reads()"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def replica_lag():
+    """
+    Age in seconds of the replica's heartbeat; None when the replica has not received one yet. The age, rather
+    than the difference with the primary's heartbeat, also grows when `replication_heartbeat` stops, so that a
+    replica nobody measures any more is not taken as fresh.
+    """
+    from .models import ReplicationHeartbeat
+
+    replica = ReplicationHeartbeat.objects.using(REPLICA_DB_ALIAS).filter(
+        pk=ReplicationHeartbeat.SINGLETON_ID).values_list('beat', flat=True).first()
+    if replica is None:
+        return None
+    return max((timezone.now() - replica).total_seconds(), 0.0)
+
+
+def replica_is_fresh():
+    """Whether the replica lags less than REPLICA_MAX_LAG, measured at most every LAG_CHECK_INTERVAL seconds"""
+    now = time.monotonic()
+    with _lag_lock:
+        if _last_check['at'] is not None and now - _last_check['at'] < LAG_CHECK_INTERVAL:
+            return _last_check['fresh']
+        try:
+            lag = replica_lag()
+        except DatabaseError:
+            logger.warning('Could not read the replica heartbeat, reading from the primary', exc_info=True)
+            lag = None
+        fresh = lag is not None and lag <= settings.REPLICA_MAX_LAG
+        if not fresh:
+            logger.info('Replica lag %s exceeds %ss, reading from the primary', lag, settings.REPLICA_MAX_LAG)
+        _last_check.update(at=now, fresh=fresh)
+        return fresh
+
+
+def reset_lag_check():
+    """Forget the last lag measurement, so that the next read measures it again"""
+    with _lag_lock:
+        _last_check.update(at=None, fresh=False)
+
+
+def read_database():
+    """Alias the reads of the current context go to"""
+    if _replica_reads.get() and not _wrote.get() and REPLICA_DB_ALIAS in connections.settings and replica_is_fresh():
+        return REPLICA_DB_ALIAS
+    return DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_database()
+
+    def db_for_write(self, model, **hints):
+        # Later reads of the same request must see this write, which the replica may not have yet
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives the schema through replication
+        return db == DEFAULT_DB_ALIAS
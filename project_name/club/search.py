@@ -0,0 +1,173 @@
+"""
+Full-text search over the names, emails, phones and postal codes of club members, family members and personnel.
+
+On SQLite the club_person_search FTS5 table, created by migration 0011, indexes the three tables. Triggers keep
+it in sync on every insert, update and delete, bulk_create and raw SQL included. A person's rowid in the index
+is their primary key * 4 + the code of their kind, so a result identifies its row without a join. On MySQL each
+table has a FULLTEXT index over the same columns and the three are searched with one UNION ALL query.
+
+Django's SQLite schema editor alters most columns by copying the table into a new one, which drops its triggers.
+repair_search_index(), run after every migrate, recreates the missing triggers and reindexes their table.
+
+Every word of a query must match the start of a word of the person: `tre 514` finds Tremblay at 514-555-0100.
+Results are ranked by relevance. On SQLite a name match weighs more than a match in the other columns, and
+phone numbers can also be searched without punctuation. Queries of one or two characters per word are the
+exception: they rank their first RANKED_CANDIDATES matches only.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, NotSupportedError, connections, transaction
+
+from .routers import read_database
+
+SEARCH_TABLE = 'club_person_search'
+ROWID_STRIDE = 4
+# kind -> (code in the rowid, table, primary key column)
+KINDS = {
+    'member': (1, 'club_clubmember', 'member_id'),
+    'family': (2, 'club_familymember', 'member_id'),
+    'personnel': (3, 'club_personnel', 'personnel_id'),
+}
+KIND_BY_CODE = {code: kind for kind, (code, _, _) in KINDS.items()}
+RESULT_COLUMNS = ('first_name', 'last_name', 'email', 'phone', 'postal_code')
+# bm25 weights of the FTS5 columns: first_name, last_name, email, phone, phone_digits, postal_code
+COLUMN_WEIGHTS = (10.0, 10.0, 2.0, 2.0, 2.0, 1.0)
+# Words of a query beyond this are ignored
+MAX_TERMS = 8
+# On SQLite a query whose words all have at most SHORT_TERM_LENGTH characters, e.g. a single letter, matches a
+# large part of the index: only its first RANKED_CANDIDATES matches by rowid are scored. Longer queries score every
+# match, which costs about 0.01 ms each, e.g. 15 ms for 6,000 matches and 100 ms for 80,000.
+SHORT_TERM_LENGTH = 2
+RANKED_CANDIDATES = 1000
+
+TRIGGER_EVENTS = ('insert', 'update', 'delete')
+
+_WORD = re.compile(r'[^\W_]+')
+
+
+def _digits(column):
+    """SQL expression of a phone number without its punctuation, so that 5145550100 finds 514-555-0100"""
+    expression = column
+    for character in ('-', ' ', '(', ')', '.', '+'):
+        expression = f"replace({expression}, '{character}', '')"
+    return expression
+
+
+def _index_row(row, pk, code):
+    return (f'{row}.{pk} * {ROWID_STRIDE} + {code}, {row}.first_name, {row}.last_name, {row}.email, {row}.phone, '
+            f'{_digits(f"{row}.phone")}, {row}.postal_code')
+
+
+_INSERT = f'INSERT INTO {SEARCH_TABLE} (rowid, first_name, last_name, email, phone, phone_digits, postal_code)'
+
+
+def _sqlite_index_table(code, table, pk):
+    """
+    Statements indexing the rows of table and creating the triggers keeping them indexed, as migration 0011 does:
+    the index columns must stay those of the FTS5 table the migration created
+    """
+    return [
+        f'{_INSERT} SELECT {_index_row(table, pk, code)} FROM {table}',
+        f'CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN '
+        f'{_INSERT} VALUES ({_index_row("new", pk, code)}); END',
+        f'CREATE TRIGGER {table}_search_update AFTER UPDATE OF {", ".join(RESULT_COLUMNS)} ON {table} BEGIN '
+        f'DELETE FROM {SEARCH_TABLE} WHERE rowid = old.{pk} * {ROWID_STRIDE} + {code}; '
+        f'{_INSERT} VALUES ({_index_row("new", pk, code)}); END',
+        f'CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN '
+        f'DELETE FROM {SEARCH_TABLE} WHERE rowid = old.{pk} * {ROWID_STRIDE} + {code}; END',
+    ]
+
+
+def repair_search_index(using=DEFAULT_DB_ALIAS):
+    """
+    Recreate the SQLite triggers a table rebuild dropped and reindex the rows of their table, whose changes since
+    the rebuild the index missed. Returns the tables reindexed; nothing to do elsewhere or before migration 0011.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return []
+    repaired = []
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {name for name, in cursor.fetchall()}
+        if SEARCH_TABLE not in existing:
+            return []
+        for code, table, pk in KINDS.values():
+            triggers = [f'{table}_search_{event}' for event in TRIGGER_EVENTS]
+            if all(trigger in existing for trigger in triggers):
+                continue
+            for trigger in triggers:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid % {ROWID_STRIDE} = {code}')
+            for statement in _sqlite_index_table(code, table, pk):
+                cursor.execute(statement)
+            repaired.append(table)
+    return repaired
+
+
+def search_terms(query):
+    """The words of a query, lowercased, without the punctuation the index does not store"""
+    return [word.lower() for word in _WORD.findall(query or '')][:MAX_TERMS]
+
+
+def _sqlite_search(cursor, terms, kinds, limit):
+    # Quoted so that words like AND, OR or NOT are not read as operators; * makes each a prefix
+    match = ' '.join(f'"{term}"*' for term in terms)
+    weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+    kind_filter = ''
+    params = [match]
+    if kinds:
+        kind_filter = f'AND rowid %% {ROWID_STRIDE} IN ({", ".join(["%s"] * len(kinds))})'
+        params.extend(KINDS[kind][0] for kind in kinds)
+    # Scoring every match of a short prefix costs far more than finding them, so only the first ones are scored
+    candidates = ''
+    if all(len(term) <= SHORT_TERM_LENGTH for term in terms):
+        candidates = f'LIMIT {RANKED_CANDIDATES}'
+    cursor.execute(
+        f'SELECT * FROM ('
+        f'SELECT rowid, {", ".join(RESULT_COLUMNS)}, -bm25({SEARCH_TABLE}, {weights}) AS score '
+        f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s {kind_filter} {candidates}'
+        f') ORDER BY score DESC, rowid LIMIT %s',
+        params + [limit]
+    )
+    return [
+        {
+            'kind': KIND_BY_CODE[rowid % ROWID_STRIDE], 'id': rowid // ROWID_STRIDE,
+            **dict(zip(RESULT_COLUMNS, values)), 'score': score,
+        }
+        for rowid, *values, score in cursor.fetchall()
+    ]
+
+
+def _mysql_search(cursor, terms, kinds, limit):
+    # Boolean mode: + requires every word, * matches it as a prefix
+    against = ' '.join(f'+{term}*' for term in terms)
+    match = f'MATCH ({", ".join(RESULT_COLUMNS)}) AGAINST (%s IN BOOLEAN MODE)'
+    selects, params = [], []
+    for kind in kinds or KINDS:
+        _, table, pk = KINDS[kind]
+        selects.append(
+            f"SELECT '{kind}' AS kind, {pk} AS id, {', '.join(RESULT_COLUMNS)}, {match} AS score "
+            f'FROM {table} WHERE {match}'
+        )
+        params.extend([against, against])
+    cursor.execute(f'{" UNION ALL ".join(selects)} ORDER BY score DESC, kind, id LIMIT %s', params + [limit])
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def search_people(query, kinds=None, limit=20, using=None):
+    """
+    The people matching every word of query as a prefix, best first, as dicts with their kind ('member',
+    'family' or 'personnel'), id, RESULT_COLUMNS and score. kinds restricts the search to some kinds.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    connection = connections[using or read_database()]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            return _sqlite_search(cursor, terms, kinds, limit)
+        if connection.vendor == 'mysql':
+            return _mysql_search(cursor, terms, kinds, limit)
+    raise NotSupportedError(f'Person search is not available on {connection.vendor}')
@@ -0,0 +1,148 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import (
+    ClubMember, Location, LocationStats, MemberPlayStats, Personnel, PersonnelAssignment, PlayerAssignment,
+    SessionOutcome, Sessions, SessionTeams
+)
+from .search import repair_search_index
+
+# Columns whose value before a save the handlers below compare with, so that moving a row updates both sides
+PREVIOUS_VALUES = {
+    ClubMember: ('location_id',),
+    PersonnelAssignment: ('location_id',),
+    SessionTeams: ('location_id', 'session_id', 'score'),
+    PlayerAssignment: ('team_id', 'member_id'),
+}
+
+
+def _remember_previous_values(sender, instance, **kwargs):
+    """Read the tracked columns of the stored row, in one query, before it is overwritten"""
+    instance._previous_values = {}
+    if not instance._state.adding:
+        instance._previous_values = sender.objects.filter(pk=instance.pk).values(
+            *PREVIOUS_VALUES[sender]).first() or {}
+
+
+for model in PREVIOUS_VALUES:
+    pre_save.connect(_remember_previous_values, sender=model, dispatch_uid=f'previous_values_{model.__name__}')
+
+
+def _previous(instance, field):
+    return getattr(instance, '_previous_values', {}).get(field)
+
+
+# Models whose rows feed LocationStats through their location foreign key
+LOCATION_STATS_SOURCES = (ClubMember, SessionTeams, PersonnelAssignment)
+
+
+def _refresh_location_stats(sender, instance, **kwargs):
+    LocationStats.refresh({instance.location_id, _previous(instance, 'location_id')})
+
+
+for model in LOCATION_STATS_SOURCES:
+    post_save.connect(_refresh_location_stats, sender=model, dispatch_uid=f'location_stats_save_{model.__name__}')
+    post_delete.connect(_refresh_location_stats, sender=model, dispatch_uid=f'location_stats_delete_{model.__name__}')
+
+
+@receiver(post_save, sender=Location, dispatch_uid='location_stats_location')
+def create_location_stats(sender, instance, created, **kwargs):
+    if created:
+        LocationStats.refresh({instance.pk})
+
+
+@receiver(post_save, sender=Personnel, dispatch_uid='location_stats_personnel')
+def refresh_general_manager_name(sender, instance, created, **kwargs):
+    """A general manager's name is stored denormalised, so renaming them refreshes their locations"""
+    if not created:
+        LocationStats.refresh(LocationStats.objects.filter(general_manager=instance).values_list('pk', flat=True))
+
+
+# Counter-cache columns: counted model -> (foreign key, model holding the counter, counter field)
+COUNTER_CACHES = {
+    ClubMember: ('location_id', Location, 'member_count'),
+    PlayerAssignment: ('team_id', SessionTeams, 'player_count'),
+}
+
+
+def _adjust_counter(sender, pk, delta):
+    """
+    Atomically add delta to the counter of the row pk, in the database rather than on a loaded instance. A counter
+    that has drifted below -delta is left as it is: the counters are unsigned on MySQL, where even an intermediate
+    negative value fails the UPDATE, and recount_members()/recount_players() repair drift.
+    """
+    if pk is None:
+        return
+    _, model, counter = COUNTER_CACHES[sender]
+    rows = model.objects.filter(pk=pk)
+    if delta < 0:
+        rows = rows.filter(**{f'{counter}__gte': -delta})
+    rows.update(**{counter: F(counter) + delta})
+
+
+def _count_saved(sender, instance, created, **kwargs):
+    foreign_key = COUNTER_CACHES[sender][0]
+    current = getattr(instance, foreign_key)
+    previous = None if created else _previous(instance, foreign_key)
+    if created or previous != current:
+        _adjust_counter(sender, previous, -1)
+        _adjust_counter(sender, current, 1)
+
+
+def _count_deleted(sender, instance, **kwargs):
+    _adjust_counter(sender, getattr(instance, COUNTER_CACHES[sender][0]), -1)
+
+
+for model in COUNTER_CACHES:
+    post_save.connect(_count_saved, sender=model, dispatch_uid=f'counter_cache_save_{model.__name__}')
+    post_delete.connect(_count_deleted, sender=model, dispatch_uid=f'counter_cache_delete_{model.__name__}')
+
+
+@receiver(post_save, sender=SessionTeams, dispatch_uid='session_outcome_team_save')
+def refresh_session_outcome(sender, instance, created, **kwargs):
+    """A game's outcome only changes when one of its teams is added, rescored or moved to another session"""
+    previous_session = _previous(instance, 'session_id')
+    if created or _previous(instance, 'score') != instance.score or previous_session != instance.session_id:
+        SessionOutcome.refresh({instance.session_id, previous_session})
+    if not created and previous_session != instance.session_id:
+        # The roster now plays a session of another type
+        MemberPlayStats.refresh(instance.playerassignment_set.values_list('member_id', flat=True))
+
+
+@receiver(post_delete, sender=SessionTeams, dispatch_uid='session_outcome_team_delete')
+def refresh_session_outcome_on_delete(sender, instance, **kwargs):
+    SessionOutcome.refresh({instance.session_id})
+
+
+@receiver(post_save, sender=Sessions, dispatch_uid='session_outcome_session')
+def refresh_session_outcome_type(sender, instance, created, **kwargs):
+    """Only game sessions have an outcome, so changing the session type adds or removes it"""
+    if not created:
+        SessionOutcome.refresh({instance.pk})
+        MemberPlayStats.refresh_sessions({instance.pk})
+
+
+@receiver(post_save, sender=PlayerAssignment, dispatch_uid='play_stats_assignment_save')
+def refresh_play_stats(sender, instance, **kwargs):
+    MemberPlayStats.refresh({instance.member_id, _previous(instance, 'member_id')})
+
+
+@receiver(post_delete, sender=PlayerAssignment, dispatch_uid='play_stats_assignment_delete')
+def refresh_play_stats_on_delete(sender, instance, **kwargs):
+    MemberPlayStats.refresh({instance.member_id})
+
+
+@receiver(post_save, sender=SessionOutcome, dispatch_uid='play_stats_outcome_save')
+@receiver(post_delete, sender=SessionOutcome, dispatch_uid='play_stats_outcome_delete')
+def refresh_play_stats_results(sender, instance, **kwargs):
+    """Wins and losses of everyone on the rosters of a game follow its outcome"""
+    MemberPlayStats.refresh_sessions({instance.session_id})
+
+
+def restore_search_triggers(sender, using, **kwargs):
+    """
+    Connected to post_migrate in ClubConfig.ready(): the SQLite schema editor rebuilds a table to alter most of its
+    columns, dropping the person search triggers on it, which repair_search_index() recreates.
+    """
+    repair_search_index(using)
@@ -0,0 +1,44 @@
+"""
+Opt-in SQLite performance profile.
+
+With settings.SQLITE_PERFORMANCE_PROFILE enabled, every new SQLite connection switches to the WAL journal, so
+readers no longer block the writer, and gets the cache, memory-mapping and busy-timeout PRAGMAs below.
+A dict setting overrides single PRAGMAs of the profile. WAL is stored in the database file and survives
+disabling the profile; `sqlite_maintenance` runs the periodic PRAGMA optimize and WAL checkpoint.
+"""
+from django.conf import settings
+
+PERFORMANCE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    # Durable at every checkpoint rather than every commit, which is safe in WAL mode
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative values are in KiB: 64 MB of page cache per connection
+    'cache_size': -64000,
+    'temp_store': 'MEMORY',
+    # Milliseconds a connection waits for a lock before failing with "database is locked"
+    'busy_timeout': 5000,
+}
+
+
+def profile_pragmas():
+    """PRAGMAs of the configured profile, empty when it is disabled"""
+    profile = getattr(settings, 'SQLITE_PERFORMANCE_PROFILE', False)
+    if not profile:
+        return {}
+    return {**PERFORMANCE_PRAGMAS, **(profile if isinstance(profile, dict) else {})}
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def apply_performance_profile(sender, connection, **kwargs):
+    """connection_created handler applying the profile to SQLite connections"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = profile_pragmas()
+    if pragmas:
+        with connection.cursor() as cursor:
+            apply_pragmas(cursor, pragmas)
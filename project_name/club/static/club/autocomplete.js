@@ -0,0 +1,61 @@
+// Lazy options for the AutocompleteSelect widget (club/widgets.py): a search box above each
+// <select data-autocomplete-url> fetches the matching options from the autocomplete endpoint as the user types.
+(function () {
+    'use strict';
+
+    var DELAY_MS = 250;
+
+    function setOptions(select, results) {
+        var selected = select.value;
+        var keep = Array.prototype.filter.call(select.options, function (option) {
+            return option.value === '' || option.value === selected;
+        });
+        select.innerHTML = '';
+        keep.forEach(function (option) { select.appendChild(option); });
+        results.forEach(function (result) {
+            if (String(result.id) === selected) {
+                return;
+            }
+            select.appendChild(new Option(result.text, result.id));
+        });
+    }
+
+    function attach(select) {
+        var input = document.createElement('input');
+        var timer = null;
+        var latest = 0;
+        input.type = 'search';
+        input.placeholder = 'Type to search';
+        input.className = 'form-control mb-1';
+        input.setAttribute('aria-controls', select.id);
+        select.parentNode.insertBefore(input, select);
+
+        function load() {
+            // Responses can arrive out of order; only the one for the latest query is shown
+            var request = ++latest;
+            var url = select.dataset.autocompleteUrl + '?q=' + encodeURIComponent(input.value);
+            fetch(url, {headers: {'Accept': 'application/json'}})
+                .then(function (response) { return response.ok ? response.json() : {results: []}; })
+                .then(function (data) {
+                    if (request === latest) {
+                        setOptions(select, data.results);
+                    }
+                });
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(load, DELAY_MS);
+        });
+        select.addEventListener('focus', function () {
+            if (select.options.length <= 2 && !select.dataset.autocompleteLoaded) {
+                select.dataset.autocompleteLoaded = 'true';
+                load();
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-autocomplete-url]').forEach(attach);
+    });
+})();
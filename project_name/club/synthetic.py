@@ -0,0 +1,440 @@
+"""
+Deterministic synthetic data for load testing the reports (`manage.py populate --scale N`).
+
+Every scale unit adds one location with MEMBERS_PER_LOCATION members and the personnel, families,
+payments, sessions, teams, rosters and email logs that go with them. Rows are built in Python with
+explicit primary keys, so foreign keys never need to be read back, and written with bulk_create in
+batches inside one transaction per table.
+"""
+import random
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import (
+    Location, Hobbies, Personnel, PersonnelAssignment,
+    FamilyMember, SecondaryFamilyMember, ClubMember,
+    Sessions, SessionTeams, PlayerAssignment, Payments,
+    FamilyRelationship, MemberHobbies, EmailLog, LocationStats, SessionOutcome, MemberPlayStats
+)
+
+MEMBERS_PER_LOCATION = 1000
+FAMILY_MEMBERS_PER_LOCATION = 300
+SESSIONS_PER_LOCATION = 104  # one a week over two years
+PAYMENT_YEARS = 3
+MINOR_RATIO = 0.35
+ACTIVE_RATIO = 0.75
+
+HOBBIES = ['Swimming', 'Tennis', 'Basketball', 'Volleyball', 'Soccer', 'Yoga']
+FIRST_NAMES = [
+    'Alex', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn', 'Charlie',
+    'Emma', 'Olivia', 'Liam', 'Noah', 'Sophia', 'Lucas', 'Chloe', 'Nathan', 'Léa', 'Gabriel',
+    'Mia', 'Thomas', 'Zoé', 'Samuel', 'Alice', 'William', 'Rosalie', 'Félix', 'Juliette', 'Louis',
+]
+LAST_NAMES = [
+    'Tremblay', 'Gagnon', 'Roy', 'Côté', 'Bouchard', 'Gauthier', 'Morin', 'Lavoie', 'Fortin', 'Gagné',
+    'Ouellet', 'Pelletier', 'Bélanger', 'Lévesque', 'Bergeron', 'Leblanc', 'Paquette', 'Girard', 'Simard',
+    'Boucher', 'Smith', 'Brown', 'Wilson', 'Martin', 'Nguyen', 'Singh', 'Chen', 'Patel', 'Khan', 'Garcia',
+]
+CITIES = [
+    ('Montreal', 'Quebec', 'H'), ('Laval', 'Quebec', 'H'), ('Quebec City', 'Quebec', 'G'),
+    ('Gatineau', 'Quebec', 'J'), ('Sherbrooke', 'Quebec', 'J'), ('Toronto', 'Ontario', 'M'),
+    ('Ottawa', 'Ontario', 'K'), ('Vancouver', 'British Columbia', 'V'), ('Calgary', 'Alberta', 'T'),
+]
+STREETS = ['Main St', 'Oak Ave', 'Maple Rd', 'Sherbrooke St', 'St-Denis St', 'King St', 'Park Ave', 'Lake Rd']
+# Staff of every location; the first entry is the general manager
+LOCATION_ROLES = [
+    'general manager', 'deputy manager', 'treasurer', 'secretary', 'administrator',
+    'coach', 'coach', 'coach', 'coach', 'coach', 'assistant coach', 'assistant coach',
+]
+COACH_ROLES = ('coach', 'assistant coach')
+POSITIONS = [choice for choice, _ in PlayerAssignment.POSITION_CHOICES]
+RELATIONSHIPS = ['father', 'mother', 'grandmother', 'grandfather', 'tutor', 'other']
+
+
+def _next_pk(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+class SyntheticDataGenerator:
+    """
+    Generates `scale` locations' worth of referentially consistent data.
+    The same seed, scale and starting database always produce the same rows.
+    """
+
+    def __init__(self, scale, seed=353, batch_size=5000, log=print, today=None):
+        self.scale = scale
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log
+        self.today = today or date.today()
+        self.total_rows = 0
+        self.total_seconds = 0.0
+
+    def run(self):
+        self.hobby_ids = [Hobbies.objects.get_or_create(name=name)[0].pk for name in HOBBIES]
+        self.location_ids = self._insert(Location, self._locations())
+        self.coaches_by_location = {}
+        self._insert(Personnel, self._personnel())
+        self._insert(PersonnelAssignment, self._personnel_assignments())
+        self.families_by_location = {}
+        self._insert(FamilyMember, self._family_members())
+        self.minors = []
+        self.players_by_location = {}
+        self.member_flags = {}
+        self._insert(ClubMember, self._members())
+        self._insert(FamilyRelationship, self._family_relationships())
+        self._insert(SecondaryFamilyMember, self._secondary_family_members())
+        self._insert(MemberHobbies, self._member_hobbies())
+        self._insert(Payments, self._payments())
+        self.session_rows = []
+        self._insert(Sessions, self._sessions(), timestamps=['created_date'])
+        self._insert(SessionTeams, self._session_teams())
+        self.rosters = []
+        self._insert(PlayerAssignment, self._player_assignments())
+        self._insert(SessionOutcome, self._session_outcomes())
+        self._insert(MemberPlayStats, self._play_stats())
+        self._insert(EmailLog, self._email_logs(), timestamps=['email_date'])
+        # bulk_create sends no signals, so the counter caches are recomputed once at the end
+        Location.recount_members()
+        SessionTeams.recount_players()
+        LocationStats.refresh(self.location_ids)
+        rate = self.total_rows / self.total_seconds if self.total_seconds else 0
+        self.log(f'Inserted {self.total_rows} rows in {self.total_seconds:.1f}s ({rate:,.0f} rows/s)')
+
+    def _insert(self, model, rows, timestamps=()):
+        """
+        bulk_create rows in batches inside one transaction; returns the primary keys inserted. bulk_create stamps
+        auto_now_add fields with now(), so the values the rows had for the fields named in timestamps are
+        written back afterwards; the rows must then have their primary key set.
+        """
+        started = time.perf_counter()
+        pks = []
+        rows = iter(rows)
+        with transaction.atomic():
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                stamps = [[getattr(obj, name) for name in timestamps] for obj in batch]
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+                if timestamps:
+                    self._write_timestamps(model, timestamps, batch, stamps)
+                pks.extend(obj.pk for obj in batch)
+        elapsed = time.perf_counter() - started
+        self.total_rows += len(pks)
+        self.total_seconds += elapsed
+        rate = len(pks) / elapsed if elapsed else 0
+        self.log(f'- {model._meta.db_table}: {len(pks)} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)')
+        return pks
+
+    # Helpers
+
+    def _name(self):
+        return self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+
+    def _address(self):
+        city, province, postal_prefix = self.rng.choice(CITIES)
+        postal_code = f'{postal_prefix}{self.rng.randint(0, 9)}{chr(65 + self.rng.randint(0, 25))} ' \
+                      f'{self.rng.randint(0, 9)}{chr(65 + self.rng.randint(0, 25))}{self.rng.randint(0, 9)}'
+        return {
+            'address': f'{self.rng.randint(1, 9999)} {self.rng.choice(STREETS)}',
+            'city': city,
+            'province': province,
+            'postal_code': postal_code,
+        }
+
+    def _phone(self):
+        return f'{self.rng.choice(["514", "438", "450", "418", "613", "416"])}-555-{self.rng.randint(0, 9999):04d}'
+
+    def _birthdate(self, min_age, max_age):
+        age_days = self.rng.randint(int(min_age * 365.25) + 2, int((max_age + 1) * 365.25) - 2)
+        return self.today - timedelta(days=age_days)
+
+    def _person(self, number, prefix, min_age, max_age):
+        """Fields shared by every Person; number keeps SSN and medicare numbers unique per table"""
+        first_name, last_name = self._name()
+        return {
+            'first_name': first_name,
+            'last_name': last_name,
+            'birthdate': self._birthdate(min_age, max_age),
+            'ssn': f'{number // 1000000 % 1000:03d}-{number // 10000 % 100:02d}-{number % 10000:04d}',
+            'medicare_number': f'{prefix}{number:09d}',
+            'phone': self._phone(),
+            'email': f'{first_name.lower()}.{last_name.lower()}.{number}@example.com',
+            **self._address(),
+        }
+
+    def _aware(self, value):
+        return timezone.make_aware(value) if settings.USE_TZ else value
+
+    # Tables
+
+    def _locations(self):
+        pk = _next_pk(Location)
+        for i in range(self.scale):
+            city, province, _ = self.rng.choice(CITIES)
+            yield Location(
+                location_id=pk + i,
+                name=f'{city} Club {pk + i}',
+                type='head' if pk + i == 1 else 'branch',
+                phone=self._phone(),
+                web_address=f'https://club{pk + i}.example.com',
+                capacity=self.rng.randint(MEMBERS_PER_LOCATION, MEMBERS_PER_LOCATION * 2),
+                **{**self._address(), 'city': city, 'province': province},
+            )
+
+    def _personnel(self):
+        pk = _next_pk(Personnel)
+        self.personnel_roles = []
+        for location_id in self.location_ids:
+            for role in LOCATION_ROLES:
+                self.personnel_roles.append((pk, location_id, role))
+                if role in COACH_ROLES:
+                    self.coaches_by_location.setdefault(location_id, []).append(pk)
+                yield Personnel(personnel_id=pk, **self._person(pk, 'PER', 22, 65))
+                pk += 1
+
+    def _personnel_assignments(self):
+        """Each person gets up to two ended assignments followed by their current one"""
+        assignment_id = _next_pk(PersonnelAssignment)
+        for personnel_id, location_id, role in self.personnel_roles:
+            history = self.rng.randint(0, 2)
+            start = self.today - timedelta(days=self.rng.randint(365 * (history + 1), 365 * (history + 3)))
+            for _ in range(history):
+                end = start + timedelta(days=self.rng.randint(90, 364))
+                yield PersonnelAssignment(
+                    personnel_id=personnel_id,
+                    location_id=self.rng.choice(self.location_ids),
+                    assignment_id=assignment_id,
+                    role=self.rng.choice(LOCATION_ROLES[1:]),
+                    mandate=self.rng.choice(['volunteer', 'salaried']),
+                    start_date=start,
+                    end_date=end,
+                )
+                assignment_id += 1
+                start = end + timedelta(days=1)
+            yield PersonnelAssignment(
+                personnel_id=personnel_id,
+                location_id=location_id,
+                assignment_id=assignment_id,
+                role=role,
+                mandate='salaried' if role == 'general manager' else self.rng.choice(['volunteer', 'salaried']),
+                start_date=start,
+            )
+            assignment_id += 1
+
+    def _family_members(self):
+        pk = _next_pk(FamilyMember)
+        for location_id in self.location_ids:
+            for _ in range(FAMILY_MEMBERS_PER_LOCATION):
+                self.families_by_location.setdefault(location_id, []).append(pk)
+                yield FamilyMember(member_id=pk, location_id=location_id, **self._person(pk, 'FAM', 30, 70))
+                pk += 1
+
+    def _members(self):
+        pk = _next_pk(ClubMember)
+        for location_id in self.location_ids:
+            for _ in range(MEMBERS_PER_LOCATION):
+                minor = self.rng.random() < MINOR_RATIO
+                person = self._person(pk, 'MEM', 11, 17) if minor else self._person(pk, 'MEM', 18, 60)
+                gender = self.rng.choices(['M', 'F', 'O'], weights=[48, 48, 4])[0]
+                activity = self.rng.random() < ACTIVE_RATIO
+                if minor:
+                    self.minors.append((pk, location_id, person['birthdate']))
+                if activity and gender != 'O':
+                    self.players_by_location.setdefault((location_id, gender), []).append(pk)
+                self.member_flags[pk] = (minor, activity, person['email'])
+                yield ClubMember(
+                    member_id=pk,
+                    location_id=location_id,
+                    activity=activity,
+                    height=self.rng.randint(140, 205),
+                    weight=self.rng.randint(40, 110),
+                    gender=gender,
+                    minor=minor,
+                    **person,
+                )
+                pk += 1
+
+    def _family_relationships(self):
+        relationship_id = _next_pk(FamilyRelationship)
+        for member_id, location_id, birthdate in self.minors:
+            families = self.families_by_location[location_id]
+            for is_primary, family_member_id in zip((True, False), self.rng.sample(families, 2)):
+                if not is_primary and self.rng.random() > 0.2:
+                    break
+                yield FamilyRelationship(
+                    minor_id=member_id,
+                    major_id=family_member_id,
+                    relationship_id=relationship_id,
+                    relationship_type=self.rng.choice(RELATIONSHIPS),
+                    start_date=birthdate,
+                    is_primary=is_primary,
+                    emergency_contact=is_primary,
+                )
+                relationship_id += 1
+
+    def _secondary_family_members(self):
+        for member_id, _, _ in self.minors:
+            if self.rng.random() < 0.3:
+                first_name, last_name = self._name()
+                yield SecondaryFamilyMember(
+                    minor_id=member_id,
+                    first_name=first_name,
+                    last_name=last_name,
+                    phone=self._phone(),
+                    relationship_type=self.rng.choice(RELATIONSHIPS),
+                )
+
+    def _member_hobbies(self):
+        for member_id in self.member_flags:
+            for hobby_id in self.rng.sample(self.hobby_ids, self.rng.randint(0, 2)):
+                yield MemberHobbies(member_id=member_id, hobby_id=hobby_id)
+
+    def _payments(self):
+        """Active members have paid the current year; everyone may have paid earlier years, in 1-4 installments"""
+        current_year = self.today.year
+        for member_id, (minor, activity, _) in self.member_flags.items():
+            fee = Decimal('100.00') if minor else Decimal('200.00')
+            for year in range(current_year - PAYMENT_YEARS + 1, current_year + 1):
+                if year == current_year and not activity:
+                    continue
+                if year != current_year and self.rng.random() < 0.3:
+                    continue
+                installments = self.rng.choice([1, 1, 2, 4])
+                for number in range(1, installments + 1):
+                    yield Payments(
+                        member_id=member_id,
+                        payment_date=min(date(year, 1, 1) + timedelta(days=self.rng.randint(0, 300)), self.today),
+                        amount=fee / installments,
+                        payment_method=self.rng.choice(['cash', 'debit', 'credit']),
+                        membership_year=year,
+                        payment_type='membership',
+                        installment_number=number if installments > 1 else None,
+                    )
+                if self.rng.random() < 0.05:
+                    yield Payments(
+                        member_id=member_id,
+                        payment_date=date(year, 12, 1) if year < current_year else self.today,
+                        amount=Decimal(self.rng.randint(10, 500)),
+                        payment_method=self.rng.choice(['cash', 'debit', 'credit']),
+                        membership_year=year,
+                        payment_type='donation',
+                    )
+
+    @staticmethod
+    def _write_timestamps(model, names, batch, stamps):
+        """One UPDATE by primary key per row, run with executemany; bulk_update's CASE costs far more per row"""
+        connection = connections[router.db_for_write(model)]
+        fields = [model._meta.get_field(name) for name in names]
+        quote = connection.ops.quote_name
+        assignments = ', '.join(f'{quote(field.column)} = %s' for field in fields)
+        sql = f'UPDATE {quote(model._meta.db_table)} SET {assignments} WHERE {quote(model._meta.pk.column)} = %s'
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                [field.get_db_prep_save(value, connection) for field, value in zip(fields, values)] + [obj.pk]
+                for obj, values in zip(batch, stamps)
+            ])
+        for obj, values in zip(batch, stamps):
+            for name, value in zip(names, values):
+                setattr(obj, name, value)
+
+    def _sessions(self):
+        """Weekly sessions per location over the last two years; each gets two SessionTeams"""
+        pk = _next_pk(Sessions)
+        first_day = self.today - timedelta(weeks=SESSIONS_PER_LOCATION - 4)
+        for location_id in self.location_ids:
+            for week in range(SESSIONS_PER_LOCATION):
+                session_date = first_day + timedelta(weeks=week, days=self.rng.randint(0, 6))
+                session_time = dt_time(self.rng.choice([9, 10, 14, 16, 18, 19]), self.rng.choice([0, 30]))
+                session_type = 'game' if self.rng.random() < 0.4 else 'training'
+                status = 'completed' if session_date < self.today else 'scheduled'
+                if self.rng.random() < 0.03:
+                    status = 'cancelled'
+                session = Sessions(
+                    session_id=pk,
+                    session_type=session_type,
+                    session_date=session_date,
+                    session_time=session_time,
+                    status=status,
+                    created_date=self._aware(datetime.combine(session_date - timedelta(days=14), dt_time(9))),
+                    **self._address(),
+                )
+                session.starts_at = session.compute_starts_at()
+                self.session_rows.append((pk, location_id, session_type, status, session.starts_at))
+                yield session
+                pk += 1
+
+    def _session_teams(self):
+        pk = _next_pk(SessionTeams)
+        self.teams = []
+        for session_id, location_id, session_type, status, starts_at in self.session_rows:
+            gender = self.rng.choice(['M', 'F'])
+            coaches = self.rng.sample(self.coaches_by_location[location_id], 2)
+            scored = session_type == 'game' and status == 'completed'
+            for team_number, coach_id in zip((1, 2), coaches):
+                self.teams.append((pk, session_id, location_id, gender, starts_at))
+                yield SessionTeams(
+                    team_id=pk,
+                    session_id=session_id,
+                    team_name=f'Team {pk}',
+                    location_id=location_id,
+                    head_coach_id=coach_id,
+                    team_number=team_number,
+                    score=self.rng.randint(0, 3) if scored else None,
+                    gender=gender,
+                )
+                pk += 1
+
+    def _player_assignments(self):
+        for team_id, session_id, location_id, gender, starts_at in self.teams:
+            players = self.players_by_location.get((location_id, gender), [])
+            roster = self.rng.sample(players, min(len(players), self.rng.randint(6, 9)))
+            for i, member_id in enumerate(roster):
+                self.rosters.append((member_id, session_id, location_id, starts_at))
+                yield PlayerAssignment(
+                    team_id=team_id,
+                    member_id=member_id,
+                    position=self.rng.choice(POSITIONS),
+                    is_starter=i < 6,
+                )
+
+    def _session_outcomes(self):
+        if not self.session_rows:
+            return
+        new_sessions = Sessions.objects.filter(pk__gte=self.session_rows[0][0]).values('pk')
+        for session_id, values in SessionOutcome.compute(new_sessions).items():
+            yield SessionOutcome(session_id=session_id, **values)
+
+    def _play_stats(self):
+        if not self.member_flags:
+            return
+        new_members = ClubMember.objects.filter(pk__gte=min(self.member_flags)).values('pk')
+        for member_id, values in MemberPlayStats.compute(new_members).items():
+            yield MemberPlayStats(member_id=member_id, **values)
+
+    def _email_logs(self):
+        """Roughly half of the rostered players got a notification two days before their session"""
+        pk = _next_pk(EmailLog)
+        for member_id, session_id, location_id, starts_at in self.rosters:
+            if self.rng.random() < 0.5:
+                yield EmailLog(
+                    log_id=pk,
+                    email_date=starts_at - timedelta(days=2),
+                    sender_location_id=location_id,
+                    receiver_member_id=member_id,
+                    receiver_email=self.member_flags[member_id][2],
+                    subject=f'Session on {starts_at:%Y-%m-%d}',
+                    body_preview=f'You have been assigned to the session of {starts_at:%Y-%m-%d %H:%M}.',
+                    email_type='session_notification',
+                    status=self.rng.choices(['sent', 'failed', 'pending'], weights=[95, 3, 2])[0],
+                    session_id=session_id,
+                )
+                pk += 1
@@ -1,15 +1,53 @@
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
 from datetime import date, timedelta
 from decimal import Decimal
+from functools import partial
+from io import StringIO
+from unittest import mock, skipUnless
 
+from club import exports, urls
+from club.backends.mysql_pool import base as pooled
+from club.backends.pool import ConnectionPool, PoolTimeout
+from club.forms import ClubMemberForm, PlayerAssignmentForm, SessionTeamsForm
+from club.imports import MemberImporter, MemberImportError
+from club.management.commands.benchmark_reports import compare
+from club.management.sqlscript import SQLScriptError, iter_statements
 from club.models import (
     Location, Personnel, FamilyMember, SecondaryFamilyMember,
     ClubMember, Payments, SessionTeams, PlayerAssignment,
     FamilyRelationship, Hobbies, EmailLog, PersonnelAssignment,
-    Sessions, MemberHobbies
+    Sessions, MemberHobbies, LocationStats, SessionOutcome, MemberPlayStats,
+    POSITION_BITS, ReplicationHeartbeat
 )
-from django.test import TestCase, Client
+from club.pagination import encode_cursor
+from club.querycount import QueryBudgetTestMixin, record_queries
+from club.routers import read_database, replica_reads, reset_lag_check
+from club.search import search_people
+from club.views import IMPORT_ERRORS_DIR, _import_errors_path
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.db.models import Count, F
+from django.db.utils import ConnectionHandler
+from django.template.loader import render_to_string
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-
+from django.utils import timezone
 
 class ModelConstraintsTestCase(TestCase):
     """Test model constraints and business rules from the project documentation"""
@@ -304,6 +342,23 @@ class SessionTeamsTestCase(TestCase):
         self.assertEqual(team.head_coach, self.coach)
         self.assertEqual(team.gender, 'M')
 
+    def test_session_starts_at(self):
+        """Test that starts_at follows session_date and session_time"""
+        session = Sessions.objects.create(
+            session_type='game',
+            session_date=date(2024, 5, 1),
+            session_time='18:30',
+            address='123 Game St',
+            status='scheduled'
+        )
+        session.refresh_from_db()
+        self.assertEqual(session.starts_at.isoformat(), '2024-05-01T18:30:00+00:00')
+
+        session.session_date = date(2024, 5, 2)
+        session.save(update_fields=['session_date'])
+        session.refresh_from_db()
+        self.assertEqual(session.starts_at.date(), date(2024, 5, 2))
+
     def test_player_assignment_to_team(self):
         """Test assigning players to teams"""
         tomorrow = date.today() + timedelta(days=1)
@@ -552,3 +607,1838 @@ class EmailLogTestCase(TestCase):
         self.assertEqual(email_log.subject, 'Test Email')
         self.assertEqual(email_log.email_type, 'general')
         self.assertEqual(email_log.status, 'sent')
+
+
+class ClubMemberPaginationTestCase(TestCase):
+    """Test keyset pagination of the club member list"""
+
+    def setUp(self):
+        self.client = Client()
+        self.location = Location.objects.create(
+            name='Test Location',
+            type='head',
+            address='123 Test St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            phone='514-555-0100',
+            capacity=100
+        )
+        self.other_location = Location.objects.create(
+            name='Other Location',
+            type='branch',
+            address='456 Test St',
+            city='Laval',
+            province='Quebec',
+            postal_code='H7A 1A1',
+            phone='514-555-0200',
+            capacity=100
+        )
+
+        # Duplicate names make the member_id tie-breaker matter
+        for i, last_name in enumerate(['Adams', 'Brown', 'Brown', 'Brown', 'Clark', 'Davis', 'Evans']):
+            ClubMember.objects.create(
+                first_name='Sam',
+                last_name=last_name,
+                birthdate=date(1990, 1, 1),
+                ssn=f'700-00-{i:04d}',
+                medicare_number=f'PAGE{i:06d}',
+                phone='514-555-0700',
+                address='123 Page St',
+                city='Montreal',
+                province='Quebec',
+                postal_code='H1A 1A1',
+                email=f'page{i}@test.com',
+                height=175,
+                weight=70,
+                location=self.other_location if i == 6 else self.location,
+                gender='M',
+                minor=False,
+                activity=i % 2 == 0
+            )
+
+    def _walk(self, **params):
+        member_ids = []
+        params['format'] = 'json'
+        while True:
+            response = self.client.get(reverse('club_member_list'), params)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            member_ids.extend(row['member_id'] for row in data['results'])
+            if not data['next_cursor']:
+                return member_ids
+            params['cursor'] = data['next_cursor']
+
+    def test_pages_cover_every_member_in_order(self):
+        """Walking the cursor chain returns each member exactly once, in name order"""
+        expected = list(ClubMember.objects.order_by('last_name', 'first_name', 'member_id')
+                        .values_list('member_id', flat=True))
+        self.assertEqual(self._walk(page_size=2), expected)
+
+    def test_filters(self):
+        """Location and activity filters are applied to every page"""
+        self.assertEqual(len(self._walk(page_size=2, location=self.location.pk)), 6)
+        active = self._walk(page_size=2, activity='true')
+        self.assertEqual(set(active), set(ClubMember.objects.filter(activity=True).values_list('member_id', flat=True)))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('club_member_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        # Well-formed cursors whose values do not fit the keyset fields
+        for values in (['a', 'b', 'c'], [[1], [2], [3]], [{'x': 1}, {'x': 2}, {'x': 3}], ['a', 'b', None]):
+            response = self.client.get(reverse('member_list'), {'cursor': encode_cursor(values)})
+            self.assertEqual(response.status_code, 400, values)
+
+    def test_html_page_links_to_next_page(self):
+        response = self.client.get(reverse('club_member_list'), {'page_size': 3})
+        self.assertEqual(len(response.context['club_members']), 3)
+        self.assertIn('cursor=', response.context['next_page_query'])
+        response = self.client.get(reverse('member_list'), {'page_size': 10})
+        self.assertIsNone(response.context['next_page_query'])
+
+
+class LocationStatsTestCase(TestCase):
+    """Test that the LocationStats summary table follows changes to its source tables"""
+
+    def setUp(self):
+        self.location = Location.objects.create(
+            name='Test Location',
+            type='head',
+            address='123 Test St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            phone='514-555-0100',
+            capacity=100
+        )
+        self.branch = Location.objects.create(
+            name='Branch Location',
+            type='branch',
+            address='456 Test St',
+            city='Laval',
+            province='Quebec',
+            postal_code='H7A 1A1',
+            phone='514-555-0200',
+            capacity=100
+        )
+        self.manager = Personnel.objects.create(
+            first_name='Gina',
+            last_name='Manager',
+            birthdate=date(1975, 1, 1),
+            ssn='800-00-0001',
+            medicare_number='STATS00001',
+            phone='514-555-0800',
+            address='1 Manager St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            email='manager@test.com'
+        )
+
+    def _member(self, ssn, minor, location=None):
+        return ClubMember.objects.create(
+            first_name='Stat',
+            last_name='Member',
+            birthdate=date(2012, 1, 1) if minor else date(1990, 1, 1),
+            ssn=ssn,
+            medicare_number=f'MED{ssn}',
+            phone='514-555-0801',
+            address='1 Stat St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            email='stat@test.com',
+            height=170,
+            weight=60,
+            location=location or self.location,
+            gender='F',
+            minor=minor
+        )
+
+    def _stats(self, location):
+        return LocationStats.objects.get(location=location)
+
+    def test_member_counts_follow_saves_moves_and_deletes(self):
+        minor = self._member('800-00-1001', minor=True)
+        self._member('800-00-1002', minor=False)
+        stats = self._stats(self.location)
+        self.assertEqual((stats.minor_members, stats.major_members), (1, 1))
+
+        minor.location = self.branch
+        minor.save()
+        self.assertEqual(self._stats(self.location).minor_members, 0)
+        self.assertEqual(self._stats(self.branch).minor_members, 1)
+
+        minor.delete()
+        self.assertEqual(self._stats(self.branch).minor_members, 0)
+
+    def test_team_count_and_general_manager(self):
+        PersonnelAssignment.objects.create(
+            personnel=self.manager,
+            location=self.location,
+            assignment_id=1,
+            role='general manager',
+            mandate='salaried',
+            start_date=date(2020, 1, 1)
+        )
+        session = Sessions.objects.create(
+            session_type='game',
+            session_date=date(2024, 5, 1),
+            session_time='18:00',
+            address='1 Gym St'
+        )
+        SessionTeams.objects.create(
+            session=session,
+            team_name='Team A',
+            location=self.location,
+            head_coach=self.manager,
+            team_number=1,
+            gender='F'
+        )
+        stats = self._stats(self.location)
+        self.assertEqual(stats.team_count, 1)
+        self.assertEqual(stats.general_manager_name, 'Gina Manager')
+
+        self.manager.last_name = 'Director'
+        self.manager.save()
+        self.assertEqual(self._stats(self.location).general_manager_name, 'Gina Director')
+
+    def test_rebuild_command_repairs_drift(self):
+        self._member('800-00-1003', minor=False)
+        # queryset.update() bypasses the signal handlers
+        LocationStats.objects.filter(location=self.location).update(major_members=42)
+        with self.assertRaises(CommandError):
+            call_command('location_stats', '--check', stdout=StringIO())
+        call_command('location_stats', stdout=StringIO())
+        self.assertEqual(self._stats(self.location).major_members, 1)
+        call_command('location_stats', '--check', stdout=StringIO())
+
+    def _team(self, session_date):
+        session = Sessions.objects.create(
+            session_type='game',
+            session_date=session_date,
+            session_time='18:00',
+            address='1 Gym St'
+        )
+        return SessionTeams.objects.create(
+            session=session,
+            team_name=f'Team {session_date}',
+            location=self.location,
+            head_coach=self.manager,
+            team_number=1,
+            gender='F'
+        )
+
+    def test_counter_caches_follow_saves_moves_and_deletes(self):
+        member = self._member('800-00-1004', minor=False)
+        other = self._member('800-00-1005', minor=False)
+        self.location.refresh_from_db()
+        self.assertEqual(self.location.member_count, 2)
+
+        member.location = self.branch
+        member.save()
+        self.location.refresh_from_db()
+        self.branch.refresh_from_db()
+        self.assertEqual((self.location.member_count, self.branch.member_count), (1, 1))
+
+        team, second_team = self._team(date(2024, 5, 1)), self._team(date(2024, 5, 8))
+        assignment = PlayerAssignment.objects.create(team=team, member=member, position='Setter')
+        PlayerAssignment.objects.create(team=team, member=other, position='Libero')
+        team.refresh_from_db()
+        self.assertEqual(team.player_count, 2)
+
+        assignment.team = second_team
+        assignment.save()
+        # Deleting a member cascades to its roster entries, which are uncounted too
+        other.delete()
+        team.refresh_from_db()
+        second_team.refresh_from_db()
+        self.location.refresh_from_db()
+        self.assertEqual((team.player_count, second_team.player_count), (0, 1))
+        self.assertEqual(self.location.member_count, 0)
+
+    def test_deleting_under_a_drifted_counter_leaves_it_at_zero(self):
+        member = self._member('800-00-1012', minor=False)
+        Location.objects.filter(pk=self.location.pk).update(member_count=0)
+        with CaptureQueriesContext(connection) as queries:
+            member.delete()
+        self.location.refresh_from_db()
+        self.assertEqual(self.location.member_count, 0)
+        # The decrement is skipped rather than clamped: MySQL rejects 0 - 1 on the unsigned column before any GREATEST
+        [update] = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "club_location"')]
+        self.assertIn('"member_count" >= 1', update)
+
+    def test_saving_a_stale_instance_keeps_the_counters(self):
+        stale_location = Location.objects.get(pk=self.location.pk)
+        team = self._team(date(2024, 5, 1))
+        stale_team = SessionTeams.objects.get(pk=team.pk)
+        for ssn, position in (('800-00-1010', 'Setter'), ('800-00-1011', 'Libero')):
+            PlayerAssignment.objects.create(team=team, member=self._member(ssn, minor=False), position=position)
+
+        stale_location.phone = '514-555-0199'
+        stale_location.save()
+        stale_team.score = 3
+        stale_team.save()
+        self.location.refresh_from_db()
+        team.refresh_from_db()
+        self.assertEqual((self.location.member_count, self.location.phone), (2, '514-555-0199'))
+        self.assertEqual((team.player_count, team.score), (2, 3))
+        self.assertEqual(Location.recount_members(fix=False) + SessionTeams.recount_players(fix=False), 0)
+
+    def test_counter_saves_keep_the_model_save_semantics(self):
+        self._member('800-00-1013', minor=False)
+        stale_location = Location.objects.get(pk=self.location.pk)
+        self._member('800-00-1014', minor=False)
+        stale_location.name = 'Renamed'
+        stale_location.save(update_fields=['name', 'member_count'])
+        self.location.refresh_from_db()
+        self.assertEqual((self.location.name, self.location.member_count), ('Renamed', 2))
+
+        # A full save of an instance whose row is gone inserts it again, as Model.save() does
+        location = Location.objects.create(name='Gone', type='branch', address='3 Main St', city='Montreal',
+                                           province='Quebec', postal_code='H1A 1A3', phone='514-555-0300',
+                                           capacity=5)
+        Location.objects.filter(pk=location.pk).delete()
+        location.save()
+        self.assertTrue(Location.objects.filter(pk=location.pk, name='Gone').exists())
+
+    def test_rebuild_command_repairs_counter_drift(self):
+        self._member('800-00-1006', minor=False)
+        Location.objects.filter(pk=self.location.pk).update(member_count=7)
+        with self.assertRaises(CommandError):
+            call_command('location_stats', '--check', stdout=StringIO())
+        call_command('location_stats', stdout=StringIO())
+        self.location.refresh_from_db()
+        self.assertEqual(self.location.member_count, 1)
+
+    def test_member_form_rejects_a_full_location(self):
+        Location.objects.filter(pk=self.branch.pk).update(capacity=1)
+        self._member('800-00-1007', minor=False, location=self.branch)
+        form = ClubMemberForm(data={'location': self.branch.pk})
+        self.assertIn('is full', form.errors['location'][0])
+        form = ClubMemberForm(data={'location': self.location.pk})
+        self.assertNotIn('location', form.errors)
+
+
+class SyntheticDataTestCase(TestCase):
+    """Test the synthetic data generator behind `populate --scale`"""
+
+    def test_scale_one_is_referentially_consistent(self):
+        call_command('populate', scale=1, seed=1, stdout=StringIO())
+
+        self.assertEqual(Location.objects.count(), 1)
+        self.assertEqual(ClubMember.objects.count(), 1000)
+        # Every minor has a primary family member and minor flags match birthdates
+        self.assertFalse(ClubMember.objects.filter(minor=True, familyrelationship__isnull=True).exists())
+        self.assertTrue(all(member.is_minor == member.minor for member in ClubMember.objects.all()))
+        # Each session has its two teams and every roster respects the team's gender and location
+        self.assertFalse(Sessions.objects.annotate(teams=Count('sessionteams')).exclude(teams=2).exists())
+        self.assertFalse(PlayerAssignment.objects.exclude(member__gender=F('team__gender')).exists())
+        self.assertFalse(PlayerAssignment.objects.exclude(member__location=F('team__location')).exists())
+        self.assertFalse(Sessions.objects.filter(starts_at__isnull=True).exists())
+        # The generated timestamps are kept, without touching the auto_now_add fields
+        self.assertFalse(Sessions.objects.exclude(created_date__lt=F('starts_at')).exists())
+        self.assertFalse(EmailLog.objects.exclude(email_date__lt=F('session__starts_at')).exists())
+        self.assertTrue(Sessions._meta.get_field('created_date').auto_now_add)
+        self.assertTrue(EmailLog._meta.get_field('email_date').auto_now_add)
+        # Exactly one current general manager per location, reflected in LocationStats
+        self.assertIsNotNone(LocationStats.objects.get().general_manager_name)
+        call_command('location_stats', '--check', stdout=StringIO())
+        self.assertTrue(SessionOutcome.objects.exists())
+        call_command('session_outcomes', '--check', stdout=StringIO())
+        call_command('play_stats', '--check', stdout=StringIO())
+
+
+class BenchmarkReportsTestCase(TestCase):
+    """Test the report benchmark command and its baseline comparison"""
+
+    def test_benchmark_writes_results_and_detects_regressions(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'baseline.json')
+            call_command('benchmark_reports', scales='1', repeat=2, warmup=0, only='query_8,member_list',
+                         output=output, use_current_db=True, stdout=StringIO())
+            with open(output) as f:
+                results = json.load(f)['results']
+            self.assertEqual(set(results['1']), {'query_8', 'member_list'})
+            self.assertEqual(results['1']['member_list']['rows'], 50)
+
+            # A baseline that used fewer queries than today must fail the comparison
+            results['1']['member_list']['queries'] = 0
+            with open(output, 'w') as f:
+                json.dump({'results': results}, f)
+            with self.assertRaises(CommandError):
+                call_command('benchmark_reports', scales='1', repeat=2, warmup=0, only='member_list',
+                             baseline=output, use_current_db=True, stdout=StringIO())
+
+    def test_compare_ignores_noise(self):
+        baseline = {'1': {'query_8': {'p95_ms': 1.0, 'queries': 1}}}
+        self.assertEqual(compare(baseline, {'1': {'query_8': {'p95_ms': 2.5, 'queries': 1}}}, 1.5), [])
+        self.assertEqual(len(compare(baseline, {'1': {'query_8': {'p95_ms': 9.0, 'queries': 1}}}, 1.5)), 1)
+
+
+class QueryBudgetTestCase(QueryBudgetTestMixin, TestCase):
+    """Test that every club view stays within its declared query budget regardless of row counts"""
+
+    # These views fail before rendering because they still use fields that no longer exist on the models; they
+    # declare no budget until they work and the suite can check it
+    BROKEN_VIEWS = {
+        'family_member_detail', 'inactive_members_report',
+        'secondary_family_member_create', 'secondary_family_member_edit', 'secondary_family_member_delete',
+    }
+
+    def setUp(self):
+        self.client = Client()
+        self.location = Location.objects.create(
+            name='Test Location',
+            type='head',
+            address='123 Test St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            phone='514-555-0100',
+            capacity=100
+        )
+        hobbies = [Hobbies.objects.create(name=name) for name in ('Volleyball', 'Tennis', 'Yoga')]
+        self.coaches = []
+        for i in range(3):
+            coach = Personnel.objects.create(
+                first_name=f'Coach{i}',
+                last_name='Budget',
+                birthdate=date(1980, 1, 1),
+                ssn=f'600-00-{i:04d}',
+                medicare_number=f'BUDGETP{i:03d}',
+                phone='514-555-0600',
+                address='1 Coach St',
+                city='Montreal',
+                province='Quebec',
+                postal_code='H1A 1A1',
+                email=f'coach{i}@test.com'
+            )
+            PersonnelAssignment.objects.create(
+                personnel=coach,
+                location=self.location,
+                assignment_id=i,
+                role='coach',
+                mandate='salaried',
+                start_date=date(2020, 1, 1)
+            )
+            self.coaches.append(coach)
+        self.family_member = FamilyMember.objects.create(
+            first_name='Parent',
+            last_name='Budget',
+            birthdate=date(1975, 1, 1),
+            ssn='600-00-1000',
+            medicare_number='BUDGETF000',
+            phone='514-555-0601',
+            address='1 Parent St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            email='parent@test.com',
+            location=self.location
+        )
+        self.members = []
+        for i in range(3):
+            member = ClubMember.objects.create(
+                first_name=f'Player{i}',
+                last_name='Budget',
+                birthdate=date(2012, 1, 1) if i == 0 else date(1995, 1, 1),
+                ssn=f'600-00-2{i:03d}',
+                medicare_number=f'BUDGETM{i:03d}',
+                phone='514-555-0602',
+                address='1 Player St',
+                city='Montreal',
+                province='Quebec',
+                postal_code='H1A 1A1',
+                email=f'player{i}@test.com',
+                height=170,
+                weight=60,
+                location=self.location,
+                gender='F',
+                minor=i == 0,
+                activity=True
+            )
+            self.members.append(member)
+            for hobby in hobbies:
+                MemberHobbies.objects.create(member=member, hobby=hobby)
+            for year in (2023, 2024, 2025):
+                Payments.objects.create(
+                    member=member,
+                    payment_date=date(year, 1, 15),
+                    amount=Decimal('100.00'),
+                    payment_method='cash',
+                    membership_year=year
+                )
+        for i in range(3):
+            FamilyRelationship.objects.create(
+                minor=self.members[0],
+                major=self.family_member,
+                relationship_id=i,
+                relationship_type='mother',
+                start_date=date(2012, 1, 1 + i)
+            )
+        self.teams = []
+        for day in range(1, 4):
+            session = Sessions.objects.create(
+                session_type='game',
+                session_date=date(2024, 5, day),
+                session_time='18:00',
+                address='1 Gym St'
+            )
+            for team_number in (1, 2):
+                team = SessionTeams.objects.create(
+                    session=session,
+                    team_name=f'Team {day}-{team_number}',
+                    location=self.location,
+                    head_coach=self.coaches[team_number],
+                    team_number=team_number,
+                    score=team_number,
+                    gender='F'
+                )
+                self.teams.append(team)
+                for member in self.members:
+                    PlayerAssignment.objects.create(team=team, member=member, position='Setter')
+
+    def _import_errors(self):
+        """Token of an import error file, as left by member_import"""
+        token = uuid.uuid4()
+        os.makedirs(IMPORT_ERRORS_DIR, exist_ok=True)
+        with open(_import_errors_path(token), 'w') as errors:
+            errors.write('line,errors\n')
+        self.addCleanup(os.remove, _import_errors_path(token))
+        return token
+
+    def test_every_club_view_declares_a_budget(self):
+        for pattern in urls.urlpatterns:
+            budget = getattr(pattern.callback, 'query_budget', None)
+            if pattern.name in self.BROKEN_VIEWS:
+                self.assertIsNone(budget, f'{pattern.name} declares a budget this suite cannot check')
+            else:
+                self.assertIsNotNone(budget, pattern.name)
+
+    def test_views_stay_within_budget(self):
+        args = {
+            'formation_pk': self.teams[0].pk,
+            'family_member_pk': self.family_member.pk,
+            'source': 'locations',
+            'token': self._import_errors(),
+        }
+        detail_pks = {
+            'personnel': self.coaches[0].pk,
+            'family_member': self.family_member.pk,
+            'club_member': self.members[0].pk,
+            'team_formation': self.teams[0].pk,
+            'player_assignment': PlayerAssignment.objects.first().pk,
+        }
+        for pattern in urls.urlpatterns:
+            if pattern.name in self.BROKEN_VIEWS:
+                continue
+            kwargs = {}
+            for name in pattern.pattern.converters:
+                if name == 'pk':
+                    kwargs['pk'] = next(pk for prefix, pk in detail_pks.items() if pattern.name.startswith(prefix))
+                else:
+                    kwargs[name] = args[name]
+            with self.subTest(view=pattern.name):
+                self.assertWithinQueryBudget(reverse(pattern.name, kwargs=kwargs))
+
+    def test_n_plus_one_is_traced_to_the_template_line(self):
+        with record_queries() as recorder:
+            render_to_string('team_formation_list.html', {'formations': SessionTeams.objects.all()})
+        origins = {origin for repeated in recorder.repeated() for origin in repeated.origins}
+        self.assertIn('team_formation_list.html:30', origins)  # formation.session
+        self.assertIn('team_formation_list.html:33', origins)  # formation.location
+
+    def test_middleware_reports_query_count(self):
+        with override_settings(DEBUG=True):
+            response = Client().get(reverse('team_formation_list'))
+        self.assertEqual(response['X-Query-Count'], '1')
+
+    def test_club_member_detail_query_count_is_fixed(self):
+        """The member page runs the same 5 queries no matter how long the member's history is"""
+        member = self.members[0]
+        url = reverse('club_member_detail', args=[member.pk])
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['team_assignments']), 6)
+        self.assertContains(response, 'Yoga')
+        self.assertContains(response, 'Parent Budget')
+
+        for day in range(10, 20):
+            session = Sessions.objects.create(
+                session_type='training',
+                session_date=date(2024, 6, day),
+                session_time='18:00',
+                address='1 Gym St'
+            )
+            team = SessionTeams.objects.create(
+                session=session,
+                team_name=f'Training {day}',
+                location=self.location,
+                head_coach=self.coaches[0],
+                team_number=1,
+                gender='F'
+            )
+            PlayerAssignment.objects.create(team=team, member=member, position='Libero')
+            Payments.objects.create(
+                member=member,
+                payment_date=date(2024, 6, day),
+                amount=Decimal('25.00'),
+                payment_method='debit',
+                membership_year=2024
+            )
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['team_assignments']), 16)
+        self.assertEqual(len(response.context['payments']), 13)
+
+
+class PersonnelCurrentAssignmentTestCase(TestCase):
+    """Test the annotated current assignment of personnel"""
+
+    def setUp(self):
+        self.location = Location.objects.create(
+            name='Test Location',
+            type='head',
+            address='123 Test St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            phone='514-555-0100',
+            capacity=100
+        )
+        self.personnel = []
+        for i in range(3):
+            person = Personnel.objects.create(
+                first_name=f'Staff{i}',
+                last_name='Member',
+                birthdate=date(1980, 1, 1),
+                ssn=f'500-00-{i:04d}',
+                medicare_number=f'STAFF{i:05d}',
+                phone='514-555-0500',
+                address='1 Staff St',
+                city='Montreal',
+                province='Quebec',
+                postal_code='H1A 1A1',
+                email=f'staff{i}@test.com'
+            )
+            # A past assignment followed by the current one
+            PersonnelAssignment.objects.create(
+                personnel=person,
+                location=self.location,
+                assignment_id=i * 2,
+                role='other' if i else 'coach',
+                mandate='volunteer',
+                start_date=date(2018, 1, 1),
+                end_date=date(2019, 12, 31)
+            )
+            if i < 2:
+                PersonnelAssignment.objects.create(
+                    personnel=person,
+                    location=self.location,
+                    assignment_id=i * 2 + 1,
+                    role='treasurer',
+                    mandate='salaried',
+                    start_date=date(2020, 1, 1)
+                )
+            self.personnel.append(person)
+
+    def test_annotated_values_match_the_per_row_methods(self):
+        with self.assertNumQueries(1):
+            annotated = list(Personnel.objects.with_current_assignment().order_by('pk'))
+            roles = [person.current_role() for person in annotated]
+            locations = [person.current_location() for person in annotated]
+        self.assertEqual(roles, [person.current_role() for person in self.personnel])
+        self.assertEqual(roles, ['treasurer', 'treasurer', None])
+        self.assertEqual([location and location.pk for location in locations],
+                         [self.location.pk, self.location.pk, None])
+        self.assertEqual(locations[0].name, 'Test Location')
+
+    def test_personnel_list_and_admin_use_one_query_for_assignments(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('personnel_list'))
+        self.assertContains(response, 'treasurer')
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@test.com', 'password'))
+        response = self.client.get(reverse('admin:club_personnel_changelist'))
+        self.assertContains(response, 'Test Location')
+
+
+class MemberAgeTestCase(TestCase):
+    """Test the database-computed age, minor status and fee of club members"""
+
+    def setUp(self):
+        self.location = Location.objects.create(
+            name='Test Location',
+            type='head',
+            address='123 Test St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            phone='514-555-0100',
+            capacity=100
+        )
+        self.today = date(2026, 2, 28)
+        birthdates = [
+            date(2008, 2, 28),  # 18th birthday today
+            date(2008, 2, 29),  # Leap day, still 17
+            date(2008, 3, 1),   # Turns 18 tomorrow
+            date(2015, 6, 15),
+            date(1990, 12, 31),
+        ]
+        for i, birthdate in enumerate(birthdates):
+            ClubMember.objects.create(
+                first_name=f'Age{i}',
+                last_name='Member',
+                birthdate=birthdate,
+                ssn=f'600-00-{i:04d}',
+                medicare_number=f'AGE{i:07d}',
+                phone='514-555-0600',
+                address='1 Age St',
+                city='Montreal',
+                province='Quebec',
+                postal_code='H1A 1A1',
+                email=f'age{i}@test.com',
+                height=170,
+                weight=60,
+                location=self.location,
+                gender='F'
+            )
+
+    def _expected_age(self, birthdate):
+        return (self.today.year - birthdate.year
+                - ((self.today.month, self.today.day) < (birthdate.month, birthdate.day)))
+
+    def test_annotations_match_python_computation(self):
+        members = ClubMember.objects.with_age(self.today).order_by('pk')
+        self.assertEqual([member.age for member in members],
+                         [self._expected_age(member.birthdate) for member in members])
+        self.assertEqual([member.age for member in members], [18, 17, 17, 10, 35])
+        self.assertEqual([member.is_minor for member in members], [False, True, True, True, False])
+        self.assertEqual([member.annual_fee for member in members], [200.0, 100.0, 100.0, 100.0, 200.0])
+
+    def test_minors_and_majors_filters(self):
+        self.assertEqual(ClubMember.objects.minors(self.today).count(), 3)
+        self.assertEqual(ClubMember.objects.majors(self.today).count(), 2)
+        # On a leap day, members born on 28 February 18 years earlier are adults
+        self.assertEqual(ClubMember.objects.minors(date(2028, 2, 29)).filter(first_name='Age0').count(), 0)
+
+
+class RefreshMemberFlagsTestCase(TestCase):
+    """Test the bulk recomputation of the stored minor and activity flags"""
+
+    def setUp(self):
+        self.location = Location.objects.create(
+            name='Test Location',
+            type='head',
+            address='123 Test St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            phone='514-555-0100',
+            capacity=100
+        )
+        self.today = date(2026, 3, 1)
+        # (birthdate, stored minor, stored activity, paid a membership this year)
+        cases = [
+            (date(2008, 3, 1), True, True, True),    # Turned 18 today
+            (date(2015, 1, 1), None, False, True),   # Never flagged, paid this year
+            (date(1990, 1, 1), False, True, False),  # Membership lapsed
+            (date(1985, 1, 1), False, True, True),   # Already correct
+        ]
+        self.members = []
+        for i, (birthdate, minor, activity, paid) in enumerate(cases):
+            member = ClubMember.objects.create(
+                first_name=f'Flag{i}',
+                last_name='Member',
+                birthdate=birthdate,
+                ssn=f'700-00-{i:04d}',
+                medicare_number=f'FLAG{i:06d}',
+                phone='514-555-0700',
+                address='1 Flag St',
+                city='Montreal',
+                province='Quebec',
+                postal_code='H1A 1A1',
+                email=f'flag{i}@test.com',
+                height=170,
+                weight=60,
+                location=self.location,
+                gender='M',
+                minor=minor,
+                activity=activity
+            )
+            Payments.objects.create(
+                member=member,
+                payment_date=date(2025, 2, 1),
+                amount=Decimal('200.00'),
+                payment_method='cash',
+                membership_year=2026 if paid else 2025
+            )
+            self.members.append(member)
+
+    def test_flags_are_recomputed_in_batches(self):
+        out = StringIO()
+        call_command('refresh_member_flags', today=self.today, batch_size=2, stdout=out)
+        self.assertIn('Updated minor on 2 and activity on 2 members', out.getvalue())
+        flags = list(ClubMember.objects.order_by('pk').values_list('minor', 'activity'))
+        self.assertEqual(flags, [(False, True), (True, True), (False, False), (False, True)])
+        stats = LocationStats.objects.get(location=self.location)
+        self.assertEqual((stats.minor_members, stats.major_members), (1, 3))
+
+        out = StringIO()
+        call_command('refresh_member_flags', today=self.today, stdout=out)
+        self.assertIn('Updated minor on 0 and activity on 0 members', out.getvalue())
+
+    def test_dry_run_changes_nothing(self):
+        out = StringIO()
+        call_command('refresh_member_flags', today=self.today, dry_run=True, stdout=out)
+        self.assertIn('Would update minor on 2 and activity on 2 members', out.getvalue())
+        self.assertTrue(ClubMember.objects.get(pk=self.members[0].pk).minor)
+
+
+class SessionOutcomeTestCase(TestCase):
+    """Test that SessionOutcome and MemberPlayStats follow the rosters and scores of sessions"""
+
+    def setUp(self):
+        self.location = Location.objects.create(
+            name='Test Location',
+            type='head',
+            address='123 Test St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            phone='514-555-0100',
+            capacity=100
+        )
+        self.coach = Personnel.objects.create(
+            first_name='Carl',
+            last_name='Coach',
+            birthdate=date(1980, 1, 1),
+            ssn='810-00-0001',
+            medicare_number='OUTCOME001',
+            phone='514-555-0810',
+            address='1 Coach St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            email='coach@test.com'
+        )
+        self.session = Sessions.objects.create(
+            session_type='game',
+            session_date=date(2024, 5, 1),
+            session_time='18:00',
+            address='1 Gym St'
+        )
+        self.home, self.away = (
+            SessionTeams.objects.create(
+                session=self.session,
+                team_name=f'Team {number}',
+                location=self.location,
+                head_coach=self.coach,
+                team_number=number,
+                gender='F'
+            )
+            for number in (1, 2)
+        )
+
+    def _score(self, team, score):
+        team.score = score
+        team.save()
+
+    def test_outcome_follows_score_changes(self):
+        self._score(self.home, 3)
+        self.assertFalse(SessionOutcome.objects.exists())
+
+        self._score(self.away, 1)
+        outcome = SessionOutcome.objects.get(session=self.session)
+        self.assertEqual((outcome.winner, outcome.loser, outcome.is_tie, outcome.margin),
+                         (self.home, self.away, False, 2))
+
+        self._score(self.away, 3)
+        outcome = SessionOutcome.objects.get(session=self.session)
+        self.assertEqual((outcome.winner, outcome.loser, outcome.is_tie, outcome.margin), (None, None, True, 0))
+
+        self.away.delete()
+        self.assertFalse(SessionOutcome.objects.exists())
+
+    def test_only_game_sessions_have_an_outcome(self):
+        self._score(self.home, 2)
+        self._score(self.away, 0)
+        self.session.session_type = 'training'
+        self.session.save()
+        self.assertFalse(SessionOutcome.objects.exists())
+
+    def test_rebuild_command_repairs_drift(self):
+        # queryset.update() bypasses the signal handlers
+        SessionTeams.objects.filter(pk=self.home.pk).update(score=1)
+        SessionTeams.objects.filter(pk=self.away.pk).update(score=2)
+        with self.assertRaises(CommandError):
+            call_command('session_outcomes', '--check', stdout=StringIO())
+        call_command('session_outcomes', stdout=StringIO())
+        self.assertEqual(SessionOutcome.objects.get().winner, self.away)
+        call_command('session_outcomes', '--check', stdout=StringIO())
+
+    def _player(self, ssn):
+        return ClubMember.objects.create(
+            first_name='Play',
+            last_name='Member',
+            birthdate=date(1995, 1, 1),
+            ssn=ssn,
+            medicare_number=f'MED{ssn}',
+            phone='514-555-0811',
+            address='1 Play St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            email='play@test.com',
+            height=170,
+            weight=60,
+            location=self.location,
+            gender='F'
+        )
+
+    def test_play_stats_follow_rosters_and_results(self):
+        player = self._player('810-00-1001')
+        assignment = PlayerAssignment.objects.create(team=self.home, member=player, position='Setter')
+        training = Sessions.objects.create(session_type='training', session_date=date(2024, 5, 2),
+                                           session_time='18:00', address='1 Gym St')
+        training_team = SessionTeams.objects.create(session=training, team_name='Practice', location=self.location,
+                                                     head_coach=self.coach, team_number=1, gender='F')
+        PlayerAssignment.objects.create(team=training_team, member=player, position='Libero')
+        stats = MemberPlayStats.objects.get(member=player)
+        self.assertEqual((stats.games_played, stats.trainings_played, stats.wins, stats.losses), (1, 1, 0, 0))
+        self.assertEqual((stats.game_positions, stats.training_positions),
+                         (POSITION_BITS['Setter'], POSITION_BITS['Libero']))
+
+        self._score(self.home, 1)
+        self._score(self.away, 3)
+        self.assertEqual(MemberPlayStats.objects.get(member=player).losses, 1)
+        self._score(self.home, 5)
+        stats = MemberPlayStats.objects.get(member=player)
+        self.assertEqual((stats.wins, stats.losses), (1, 0))
+
+        assignment.position = 'Outside Hitter'
+        assignment.save()
+        self.assertEqual(MemberPlayStats.objects.get(member=player).game_positions, POSITION_BITS['Outside Hitter'])
+
+        assignment.delete()
+        PlayerAssignment.objects.filter(member=player).get().delete()
+        self.assertFalse(MemberPlayStats.objects.filter(member=player).exists())
+
+    def test_play_stats_command_repairs_drift(self):
+        player = self._player('810-00-1002')
+        PlayerAssignment.objects.create(team=self.home, member=player, position='Setter')
+        MemberPlayStats.objects.filter(member=player).update(games_played=9)
+        with self.assertRaises(CommandError):
+            call_command('play_stats', '--check', stdout=StringIO())
+        call_command('play_stats', stdout=StringIO())
+        self.assertEqual(MemberPlayStats.objects.get(member=player).games_played, 1)
+        call_command('play_stats', '--check', stdout=StringIO())
+
+    def test_rebuild_command_refreshes_the_players_of_removed_outcomes(self):
+        player = self._player('810-00-1003')
+        PlayerAssignment.objects.create(team=self.home, member=player, position='Setter')
+        self._score(self.home, 3)
+        self._score(self.away, 1)
+        self.assertEqual(MemberPlayStats.objects.get(member=player).wins, 1)
+
+        # The game is no longer decided, bypassing the signal handlers
+        SessionTeams.objects.filter(pk=self.away.pk).update(score=None)
+        call_command('session_outcomes', stdout=StringIO())
+        self.assertFalse(SessionOutcome.objects.exists())
+        self.assertEqual(MemberPlayStats.objects.get(member=player).wins, 0)
+        call_command('play_stats', '--check', stdout=StringIO())
+
+
+class SqlitePerformanceProfileTestCase(TransactionTestCase):
+    """Test the opt-in SQLite PRAGMA profile and the commands that come with it, outside of a transaction"""
+
+    def _pragmas(self, *names):
+        new_connection = connections.create_connection('default')
+        try:
+            with new_connection.cursor() as cursor:
+                values = []
+                for name in names:
+                    cursor.execute(f'PRAGMA {name}')
+                    values.append(cursor.fetchone()[0])
+                return values
+        finally:
+            new_connection.close()
+
+    def test_profile_is_applied_to_new_connections(self):
+        # synchronous: 2 is FULL, 1 NORMAL; temp_store: 0 is the compile-time default, 2 MEMORY
+        self.assertEqual(self._pragmas('synchronous', 'temp_store'), [2, 0])
+        with override_settings(SQLITE_PERFORMANCE_PROFILE=True):
+            self.assertEqual(self._pragmas('synchronous', 'temp_store', 'busy_timeout'), [1, 2, 5000])
+        with override_settings(SQLITE_PERFORMANCE_PROFILE={'busy_timeout': 250}):
+            self.assertEqual(self._pragmas('synchronous', 'busy_timeout'), [1, 250])
+
+    def test_maintenance_command(self):
+        out = StringIO()
+        call_command('sqlite_maintenance', stdout=out)
+        self.assertIn('Ran PRAGMA optimize', out.getvalue())
+        # The test database lives in memory, which has no WAL
+        self.assertIn('Not in WAL mode', out.getvalue())
+
+    def test_concurrency_benchmark_runs_both_profiles(self):
+        location = Location.objects.create(name='Bench', type='head', address='1 Bench St', city='Montreal',
+                                           province='Quebec', postal_code='H1A 1A1', phone='514-555-0100',
+                                           capacity=10)
+        ClubMember.objects.create(first_name='Bench', last_name='Member', birthdate=date(1990, 1, 1),
+                                  ssn='830-00-0001', medicare_number='BENCH0001', phone='514-555-0101',
+                                  address='1 Bench St', city='Montreal', province='Quebec', postal_code='H1A 1A1',
+                                  email='bench@test.com', height=170, weight=60, location=location, gender='F')
+        out = StringIO()
+        call_command('benchmark_concurrency', use_current_db=True, readers=1, writers=1, duration=0.2, stdout=out)
+        output = out.getvalue()
+        self.assertRegex(output, r'default +reads +\d')
+        self.assertRegex(output, r'performance +reads +\d')
+        self.assertIn('Performance profile: reads x', output)
+        # The benchmark writes to copies only
+        self.assertEqual(ClubMember.objects.get().phone, '514-555-0101')
+
+
+class _StandInConnection:
+    """DB-API connection stand-in recording what the pool does with it"""
+
+    def __init__(self, **connect_params):
+        self.connect_params = connect_params
+        self.alive = True
+        self.closed = False
+        self.rollbacks = 0
+        self.encoders = {}
+
+    def ping(self):
+        if not self.alive:
+            raise OSError('Lost connection to MySQL server')
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTestCase(TestCase):
+    """Test the bounded connection pool behind the pooled MySQL backend"""
+
+    def _pool(self, **options):
+        self.opened = []
+
+        def connect():
+            self.opened.append(_StandInConnection())
+            return self.opened[-1]
+        return ConnectionPool(connect, check=lambda connection: connection.ping(), **options)
+
+    def test_returned_connections_are_reused(self):
+        pool = self._pool(max_size=2)
+        first = pool.acquire()
+        second = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        pool.release(second)
+        stats = pool.stats()
+        self.assertEqual((stats['opened'], stats['checkouts'], stats['size'], stats['idle']), (2, 3, 2, 1))
+
+    def test_full_pool_waits_then_times_out(self):
+        pool = self._pool(max_size=1, timeout=5)
+        connection = pool.acquire()
+        checked_out = []
+        waiter = threading.Thread(target=lambda: checked_out.append(pool.acquire()))
+        waiter.start()
+        time.sleep(0.05)
+        pool.release(connection)
+        waiter.join()
+        self.assertEqual(checked_out, [connection])
+        stats = pool.stats()
+        self.assertEqual((stats['opened'], stats['waited']), (1, 1))
+        self.assertGreaterEqual(stats['wait_max_ms'], 40)
+
+        pool.timeout = 0.05
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_dead_and_idle_connections_are_replaced(self):
+        pool = self._pool(max_size=1, max_idle=0.02)
+        connection = pool.acquire()
+        pool.release(connection)
+        connection.alive = False
+        replacement = pool.acquire()
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+
+        pool.release(replacement)
+        time.sleep(0.05)
+        self.assertIsNot(pool.acquire(), replacement)
+        self.assertTrue(replacement.closed)
+        self.assertEqual(pool.stats()['discarded'], 2)
+
+    def test_backend_returns_connections_to_the_pool(self):
+        settings_dict = {'ENGINE': 'club.backends.mysql_pool', 'NAME': 'club', 'OPTIONS': {'pool': {'max_size': 1}}}
+        databases = {'default': {'ENGINE': 'django.db.backends.dummy'}, 'pooled': settings_dict}
+        handler = ConnectionHandler(databases)
+        self.addCleanup(pooled._pools.pop, 'pooled', None)
+        with mock.patch.object(pooled.base.Database, 'connect', side_effect=_StandInConnection) as connect:
+            wrapper = handler['pooled']
+            self.assertNotIn('pool', wrapper.get_connection_params())
+            wrapper.connection = wrapper.get_new_connection(wrapper.get_connection_params())
+            connection = wrapper.connection
+            wrapper.close()
+            self.assertEqual((connection.rollbacks, connection.closed), (1, False))
+            # Another thread's wrapper gets the same server connection back
+            other = ConnectionHandler(databases)['pooled']
+            self.assertIs(other.get_new_connection(other.get_connection_params()), connection)
+            self.assertEqual(connect.call_count, 1)
+        self.assertEqual(pooled.pool_stats()['pooled']['in_use'], 1)
+
+        with self.assertRaises(ImproperlyConfigured):
+            ConnectionHandler({**databases, 'pooled': {**settings_dict, 'CONN_MAX_AGE': 60}})['pooled']
+
+
+class ReplicaRouterTestCase(TransactionTestCase):
+    """Test the read/write router against a replica made of a copy of the test database in a SQLite file"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.replica_path = os.path.join(cls.tmp.name, 'replica.sqlite3')
+        connections.settings['replica'] = {**connections['default'].settings_dict, 'NAME': cls.replica_path}
+        # Allowed only once the alias exists: the test runner, which sets up every database tests use, never sees it
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        cache.clear()
+        reset_lag_check()
+        self.addCleanup(reset_lag_check)
+        self.location = Location.objects.create(name='Primary Gym', type='head', address='1 Main St', city='Montreal',
+                                                province='Quebec', postal_code='H1A 1A1', phone='514-555-0100',
+                                                capacity=10)
+        ClubMember.objects.create(first_name='Ada', last_name='Primary', birthdate=date(1990, 1, 1),
+                                  ssn='840-00-0001', medicare_number='ROUTE0001', phone='514-555-0101',
+                                  address='1 Main St', city='Montreal', province='Quebec', postal_code='H1A 1A1',
+                                  email='ada@test.com', height=170, weight=60, location=self.location, gender='F',
+                                  activity=True)
+
+        ReplicationHeartbeat.beat_now()
+
+        # The replica starts as an up to date copy of the primary, where the member has another last name
+        connections['replica'].close()
+        connection.ensure_connection()
+        replica = sqlite3.connect(self.replica_path)
+        connection.connection.backup(replica)
+        replica.execute("UPDATE club_clubmember SET last_name = 'Replica'")
+        replica.commit()
+        replica.close()
+
+    def _replica_beat(self, beat):
+        replica = sqlite3.connect(self.replica_path)
+        replica.execute('INSERT OR REPLACE INTO club_replicationheartbeat (id, beat) VALUES (1, ?)',
+                        [beat.strftime('%Y-%m-%d %H:%M:%S.%f')])
+        replica.commit()
+        replica.close()
+
+    def test_list_views_and_report_exports_read_from_the_replica(self):
+        response = self.client.get(reverse('member_list'))
+        self.assertEqual([member.last_name for member in response.context['members']], ['Replica'])
+        response = self.client.get(reverse('queries_asked:query', args=['13']), {'format': 'ndjson'})
+        self.assertIn(b'"last_name": "Replica"', b''.join(response.streaming_content))
+        # Cached report results are read from the primary, which the cache invalidation follows
+        response = self.client.get(reverse('queries_asked:query', args=['13']))
+        self.assertEqual(response.context['rows'][0][response.context['columns'].index('last_name')], 'Primary')
+        # Views that are not decorated read from the primary
+        member = ClubMember.objects.get()
+        self.assertEqual(member.last_name, 'Primary')
+
+    def test_writes_go_to_the_primary_and_later_reads_follow_them(self):
+        with replica_reads():
+            self.assertEqual(read_database(), 'replica')
+            self.assertEqual(ClubMember.objects.get().last_name, 'Replica')
+            Location.objects.create(name='New Gym', type='branch', address='2 Main St', city='Montreal',
+                                    province='Quebec', postal_code='H1A 1A2', phone='514-555-0200', capacity=10)
+            self.assertEqual(read_database(), 'default')
+            self.assertEqual(Location.objects.count(), 2)
+        self.assertEqual(Location.objects.using('replica').count(), 1)
+
+    def test_lagging_replica_falls_back_to_the_primary(self):
+        with replica_reads():
+            sqlite3.connect(self.replica_path).execute('DELETE FROM club_replicationheartbeat').connection.commit()
+            reset_lag_check()
+            # The replica has not received any heartbeat yet
+            self.assertEqual(read_database(), 'default')
+            self._replica_beat(timezone.now() - timedelta(minutes=1))
+            reset_lag_check()
+            self.assertEqual(read_database(), 'default')
+            self._replica_beat(timezone.now() - timedelta(seconds=2))
+            reset_lag_check()
+            self.assertEqual(read_database(), 'replica')
+        response = self.client.get(reverse('member_list'))
+        self.assertEqual([member.last_name for member in response.context['members']], ['Replica'])
+
+    def test_stopped_heartbeat_falls_back_to_the_primary(self):
+        # The last beat reached the replica, then replication_heartbeat stopped: both copies agree but are old
+        beat = timezone.now() - timedelta(minutes=5)
+        ReplicationHeartbeat.objects.update(beat=beat)
+        self._replica_beat(beat)
+        with replica_reads():
+            self.assertEqual(read_database(), 'default')
+        response = self.client.get(reverse('member_list'))
+        self.assertEqual([member.last_name for member in response.context['members']], ['Primary'])
+
+
+class RunSqlTestCase(TestCase):
+    """Test the SQL script splitter and the run_sql command"""
+
+    def _script(self, content):
+        handle, path = tempfile.mkstemp(suffix='.sql')
+        with os.fdopen(handle, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def _statements(self, script, mysql=False):
+        return [(statement.line, statement.sql) for statement in
+                iter_statements(script.splitlines(keepends=True), mysql=mysql)]
+
+    def test_semicolons_in_literals_comments_and_trigger_bodies(self):
+        script = (
+            "-- setup; not a statement\n"
+            "INSERT INTO t VALUES ('a;b', 'it''s; here'); /* one; */\n"
+            "SELECT \"col;umn\" FROM t\n"
+            "  WHERE a = 'multi\n"
+            "line;'\n"
+            ";\n"
+            "CREATE TRIGGER t_insert AFTER INSERT ON t BEGIN\n"
+            "  UPDATE t SET a = CASE WHEN a = ';' THEN 'b' ELSE a END;\n"
+            "  DELETE FROM t WHERE a IS NULL;\n"
+            "END;\n"
+            "SELECT 1"
+        )
+        statements = self._statements(script)
+        self.assertEqual([line for line, sql in statements], [2, 3, 7, 11])
+        self.assertEqual(statements[0][1], "-- setup; not a statement\nINSERT INTO t VALUES ('a;b', 'it''s; here')")
+        self.assertTrue(statements[2][1].endswith('DELETE FROM t WHERE a IS NULL;\nEND'))
+        self.assertEqual(statements[3][1], 'SELECT 1')
+
+    def test_mysql_delimiters_and_escapes(self):
+        script = (
+            "INSERT INTO t VALUES ('a\\';b'); # comment;\n"
+            "DELIMITER $$\n"
+            "CREATE PROCEDURE p() BEGIN SELECT 1; SELECT 2; END$$\n"
+            "DELIMITER ;\n"
+            "SELECT 3;\n"
+        )
+        self.assertEqual([sql for line, sql in self._statements(script, mysql=True)],
+                         ["INSERT INTO t VALUES ('a\\';b')", 'CREATE PROCEDURE p() BEGIN SELECT 1; SELECT 2; END',
+                          'SELECT 3'])
+
+    def test_unterminated_literal_is_reported(self):
+        with self.assertRaisesMessage(SQLScriptError, 'string literal opened on line 2'):
+            self._statements("SELECT 1;\nSELECT 'abc;\n")
+
+    def test_run_commits_batches_and_resumes_after_a_failure(self):
+        path = self._script(
+            "CREATE TABLE run_sql_test (id INTEGER PRIMARY KEY, note TEXT);\n"
+            "INSERT INTO run_sql_test VALUES (1, 'a;b');\n"
+            "INSERT INTO run_sql_test VALUES (2, 'c');\n"
+            "INSERT INTO run_sql_test VALUES (3, 'd');\n"
+            "INSERT INTO run_sql_test VALUES (1, 'duplicate');\n"
+            "INSERT INTO run_sql_test VALUES (4, 'e');\n"
+        )
+
+        def notes():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT note FROM run_sql_test ORDER BY id')
+                return [row[0] for row in cursor.fetchall()]
+
+        out = StringIO()
+        call_command('run_sql', path, dry_run=True, stdout=out)
+        self.assertIn('6 statements would run', out.getvalue())
+        self.assertNotIn('run_sql_test', connection.introspection.table_names())
+
+        with self.assertRaisesMessage(CommandError, 'rerun with --start-at 5'):
+            call_command('run_sql', path, batch_size=2, stdout=StringIO())
+        # Statements 1-4 were committed in two batches, the failed batch was rolled back
+        self.assertEqual(notes(), ['a;b', 'c', 'd'])
+
+        out = StringIO()
+        call_command('run_sql', path, batch_size=2, start_at=6, stdout=out)
+        self.assertEqual(notes(), ['a;b', 'c', 'd', 'e'])
+        self.assertIn('Ran 1 statements', out.getvalue())
+
+
+class MemberImportTestCase(TestCase):
+    """Test the bulk CSV member import command and upload view"""
+
+    HEADER = ('first_name,last_name,birthdate,ssn,medicare_number,phone,address,city,province,postal_code,email,'
+              'location,height,weight,gender,activity,family_first_name,family_last_name,family_birthdate,'
+              'family_ssn,family_medicare_number,family_phone,family_email,relationship_type\n')
+
+    def setUp(self):
+        self.location = Location.objects.create(
+            name='Import Location',
+            type='head',
+            address='1 Import St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            phone='514-555-0700',
+            capacity=6
+        )
+        ClubMember.objects.create(
+            first_name='Existing',
+            last_name='Member',
+            birthdate=date(1990, 1, 1),
+            ssn='700-00-0001',
+            medicare_number='IMPORTM001',
+            phone='514-555-0701',
+            address='1 Import St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            email='existing@test.com',
+            height=170,
+            weight=60,
+            location=self.location,
+            gender='F',
+            minor=False
+        )
+        self.parent = FamilyMember.objects.create(
+            first_name='Existing',
+            last_name='Parent',
+            birthdate=date(1970, 1, 1),
+            ssn='700-00-1001',
+            medicare_number='IMPORTF001',
+            phone='514-555-0702',
+            address='1 Import St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            email='parent@test.com',
+            location=self.location
+        )
+
+    def _row(self, ssn, birthdate='1995-05-05', location='Import Location', height='170', family=''):
+        return (f'Ann,Import,{birthdate},{ssn},M{ssn},514-555-0703,2 Import St,Montreal,Quebec,H1A 1A1,'
+                f'ann@test.com,{location},{height},60,F,yes,{family or ",,,,,,,"}\n')
+
+    def _csv(self):
+        minor = (date.today() - timedelta(days=365 * 14)).isoformat()
+        new_parent = 'Bob,Import,1975-01-01,700-00-1002,F1002,514-555-0704,bob@test.com,father'
+        return self.HEADER + ''.join([
+            self._row('700-00-0002'),
+            self._row('700-00-0003', birthdate=minor, location=str(self.location.pk), family=new_parent),
+            # A sibling links to the family member created by the row above
+            self._row('700-00-0004', birthdate=minor, family=',,,700-00-1002,,,,mother'),
+            self._row('700-00-0005', birthdate=minor, family=',,,700-00-1001,,,,tutor'),
+            self._row('700-00-0001'),
+            self._row('700-00-0002'),
+            self._row('700-00-0006', height='tall'),
+            self._row('700-00-0007', location='Nowhere'),
+            self._row('700-00-0008', family=new_parent),
+            self._row('700-00-0009'),
+            self._row('700-00-0010'),
+        ])
+
+    def _undecodable_csv(self):
+        """Two valid rows, then more rejected ones than one read decodes, then a Latin-1 row"""
+        rows = self.HEADER + self._row('700-00-0002') + self._row('700-00-0003') + self._row('700-00-0001') * 80
+        return rows.encode('utf-8') + self._row('700-00-0004').replace('Ann', 'Anné').encode('latin-1')
+
+    def test_command_imports_valid_rows_and_writes_rejected_ones(self):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as f:
+            f.write(self._csv())
+        self.addCleanup(os.remove, path)
+        self.addCleanup(lambda: os.path.exists(path + '.errors.csv') and os.remove(path + '.errors.csv'))
+
+        out = StringIO()
+        call_command('import_members', path, batch_size=2, stdout=out)
+        self.assertIn('Imported 5 of 11 members, with 1 new family members and 3 family relationships', out.getvalue())
+
+        with open(path + '.errors.csv', newline='') as f:
+            errors = {row['line']: row['errors'] for row in csv.DictReader(f)}
+        self.assertEqual(sorted(errors, key=int), ['6', '7', '8', '9', '10', '12'])
+        self.assertIn('ssn: A club member with this SSN already exists.', errors['6'])
+        self.assertIn('ssn: A club member with this SSN already exists.', errors['7'])
+        self.assertIn('height: ', errors['8'])
+        self.assertIn('No location', errors['9'])
+        self.assertIn('Only the rows of minors', errors['10'])
+        self.assertIn('Import Location is full (6 members)', errors['12'])
+
+        minors = ClubMember.objects.filter(ssn__in=['700-00-0003', '700-00-0004', '700-00-0005'])
+        self.assertTrue(all(member.minor for member in minors))
+        new_parent = FamilyMember.objects.get(ssn='700-00-1002')
+        self.assertEqual((new_parent.address, new_parent.location), ('2 Import St', self.location))
+        self.assertEqual(
+            sorted(FamilyRelationship.objects.values_list('minor__ssn', 'major__ssn', 'relationship_type')),
+            [('700-00-0003', '700-00-1002', 'father'), ('700-00-0004', '700-00-1002', 'mother'),
+             ('700-00-0005', '700-00-1001', 'tutor')]
+        )
+        # bulk_create sends no signals: the counter cache and the summary are refreshed by the import
+        self.location.refresh_from_db()
+        self.assertEqual(self.location.member_count, 6)
+        self.assertEqual(Location.recount_members(fix=False), 0)
+        self.assertEqual(LocationStats.compute([self.location.pk])[self.location.pk],
+                         {field: getattr(self.location.stats, field) for field in LocationStats.TRACKED_FIELDS})
+
+    def test_command_reports_the_rows_committed_before_a_decode_error(self):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'wb') as f:
+            f.write(self._undecodable_csv())
+        self.addCleanup(os.remove, path)
+        self.addCleanup(lambda: os.path.exists(path + '.errors.csv') and os.remove(path + '.errors.csv'))
+
+        with self.assertRaisesRegex(CommandError, r'not UTF-8 encoded after \d+ rows: import stopped after 2 '
+                                                  r'committed members, \d+ rows rejected'):
+            call_command('import_members', path, batch_size=2, stdout=StringIO())
+        self.assertEqual(ClubMember.objects.count(), 3)
+        self.assertTrue(os.path.exists(path + '.errors.csv'))
+
+    def test_missing_columns_are_reported(self):
+        with self.assertRaisesMessage(MemberImportError, 'Missing columns: location'):
+            MemberImporter().run(StringIO(self.HEADER.replace('location,', '') + self._row('700-00-0002')),
+                                 StringIO())
+        self.assertEqual(ClubMember.objects.count(), 1)
+
+    def test_upload_view_lists_rejected_rows(self):
+        upload = SimpleUploadedFile('members.csv', self._csv().encode('utf-8-sig'), content_type='text/csv')
+        response = Client().post(reverse('member_import'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Imported 5 of 11 members')
+        self.assertContains(response, 'Import Location is full (6 members)')
+        self.assertEqual(ClubMember.objects.count(), 6)
+
+        download = Client().get(reverse('member_import_errors', args=[response.context['result']['errors_token']]))
+        self.assertEqual(download['Content-Disposition'], 'attachment; filename="member_import_errors.csv"')
+        rejected = list(csv.DictReader(io.StringIO(b''.join(download.streaming_content).decode('utf-8'))))
+        self.assertEqual(len(rejected), 6)
+        self.assertEqual(Client().get(reverse('member_import_errors', args=[uuid.uuid4()])).status_code, 404)
+
+    def test_upload_view_reports_the_rows_committed_before_a_decode_error(self):
+        upload = SimpleUploadedFile('members.csv', self._undecodable_csv(), content_type='text/csv')
+        with mock.patch('club.views.MemberImporter', partial(MemberImporter, batch_size=2)):
+            response = Client().post(reverse('member_import'), {'file': upload})
+        self.assertContains(response, 'The file is not UTF-8 encoded')
+        result = response.context['result']
+        self.assertTrue(result['stopped'])
+        self.assertEqual(result['counts']['imported'], 2)
+        self.assertContains(response, 'The import stopped after')
+        self.assertEqual(ClubMember.objects.count(), 3)
+        download = Client().get(reverse('member_import_errors', args=[result['errors_token']]))
+        self.assertEqual(download.status_code, 200)
+
+    def test_import_requests_are_not_held_to_the_page_budget(self):
+        upload = SimpleUploadedFile('members.csv', self._csv().encode('utf-8-sig'), content_type='text/csv')
+        with override_settings(DEBUG=True), self.assertNoLogs('club.queries', 'WARNING'):
+            response = Client().post(reverse('member_import'), {'file': upload})
+        self.assertGreater(int(response['X-Query-Count']), 0)
+
+
+class ExportTablesTestCase(TestCase):
+    """Test the chunked, incremental export of the club tables"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.location = Location.objects.create(
+            name='Export Location',
+            type='head',
+            address='1 Export St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            phone='514-555-0800',
+            capacity=100
+        )
+        for i in range(5):
+            self._member(i)
+
+    def _member(self, i):
+        member = ClubMember.objects.create(
+            first_name=f'Export{i}',
+            last_name='Member',
+            birthdate=date(1990, 1, 1),
+            ssn=f'800-00-{i:04d}',
+            medicare_number=f'EXPORTM{i:03d}',
+            phone='514-555-0801',
+            address='1 Export St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            email=f'export{i}@test.com',
+            height=170,
+            weight=60,
+            location=self.location,
+            gender='F',
+            minor=False
+        )
+        Payments.objects.create(
+            member=member,
+            payment_date=date(2024, 1, 15),
+            amount=Decimal('100.50'),
+            payment_method='cash',
+            membership_year=2024
+        )
+        return member
+
+    def _read_csv(self, name):
+        with gzip.open(os.path.join(self.directory, name), 'rt', newline='') as f:
+            return list(csv.DictReader(f))
+
+    def test_csv_export_is_chunked_and_incremental(self):
+        watermarks = os.path.join(self.directory, 'watermarks.json')
+        out = StringIO()
+        call_command('export_tables', self.directory, tables=['ClubMember', 'club_payments'], format='csv',
+                     watermarks=watermarks, chunk_size=2, stdout=out)
+        self.assertIn('Exported 10 rows of 2 tables', out.getvalue())
+        members = self._read_csv('club_clubmember.csv.gz')
+        self.assertEqual([row['first_name'] for row in members], [f'Export{i}' for i in range(5)])
+        self.assertEqual(members[0]['location_id'], str(self.location.pk))
+        self.assertEqual(self._read_csv('club_payments.csv.gz')[0]['amount'], '100.50')
+        with open(watermarks) as f:
+            last = json.load(f)
+        self.assertEqual(last['club_clubmember'], ClubMember.objects.order_by('pk').last().pk)
+
+        new_member = self._member(5)
+        call_command('export_tables', self.directory, tables=['clubmember'], format='csv',
+                     watermarks=watermarks, stdout=StringIO())
+        rows = self._read_csv(f'club_clubmember.after-{last["club_clubmember"]}.csv.gz')
+        self.assertEqual([row['member_id'] for row in rows], [str(new_member.pk)])
+        with open(watermarks) as f:
+            self.assertEqual(json.load(f), {**last, 'club_clubmember': new_member.pk})
+
+    def test_unknown_tables_are_rejected(self):
+        with self.assertRaisesMessage(CommandError, 'Unknown tables: nope'):
+            call_command('export_tables', self.directory, tables=['nope'], format='csv')
+
+    def test_parquet_export_keeps_column_types(self):
+        if exports.pyarrow is None:
+            self.skipTest('pyarrow is not installed')
+
+        result = exports.export_table(Payments, self.directory, 'parquet', chunk_size=2)
+        table = exports.pyarrow.parquet.read_table(result.path)
+        self.assertEqual(table.num_rows, 5)
+        self.assertEqual(str(table.schema.field('amount').type), 'decimal128(10, 2)')
+        self.assertEqual(table.column('payment_date')[0].as_py(), date(2024, 1, 15))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Tests the SQLite FTS5 index')
+class PersonSearchTestCase(TestCase):
+    """Test the full-text person search and the triggers keeping its index in sync"""
+
+    def setUp(self):
+        self.location = Location.objects.create(
+            name='Search Location',
+            type='head',
+            address='1 Search St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            phone='514-555-0900',
+            capacity=100
+        )
+        self.member = self._member(0, 'Léa', 'Tremblay', email='lea@test.com', phone='514-555-0901')
+        self.email_only = self._member(1, 'Noah', 'Smith', email='tremblay.fan@test.com', phone='438-555-0902')
+        self.parent = FamilyMember.objects.create(
+            first_name='Marc',
+            last_name='Tremblay',
+            birthdate=date(1970, 1, 1),
+            ssn='900-00-1000',
+            medicare_number='SEARCHF000',
+            phone='514-555-0903',
+            address='1 Search St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H2X 1Y4',
+            email='marc@test.com',
+            location=self.location
+        )
+        self.coach = Personnel.objects.create(
+            first_name='Tremaine',
+            last_name='Roy',
+            birthdate=date(1980, 1, 1),
+            ssn='900-00-2000',
+            medicare_number='SEARCHP000',
+            phone='514-555-0904',
+            address='1 Search St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            email='coach@test.com'
+        )
+
+    def _member(self, i, first_name, last_name, email, phone):
+        return ClubMember.objects.create(
+            first_name=first_name,
+            last_name=last_name,
+            birthdate=date(1990, 1, 1),
+            ssn=f'900-00-{i:04d}',
+            medicare_number=f'SEARCHM{i:03d}',
+            phone=phone,
+            address='1 Search St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            email=email,
+            height=170,
+            weight=60,
+            location=self.location,
+            gender='F',
+            minor=False
+        )
+
+    def _found(self, query, **kwargs):
+        return [(result['kind'], result['id']) for result in search_people(query, **kwargs)]
+
+    def test_ranked_prefix_matching(self):
+        found = self._found('tre')
+        self.assertEqual(set(found), {
+            ('member', self.member.pk), ('member', self.email_only.pk),
+            ('family', self.parent.pk), ('personnel', self.coach.pk),
+        })
+        # A name match ranks above a match in the email only
+        self.assertEqual(found[-1], ('member', self.email_only.pk))
+        self.assertEqual(self._found('lea TREMB'), [('member', self.member.pk)])
+        self.assertEqual(self._found('5145550901'), [('member', self.member.pk)])
+        self.assertEqual(self._found('514-555-0903'), [('family', self.parent.pk)])
+        self.assertEqual(self._found('h2x 1y'), [('family', self.parent.pk)])
+        self.assertEqual(self._found('tre', kinds=['personnel', 'family']),
+                         [('family', self.parent.pk), ('personnel', self.coach.pk)])
+        self.assertEqual(self._found('"or" -'), [])
+
+    def test_index_follows_writes(self):
+        self.member.last_name = 'Gagnon'
+        self.member.save()
+        self.assertEqual(self._found('gagnon'), [('member', self.member.pk)])
+        self.assertNotIn(('member', self.member.pk), self._found('tremblay'))
+        self.coach.delete()
+        self.assertEqual(self._found('tremaine'), [])
+        # The triggers also see bulk inserts, which send no signals
+        FamilyMember.objects.bulk_create([FamilyMember(
+            first_name='Bulk', last_name='Parent', birthdate=date(1970, 1, 1), ssn='900-00-3000',
+            medicare_number='SEARCHF001', phone='514-555-0905', address='1 Search St', city='Montreal',
+            province='Quebec', postal_code='H1A 1A1', email='bulk@test.com', location=self.location,
+        )])
+        self.assertEqual(self._found('bulk par'), [('family', FamilyMember.objects.get(first_name='Bulk').pk)])
+
+    @skipUnless(connection.vendor == 'sqlite', 'Only the SQLite search limits the matches it ranks')
+    def test_only_short_queries_limit_the_ranked_matches(self):
+        with mock.patch('club.search.RANKED_CANDIDATES', 2):
+            self.assertEqual(len(self._found('tr')), 2)
+            self.assertEqual(len(self._found('tre')), 4)
+            self.assertEqual(self._found('tre')[-1], ('member', self.email_only.pk))
+
+    def test_search_endpoint(self):
+        client = Client()
+        response = client.get(reverse('person_search'), {'q': 'marc', 'kind': 'family'})
+        self.assertEqual(response.status_code, 200)
+        [result] = response.json()['results']
+        self.assertEqual((result['kind'], result['id'], result['last_name']), ('family', self.parent.pk, 'Tremblay'))
+        self.assertEqual(result['url'], reverse('family_member_detail', args=[self.parent.pk]))
+        self.assertEqual(len(client.get(reverse('person_search'), {'q': 'tre', 'page_size': 2}).json()['results']), 2)
+        self.assertEqual(client.get(reverse('person_search'), {'q': 'tre', 'kind': 'coach'}).status_code, 400)
+
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Only the SQLite index is kept in sync by triggers')
+class PersonSearchTableRebuildTestCase(TransactionTestCase):
+    """Test that the search triggers come back after the SQLite schema editor rebuilds a table, outside of a
+    transaction as the schema editor needs"""
+
+    def _member(self, i, last_name):
+        return ClubMember.objects.create(
+            first_name='Rebuild', last_name=last_name, birthdate=date(1990, 1, 1), ssn=f'910-00-{i:04d}',
+            medicare_number=f'REBUILD{i:03d}', phone=f'514-555-{i:04d}', address='1 Rebuild St', city='Montreal',
+            province='Quebec', postal_code='H1A 1A1', email=f'rebuild{i}@test.com', height=170, weight=60,
+            location=self.location, gender='F', minor=False
+        )
+
+    def _triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'club_clubmember'"
+            )
+            return dict(cursor.fetchall())
+
+    def _alter_first_name(self, max_length):
+        old_field = ClubMember._meta.get_field('first_name')
+        new_field = old_field.clone()
+        new_field.max_length = max_length
+        new_field.set_attributes_from_name('first_name')
+        new_field.model = ClubMember
+        with connection.schema_editor() as editor:
+            editor.alter_field(ClubMember, old_field, new_field)
+
+    def test_altering_a_field_keeps_the_search_in_sync(self):
+        self.location = Location.objects.create(name='Rebuild', type='head', address='1 Rebuild St', city='Montreal',
+                                                province='Quebec', postal_code='H1A 1A1', phone='514-555-0100',
+                                                capacity=10)
+        member = self._member(1, 'Tremblay')
+        triggers = self._triggers()
+        max_length = ClubMember._meta.get_field('first_name').max_length
+        self._alter_first_name(max_length + 20)
+        try:
+            self.assertEqual(self._triggers(), {})
+            # Written while the triggers are missing, so only the reindex sees it
+            member.last_name = 'Gagnon'
+            member.save()
+            call_command('migrate', verbosity=0)
+            # The same triggers as migration 0011 created
+            self.assertEqual(self._triggers(), triggers)
+            self.assertEqual([result['id'] for result in search_people('gagnon')], [member.pk])
+            self.assertEqual(search_people('tremblay'), [])
+            added = self._member(2, 'Gauthier')
+            self.assertEqual([result['id'] for result in search_people('ga')], [member.pk, added.pk])
+        finally:
+            self._alter_first_name(max_length)
+            call_command('migrate', verbosity=0)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'The member and coach sources use the SQLite FTS5 index')
+class AutocompleteTestCase(TestCase):
+    """Test the autocomplete endpoint and the AutocompleteSelect widgets of the team formation forms"""
+
+    def setUp(self):
+        self.location = Location.objects.create(
+            name='Verdun Arena',
+            type='head',
+            address='1 Arena St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            phone='514-555-0950',
+            capacity=100
+        )
+        self.other_location = Location.objects.create(
+            name='verdun annex',
+            type='branch',
+            address='2 Arena St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            phone='514-555-0951',
+            capacity=100
+        )
+        self.active = self._member(0, 'Alice', activity=True)
+        self.inactive = self._member(1, 'Alicia', activity=False)
+        self.coach = self._personnel(0, 'Alain', role='coach')
+        self.treasurer = self._personnel(1, 'Albert', role='treasurer')
+        self.session = Sessions.objects.create(
+            session_type='game',
+            session_date=date(2031, 6, 14),
+            session_time='18:30',
+            address='1 Arena St',
+            status='scheduled'
+        )
+        self.past_session = Sessions.objects.create(
+            session_type='training',
+            session_date=date(2020, 6, 14),
+            session_time='18:30',
+            address='1 Arena St',
+            status='completed'
+        )
+
+    def _member(self, i, first_name, activity):
+        return ClubMember.objects.create(
+            first_name=first_name,
+            last_name='Lavoie',
+            birthdate=date(1990, 1, 1),
+            ssn=f'950-00-{i:04d}',
+            medicare_number=f'AUTOM{i:03d}',
+            phone='514-555-0952',
+            address='1 Arena St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            email=f'member{i}@test.com',
+            height=170,
+            weight=60,
+            location=self.location,
+            gender='F',
+            activity=activity,
+            minor=False
+        )
+
+    def _personnel(self, i, first_name, role):
+        personnel = Personnel.objects.create(
+            first_name=first_name,
+            last_name='Gagnon',
+            birthdate=date(1980, 1, 1),
+            ssn=f'950-10-{i:04d}',
+            medicare_number=f'AUTOP{i:03d}',
+            phone='514-555-0953',
+            address='1 Arena St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            email=f'personnel{i}@test.com'
+        )
+        PersonnelAssignment.objects.create(
+            personnel=personnel,
+            location=self.location,
+            assignment_id=1,
+            role=role,
+            mandate='volunteer',
+            start_date=date(2020, 1, 1)
+        )
+        return personnel
+
+    def _ids(self, source, q=None, **params):
+        response = Client().get(reverse('autocomplete', args=[source]), {'q': q or '', **params})
+        self.assertEqual(response.status_code, 200)
+        return [result['id'] for result in response.json()['results']]
+
+    def test_sources(self):
+        self.assertEqual(self._ids('members', 'ali'), [self.active.pk])
+        self.assertEqual(self._ids('coaches', 'al gag'), [self.coach.pk])
+        # Location names match case-insensitively, in alphabetical order
+        self.assertEqual(self._ids('locations', 'VERDUN'), [self.other_location.pk, self.location.pk])
+        self.assertEqual(self._ids('locations', 'verdun an'), [self.other_location.pk])
+        self.assertEqual(self._ids('locations', 'verdun', page_size=1), [self.other_location.pk])
+        # The prefix is matched literally, LIKE wildcards included
+        self.assertEqual(self._ids('locations', 'verdun%'), [])
+        self.assertEqual(self._ids('sessions', '2031-06'), [self.session.pk])
+        self.assertEqual(self._ids('sessions', '2020'), [self.past_session.pk])
+        self.assertEqual(self._ids('sessions', '2031-02-30'), [])
+        # Without a date, only upcoming sessions
+        self.assertEqual(self._ids('sessions'), [self.session.pk])
+        self.assertEqual(self._ids('sessions', 'train'), [])
+        response = Client().get(reverse('autocomplete', args=['members']), {'q': 'ali'})
+        self.assertEqual(response.json()['results'], [{'id': self.active.pk, 'text': str(self.active)}])
+        self.assertEqual(Client().get(reverse('autocomplete', args=['payments'])).status_code, 404)
+
+    def test_widgets_render_only_the_selected_option(self):
+        with self.assertNumQueries(0):
+            html = SessionTeamsForm().as_p()
+        self.assertNotIn(str(self.location), html)
+        self.assertIn(f'data-autocomplete-url="{reverse("autocomplete", args=["coaches"])}"', html)
+        self.assertIn('club/autocomplete.js', str(SessionTeamsForm().media))
+
+        with self.assertNumQueries(1):
+            html = PlayerAssignmentForm(initial={'member': self.active.pk}).as_p()
+        self.assertIn(f'<option value="{self.active.pk}" selected>{self.active}</option>', html)
+        self.assertNotIn(str(self.inactive), html)
+
+    def test_validation_checks_the_submitted_id(self):
+        # The field's lookup of the id, then the model's foreign key check
+        with self.assertNumQueries(2):
+            self.assertTrue(PlayerAssignmentForm({'member': self.active.pk, 'position': 'Setter'}).is_valid())
+        form = PlayerAssignmentForm({'member': self.inactive.pk, 'position': 'Setter'})
+        self.assertIn('member', form.errors)
+        form = SessionTeamsForm({
+            'session': self.session.pk, 'team_name': 'Blue', 'location': self.location.pk,
+            'head_coach': self.treasurer.pk, 'team_number': 1, 'gender': 'F',
+        })
+        self.assertEqual(list(form.errors), ['head_coach'])
+        # A rejected value is rendered back without failing
+        self.assertIn('name="member"', PlayerAssignmentForm({'member': 'abc', 'position': 'Setter'}).as_p())
@@ -1,7 +1,8 @@
 from django.urls import path
 
 from .views import (
-    main_interface, location_report, create_member, inactive_members_report, member_list,
+    main_interface, location_report, create_member, member_import, member_import_errors, inactive_members_report,
+    member_list, person_search, autocomplete,
     personnel_list, personnel_create, personnel_detail, personnel_edit, personnel_delete,
     family_member_list, family_member_create, family_member_detail, family_member_edit, family_member_delete,
     secondary_family_member_create, secondary_family_member_edit, secondary_family_member_delete,
@@ -13,9 +14,13 @@ from .views import (
 urlpatterns = [
     path('', main_interface, name='main_interface'),
     path('create_member/', create_member, name='create_member'),
+    path('import_members/', member_import, name='member_import'),
+    path('import_members/errors/<uuid:token>/', member_import_errors, name='member_import_errors'),
     path('inactive_members_report/', inactive_members_report, name='inactive_members_report'),
     path('member_list/', member_list, name='member_list'),
     path('location_report/', location_report, name='location_report'),
+    path('search/', person_search, name='person_search'),
+    path('autocomplete/<str:source>/', autocomplete, name='autocomplete'),
 
     # Personnel URLs
     path('personnel/', personnel_list, name='personnel_list'),
@@ -1,21 +1,57 @@
+import csv
+import io
+import os
+import tempfile
+import time
+import uuid
 from datetime import date, timedelta
+from itertools import islice
 
 from django import forms
 from django.contrib import messages
+from django.db.models import Prefetch
+from django.http import FileResponse, Http404, JsonResponse, HttpResponseBadRequest
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.utils import timezone
 
-from .forms import ClubMemberForm, PersonnelForm, FamilyMemberForm, SecondaryFamilyMemberForm, SessionTeamsForm, PlayerAssignmentForm
-from .models import Location, ClubMember, Personnel, FamilyMember, SecondaryFamilyMember, SessionTeams, PlayerAssignment
+from .autocomplete import AUTOCOMPLETE_PAGE_SIZE, SOURCES as AUTOCOMPLETE_SOURCES, autocomplete as autocomplete_choices
+from .forms import MemberImportForm, ClubMemberForm, PersonnelForm, FamilyMemberForm, SecondaryFamilyMemberForm, SessionTeamsForm, PlayerAssignmentForm
+from .imports import MemberImporter, MemberImportError
+from .models import (
+    Location, ClubMember, Personnel, FamilyMember, SecondaryFamilyMember, SessionTeams, PlayerAssignment,
+    Payments, FamilyRelationship, MemberHobbies
+)
+from .pagination import InvalidCursor, keyset_page, page_size_from
+from .querycount import query_budget
+from .routers import use_replica
+from .search import KINDS as SEARCH_KINDS, search_people
+
+CLUB_MEMBER_KEYSET = ('last_name', 'first_name', 'member_id')
+# Detail page of each kind of person search result
+SEARCH_RESULT_VIEWS = {
+    'member': 'club_member_detail',
+    'family': 'family_member_detail',
+    'personnel': 'personnel_detail',
+}
+SEARCH_PAGE_SIZE = 20
+# Rejected rows listed on the page after an import; all of them are in the downloadable error file
+IMPORT_ERRORS_SHOWN = 100
+# Error files of the imports run by member_import, served by member_import_errors until they are a day old
+IMPORT_ERRORS_DIR = os.path.join(tempfile.gettempdir(), 'club_member_import_errors')
+IMPORT_ERRORS_MAX_AGE = 24 * 3600
 
 
 # Personnel CRUD Views
+@query_budget(1)
+@use_replica
 def personnel_list(request):
-    personnel = Personnel.objects.all().order_by('last_name', 'first_name')
+    personnel = Personnel.objects.with_current_assignment().order_by('last_name', 'first_name')
     context = {'personnel_list': personnel}
     return render(request, 'personnel_list.html', context)
 
 
+@query_budget(0)
 def personnel_create(request):
     if request.method == 'POST':
         form = PersonnelForm(request.POST)
@@ -28,11 +64,13 @@ def personnel_create(request):
     return render(request, 'personnel_form.html', {'form': form, 'action': 'Create'})
 
 
+@query_budget(1)
 def personnel_detail(request, pk):
-    personnel = get_object_or_404(Personnel, pk=pk)
+    personnel = get_object_or_404(Personnel.objects.with_current_assignment(), pk=pk)
     return render(request, 'personnel_detail.html', {'personnel': personnel})
 
 
+@query_budget(1)
 def personnel_edit(request, pk):
     personnel = get_object_or_404(Personnel, pk=pk)
     if request.method == 'POST':
@@ -46,6 +84,7 @@ def personnel_edit(request, pk):
     return render(request, 'personnel_form.html', {'form': form, 'action': 'Edit', 'personnel': personnel})
 
 
+@query_budget(1)
 def personnel_delete(request, pk):
     personnel = get_object_or_404(Personnel, pk=pk)
     if request.method == 'POST':
@@ -56,12 +95,15 @@ def personnel_delete(request, pk):
 
 
 # Family Member CRUD Views
+@query_budget(1)
+@use_replica
 def family_member_list(request):
     family_members = FamilyMember.objects.all().order_by('last_name', 'first_name')
     context = {'family_members': family_members}
     return render(request, 'family_member_list.html', context)
 
 
+@query_budget(1)
 def family_member_create(request):
     if request.method == 'POST':
         form = FamilyMemberForm(request.POST)
@@ -86,6 +128,7 @@ def family_member_detail(request, pk):
     return render(request, 'family_member_detail.html', context)
 
 
+@query_budget(2)
 def family_member_edit(request, pk):
     family_member = get_object_or_404(FamilyMember, pk=pk)
     if request.method == 'POST':
@@ -99,6 +142,7 @@ def family_member_edit(request, pk):
     return render(request, 'family_member_form.html', {'form': form, 'action': 'Edit', 'family_member': family_member})
 
 
+@query_budget(1)
 def family_member_delete(request, pk):
     family_member = get_object_or_404(FamilyMember, pk=pk)
     if request.method == 'POST':
@@ -152,35 +196,103 @@ def secondary_family_member_delete(request, pk):
 
 
 # Club Member CRUD Views (Enhanced)
+def _club_member_page(request):
+    """
+    Fetch one keyset page of club members ordered by (last_name, first_name, member_id).
+    Supports ?location=<id>, ?activity=true|false, ?page_size=<n> and ?cursor=<opaque cursor>.
+    """
+    members = ClubMember.objects.select_related('location')
+    location = request.GET.get('location')
+    if location and location.isdigit():
+        members = members.filter(location_id=int(location))
+    activity = request.GET.get('activity', '').lower()
+    if activity in ('1', 'true', 'yes'):
+        members = members.filter(activity=True)
+    elif activity in ('0', 'false', 'no'):
+        members = members.filter(activity=False)
+    return keyset_page(members, CLUB_MEMBER_KEYSET, request.GET.get('cursor'), page_size_from(request))
+
+
+def _club_member_json(members, next_cursor):
+    return JsonResponse({
+        'results': [
+            {
+                'member_id': member.member_id,
+                'first_name': member.first_name,
+                'last_name': member.last_name,
+                'email': member.email,
+                'location_id': member.location_id,
+                'location': member.location.name,
+                'activity': member.activity,
+            }
+            for member in members
+        ],
+        'next_cursor': next_cursor,
+    })
+
+
+def _page_query(request, cursor=None):
+    """Query string for the page starting after cursor, keeping the current filters"""
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    if cursor:
+        params['cursor'] = cursor
+    return params.urlencode()
+
+
+@query_budget(2)
+@use_replica
 def club_member_list(request):
-    members = ClubMember.objects.all().order_by('last_name', 'first_name')
-    context = {'club_members': members}
+    try:
+        members, next_cursor = _club_member_page(request)
+    except InvalidCursor as e:
+        return HttpResponseBadRequest(str(e))
+    if request.GET.get('format') == 'json':
+        return _club_member_json(members, next_cursor)
+    context = {
+        'club_members': members,
+        'next_page_query': _page_query(request, next_cursor) if next_cursor else None,
+        'first_page_query': _page_query(request),
+        'locations': Location.objects.order_by('name'),
+    }
     return render(request, 'club_member_list.html', context)
 
 
+@query_budget(5)
 def club_member_detail(request, pk):
-    member = get_object_or_404(ClubMember, pk=pk)
-    payments = member.payments_set.all().order_by('-payment_date')
-    family_associations = member.familyrelationship_set.all()
-    team_assignments = member.playerassignment_set.all()
-
-    # Calculate age and status
-    today = date.today()
-    age = today.year - member.birthdate.year - (
-            (today.month, today.day) < (member.birthdate.month, member.birthdate.day))
-    is_minor = age < 18
+    """
+    Member page loaded in a fixed number of queries however long the member's history is:
+    the member with its location, then one prefetch each for payments, family relationships,
+    team assignments and hobbies.
+    """
+    member = get_object_or_404(
+        ClubMember.objects.select_related('location').prefetch_related(
+            Prefetch('payments_set', queryset=Payments.objects.order_by('-payment_date'), to_attr='payment_history'),
+            Prefetch('familyrelationship_set', queryset=FamilyRelationship.objects.select_related('major'),
+                     to_attr='family_relationships'),
+            Prefetch('playerassignment_set',
+                     queryset=PlayerAssignment.objects.select_related('team__session').order_by(
+                         '-team__session__session_date', '-team__session__session_time'),
+                     to_attr='team_assignments'),
+            Prefetch('memberhobbies_set', queryset=MemberHobbies.objects.select_related('hobby'),
+                     to_attr='member_hobbies'),
+        ),
+        pk=pk,
+    )
 
     context = {
         'member': member,
-        'payments': payments,
-        'family_associations': family_associations,
-        'team_assignments': team_assignments,
-        'age': age,
-        'is_minor': is_minor
+        'payments': member.payment_history,
+        'family_associations': member.family_relationships,
+        'team_assignments': member.team_assignments,
+        'hobbies': [member_hobby.hobby for member_hobby in member.member_hobbies],
+        'age': member.age,
+        'is_minor': member.is_minor
     }
     return render(request, 'club_member_detail.html', context)
 
 
+@query_budget(2)
 def club_member_edit(request, pk):
     member = get_object_or_404(ClubMember, pk=pk)
     if request.method == 'POST':
@@ -194,6 +306,7 @@ def club_member_edit(request, pk):
     return render(request, 'club_member_form.html', {'form': form, 'action': 'Edit', 'member': member})
 
 
+@query_budget(1)
 def club_member_delete(request, pk):
     member = get_object_or_404(ClubMember, pk=pk)
     if request.method == 'POST':
@@ -203,6 +316,7 @@ def club_member_delete(request, pk):
     return render(request, 'club_member_confirm_delete.html', {'member': member})
 
 
+@query_budget(1)
 def create_member(request):
     if request.method == 'POST':
         form = ClubMemberForm(request.POST)
@@ -215,6 +329,72 @@ def create_member(request):
     return render(request, 'member_creation.html', {'form': form})
 
 
+def _import_errors_path(token):
+    return os.path.join(IMPORT_ERRORS_DIR, f'{token.hex}.csv')
+
+
+def _remove_old_import_errors():
+    cutoff = time.time() - IMPORT_ERRORS_MAX_AGE
+    for entry in os.scandir(IMPORT_ERRORS_DIR):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except FileNotFoundError:  # Removed by another request
+            pass
+
+
+# An import's queries grow with the number of rows uploaded
+@query_budget(0, post=None)
+def member_import(request):
+    result = None
+    if request.method == 'POST':
+        form = MemberImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            os.makedirs(IMPORT_ERRORS_DIR, exist_ok=True)
+            _remove_old_import_errors()
+            token = uuid.uuid4()
+            errors_path = _import_errors_path(token)
+            rows = io.TextIOWrapper(form.cleaned_data['file'], encoding='utf-8-sig', newline='')
+            importer = MemberImporter()
+            counts = None
+            stopped = False
+            # The rejected rows are written to a file rather than kept in memory, they can be most of the upload
+            with open(errors_path, 'w', encoding='utf-8', newline='') as errors:
+                try:
+                    counts = importer.run(rows, errors)
+                except MemberImportError as e:
+                    form.add_error('file', str(e))
+                except UnicodeDecodeError:
+                    form.add_error('file', 'The file is not UTF-8 encoded')
+                    # The batches before the undecodable line are committed, which the result must tell
+                    if importer.counts['rows']:
+                        counts, stopped = importer.counts, True
+            if counts is not None and counts['rejected']:
+                with open(errors_path, encoding='utf-8', newline='') as errors:
+                    rejected_rows = list(islice(csv.DictReader(errors), IMPORT_ERRORS_SHOWN))
+                result = {'counts': counts, 'rejected_rows': rejected_rows, 'errors_token': token, 'stopped': stopped}
+            else:
+                os.remove(errors_path)
+                if counts is not None:
+                    result = {'counts': counts, 'rejected_rows': [], 'errors_token': None, 'stopped': stopped}
+    else:
+        form = MemberImportForm()
+
+    return render(request, 'member_import.html', {'form': form, 'result': result})
+
+
+@query_budget(0)
+def member_import_errors(request, token):
+    """The rejected rows of an import run by member_import, as a CSV file"""
+    try:
+        errors = open(_import_errors_path(token), 'rb')
+    except FileNotFoundError:
+        raise Http404('The rejected rows of this import are no longer available')
+    return FileResponse(errors, as_attachment=True, filename='member_import_errors.csv',
+                        content_type='text/csv; charset=utf-8')
+
+
+@use_replica
 def inactive_members_report(request):
     # Query inactive members who meet the criteria
     inactive_members = ClubMember.objects.filter(
@@ -231,34 +411,73 @@ def inactive_members_report(request):
     return render(request, 'inactive_members_report.html', context)
 
 
+@query_budget(1)
+@use_replica
 def location_report(request):
-    locations = Location.objects.all().order_by('name')
+    locations = Location.objects.select_related('stats').order_by('name')
     context = {
         'location_data': locations
     }
     return render(request, 'main_interface.html', context)
 
 
+@query_budget(0)
 def main_interface(request):
     return render(request, 'main_interface.html')
 
 
+@query_budget(1)
+@use_replica
 def member_list(request):
-    members = ClubMember.objects.all().order_by('last_name', 'first_name')
+    try:
+        members, next_cursor = _club_member_page(request)
+    except InvalidCursor as e:
+        return HttpResponseBadRequest(str(e))
+    if request.GET.get('format') == 'json':
+        return _club_member_json(members, next_cursor)
     context = {
-        'members': members
+        'members': members,
+        'next_page_query': _page_query(request, next_cursor) if next_cursor else None,
     }
     return render(request, 'main_interface.html', context)
 
 
+@query_budget(1)
+@use_replica
+def person_search(request):
+    """Ranked prefix search over members, family members and personnel: ?q=tre 514&kind=member&page_size=20"""
+    kinds = request.GET.getlist('kind')
+    unknown = [kind for kind in kinds if kind not in SEARCH_KINDS]
+    if unknown:
+        return HttpResponseBadRequest(f'Unknown kind {unknown[0]!r}, use one of: {", ".join(SEARCH_KINDS)}')
+    results = search_people(request.GET.get('q'), kinds=kinds, limit=page_size_from(request, SEARCH_PAGE_SIZE))
+    for result in results:
+        result['url'] = reverse(SEARCH_RESULT_VIEWS[result['kind']], args=[result['id']])
+    return JsonResponse({'results': results})
+
+
+@query_budget(2)
+@use_replica
+def autocomplete(request, source):
+    """Options of the AutocompleteSelect widgets matching what was typed: ?q=2025-06&page_size=20"""
+    if source not in AUTOCOMPLETE_SOURCES:
+        raise Http404(f'No autocomplete source {source!r}')
+    results = autocomplete_choices(source, request.GET.get('q'), page_size_from(request, AUTOCOMPLETE_PAGE_SIZE))
+    return JsonResponse({'results': results})
+
+
 # Team Formation Views
+@query_budget(1)
+@use_replica
 def team_formation_list(request):
     """View all team formations"""
-    formations = SessionTeams.objects.all().order_by('-session__session_date', '-session__session_time')
+    formations = SessionTeams.objects.select_related('session', 'location', 'head_coach').order_by(
+        '-session__session_date', '-session__session_time')
     context = {'formations': formations}
     return render(request, 'team_formation_list.html', context)
 
 
+@query_budget(0)
 def team_formation_create(request):
     """Create a new team formation"""
     if request.method == 'POST':
@@ -272,9 +491,10 @@ def team_formation_create(request):
     return render(request, 'team_formation_form.html', {'form': form, 'action': 'Create'})
 
 
+@query_budget(2)
 def team_formation_detail(request, pk):
     """View team formation details with players"""
-    formation = get_object_or_404(SessionTeams, pk=pk)
+    formation = get_object_or_404(SessionTeams.objects.select_related('session', 'location', 'head_coach'), pk=pk)
     players = PlayerAssignment.objects.filter(team=formation).select_related('member')
     context = {
         'formation': formation,
@@ -283,6 +503,8 @@ def team_formation_detail(request, pk):
     return render(request, 'team_formation_detail.html', context)
 
 
+# The formation, then the selected location, session and head coach of its form
+@query_budget(4)
 def team_formation_edit(request, pk):
     """Edit a team formation"""
     formation = get_object_or_404(SessionTeams, pk=pk)
@@ -297,6 +519,7 @@ def team_formation_edit(request, pk):
     return render(request, 'team_formation_form.html', {'form': form, 'action': 'Edit', 'formation': formation})
 
 
+@query_budget(3)
 def team_formation_delete(request, pk):
     """Delete a team formation"""
     formation = get_object_or_404(SessionTeams, pk=pk)
@@ -307,9 +530,10 @@ def team_formation_delete(request, pk):
     return render(request, 'team_formation_confirm_delete.html', {'formation': formation})
 
 
+@query_budget(1)
 def player_assignment_create(request, formation_pk):
     """Add a player to a team formation"""
-    formation = get_object_or_404(SessionTeams, pk=formation_pk)
+    formation = get_object_or_404(SessionTeams.objects.select_related('session'), pk=formation_pk)
     if request.method == 'POST':
         form = PlayerAssignmentForm(request.POST)
         if form.is_valid():
@@ -328,9 +552,10 @@ def player_assignment_create(request, formation_pk):
     return render(request, 'player_assignment_form.html', context)
 
 
+@query_budget(1)
 def player_assignment_delete(request, pk):
     """Remove a player from a team formation"""
-    assignment = get_object_or_404(PlayerAssignment, pk=pk)
+    assignment = get_object_or_404(PlayerAssignment.objects.select_related('member', 'team__session'), pk=pk)
     formation_pk = assignment.team.pk
     if request.method == 'POST':
         player_name = f'{assignment.member.first_name} {assignment.member.last_name}'
@@ -340,10 +565,6 @@ def player_assignment_delete(request, pk):
     return render(request, 'player_assignment_confirm_delete.html', {'assignment': assignment})
 
 
-# Legacy aliases for backwards compatibility
-def team_create(request):
-    return team_formation_create(request)
-
-
-def team_view(request):
-    return team_formation_list(request)
+# Legacy aliases for backwards compatibility, sharing the query budgets and replica reads of the views they name
+team_create = team_formation_create
+team_view = team_formation_list
@@ -0,0 +1,40 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+
+
+class AutocompleteSelect(forms.Select):
+    """
+    Select of a ModelChoiceField rendering only the empty option and the selected one, read with one query by
+    primary key; club/autocomplete.js loads the other options from the autocomplete endpoint of source as the
+    user types. Rendering the form therefore costs the same whatever the size of the table.
+    """
+
+    class Media:
+        js = ['club/autocomplete.js']
+
+    def __init__(self, source, attrs=None):
+        super().__init__(attrs)
+        self.source = source
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['data-autocomplete-url'] = reverse('autocomplete', args=[self.source])
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        field = self.choices.field
+        selected = [pk for pk in value if pk not in ('', None)]
+        objects = []
+        if selected:
+            try:
+                objects = list(self.choices.queryset.filter(pk__in=selected))
+            except (ValueError, ValidationError):
+                # A submitted value that is not a primary key, reported by the field's validation
+                objects = []
+        choices = [('', field.empty_label)] if field.empty_label is not None else []
+        choices.extend(self.choices.choice(obj) for obj in objects)
+        return [
+            (None, [self.create_option(name, option_value, label, option_value != '' or not objects, index)], index)
+            for index, (option_value, label) in enumerate(choices)
+        ]
@@ -45,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Counts SQL queries per request and logs N+1 patterns; disables itself when DEBUG is off
+    'club.querycount.QueryCountMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,7 +84,8 @@ DATABASES = {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
 
-        # 'ENGINE': 'django.db.backends.mysql',
+        # Pooled MySQL connections (club/backends/mysql_pool), or 'django.db.backends.mysql' without pooling
+        # 'ENGINE': 'club.backends.mysql_pool',
         # 'HOST': 'itc353.encs.concordia.ca',
         # 'USER': 'itc353_1',
         # 'PASSWORD': 'ddkr25!!',
@@ -91,10 +94,24 @@ DATABASES = {
         # 'OPTIONS': {
         #     'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
         #     'charset': 'utf8mb4',
+        #     'pool': {'max_size': 10, 'timeout': 30, 'max_idle': 300, 'max_lifetime': 3600},
         # },
-    }
+        # Connections go back to the pool at the end of each request
+        # 'CONN_MAX_AGE': 0,
+    },
+    # Read replica of 'default' for the report and list views (club/routers.py), same settings with its own HOST
+    # 'replica': {
+    #     'ENGINE': 'club.backends.mysql_pool',
+    #     'HOST': 'replica.example.com',
+    #     ...
+    # },
 }
 
+DATABASE_ROUTERS = ['club.routers.ReplicaRouter']
+
+# Seconds the replica may lag behind the primary before its reads go back to the primary
+REPLICA_MAX_LAG = 10
+
 
 
 
@@ -138,3 +155,9 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Seconds a report result stays cached; saves and deletes invalidate dependent results earlier (queries_asked/cache.py)
+REPORT_CACHE_TIMEOUT = 600
+
+# WAL journal and tuned PRAGMAs on every SQLite connection (see club/sqlite.py); a dict overrides single PRAGMAs
+SQLITE_PERFORMANCE_PROFILE = False
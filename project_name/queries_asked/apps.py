@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class QueriesAskedConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'queries_asked'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,93 @@
+"""
+Result cache for the report queries.
+
+A result is stored under a key made of the query number, its parameters and the current version of every
+table the query reads. Saving or deleting a row of one of those tables gives the table a new version (see
+signals.py), so only the results that depend on it stop being found. Bulk updates and raw SQL bypass the
+signals: call invalidate_tables() after them, REPORT_CACHE_TIMEOUT bounds how stale a result can get otherwise.
+
+A new version is only given once the write commits. Until then, other requests read the data as it was
+before the write. If the version changed earlier, the results they computed would be cached under the new
+version and served after the commit.
+"""
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+KEY_PREFIX = 'report'
+COUNTERS = ('hits', 'misses')
+
+
+def _version_key(table):
+    return f'{KEY_PREFIX}:version:{table}'
+
+
+def _counter_key(name):
+    return f'{KEY_PREFIX}:stats:{name}'
+
+
+def table_versions(tables):
+    """Current version of each table; tables never seen before get a fresh one"""
+    keys = [_version_key(table) for table in tables]
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def invalidate_tables(tables, using=DEFAULT_DB_ALIAS):
+    """
+    Drop every cached result that reads any of the given tables, when the current transaction of the database
+    using commits; immediately outside a transaction
+    """
+    tables = list(tables)
+    transaction.on_commit(
+        lambda: cache.set_many({_version_key(table): uuid.uuid4().hex for table in tables}, None), using=using
+    )
+
+
+def result_key(query_number, params, tables):
+    tables = sorted(tables)
+    fingerprint = json.dumps([params, tables, table_versions(tables)], default=str, sort_keys=True)
+    return f'{KEY_PREFIX}:{query_number}:{hashlib.sha1(fingerprint.encode()).hexdigest()}'
+
+
+def _count(name):
+    key = _counter_key(name)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:  # Evicted between add() and incr()
+        cache.set(key, 1, None)
+
+
+def cached_report(query_number, params, tables, run):
+    """Return the cached result of run() for this query and parameters, running and storing it on a miss"""
+    key = result_key(query_number, params, tables)
+    result = cache.get(key)
+    if result is not None:
+        _count('hits')
+        return result
+    _count('misses')
+    result = run()
+    cache.set(key, result, settings.REPORT_CACHE_TIMEOUT)
+    return result
+
+
+def cache_stats():
+    """Hit and miss counters shared by every process using the same cache backend"""
+    counts = cache.get_many([_counter_key(name) for name in COUNTERS])
+    stats = {name: counts.get(_counter_key(name), 0) for name in COUNTERS}
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else None
+    return stats
+
+
+def reset_stats():
+    cache.delete_many([_counter_key(name) for name in COUNTERS])
@@ -0,0 +1,302 @@
+"""
+Registry of the reports served by /queries/query/<n>/.
+
+Each report declares its SQL, the typed parameters it reads from the query string with their defaults, and
+the club tables it depends on (used by the result cache). The SQL is compiled for the database backend once,
+when this module is imported at startup; parameters are bound by name from the validated query string.
+"""
+import logging
+import time
+from datetime import date, datetime, time as dt_time
+
+from django.conf import settings
+from django.db import connection, connections
+from django.utils import timezone
+
+from club.models import KEY_POSITIONS_MASK, POSITION_BITS
+from club.routers import read_database
+
+logger = logging.getLogger('queries_asked.reports')
+
+
+class InvalidReportParameter(ValueError):
+    """Raised when a query string value does not match the type of a report parameter"""
+
+
+def _parse_datetime(value, end_of_day=False):
+    parsed = datetime.fromisoformat(value)
+    if end_of_day and parsed.time() == dt_time.min and len(value) <= len('YYYY-MM-DD'):
+        # A date alone as an upper bound includes that whole day: the reports compare with BETWEEN
+        parsed = datetime.combine(parsed.date(), dt_time.max)
+    if settings.USE_TZ and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return connection.ops.adapt_datetimefield_value(parsed)
+
+
+class ReportParam:
+    """
+    A report parameter read from the query string.
+    The default is given in query string form; a private parameter is never read from the request and
+    always takes its default, which may be a callable.
+    """
+    TYPES = {
+        'int': (int, 'an integer'),
+        'date': (date.fromisoformat, 'a date (YYYY-MM-DD)'),
+        'datetime': (_parse_datetime, 'a date and time (YYYY-MM-DD HH:MM:SS)'),
+        # Upper bound of a range, see _parse_datetime
+        'end datetime': (lambda value: _parse_datetime(value, end_of_day=True),
+                         'a date, or a date and time (YYYY-MM-DD HH:MM:SS)'),
+    }
+
+    def __init__(self, name, type, default, label='', public=True):
+        if type not in self.TYPES:
+            raise ValueError(f'Unknown report parameter type {type!r}')
+        self.name = name
+        self.type = type
+        self.default = default
+        self.label = label or name
+        self.public = public
+
+    def raw_value(self, query_dict):
+        """The string value of this parameter in the request, or its default"""
+        value = query_dict.get(self.name) if self.public else None
+        if value in (None, ''):
+            value = self.default() if callable(self.default) else self.default
+        return str(value)
+
+    def clean(self, query_dict):
+        parse, description = self.TYPES[self.type]
+        try:
+            return parse(self.raw_value(query_dict).strip())
+        except ValueError:
+            raise InvalidReportParameter(f'Invalid {self.name}: expected {description}')
+
+
+def _member_age_sql(column):
+    """
+    Exact age in whole years of a DATE column as SQL for the current backend.
+    Reads today's date from the `today` parameter as a YYYYMMDD integer: in that encoding,
+    (today - birthdate) / 10000 is the number of full years elapsed.
+    """
+    if connection.vendor == 'mysql':
+        return f"((%(today)s - (YEAR({column}) * 10000 + MONTH({column}) * 100 + DAYOFMONTH({column}))) DIV 10000)"
+    return f"((%(today)s - CAST(strftime('%%Y%%m%%d', {column}) AS INTEGER)) / 10000)"
+
+
+# Values inlined into the SQL of the reports
+SQL_CONSTANTS = {
+    'setter': POSITION_BITS['Setter'],
+    'key_positions': KEY_POSITIONS_MASK,
+}
+
+
+class Report:
+    """A report query with its parameters and the tables it reads"""
+
+    def __init__(self, number, title, sql, tables, params=()):
+        self.number = number
+        self.title = title
+        self.tables = frozenset(tables)
+        self.params = params
+        self.sql = sql.format(age=_member_age_sql('cm.birthdate'), **SQL_CONSTANTS)
+
+    def clean_params(self, query_dict):
+        """Validated parameters keyed by name, ready to be bound to the SQL; raises InvalidReportParameter"""
+        return {param.name: param.clean(query_dict) for param in self.params}
+
+    def run(self, params, using=None):
+        """
+        Execute the report on the database using, by default the read replica when the caller allows it, and
+        return (columns, rows)
+        """
+        started = time.perf_counter()
+        with connections[using or read_database()].cursor() as cursor:
+            cursor.execute(self.sql, params)
+            rows = cursor.fetchall()
+            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        logger.info('Report %s returned %d rows in %.1fms', self.number, len(rows),
+                    (time.perf_counter() - started) * 1000)
+        return columns, rows
+
+
+START = ReportParam('start', 'datetime', '2019-01-01 00:00:00', 'From')
+END = ReportParam('end', 'end datetime', '2030-12-31 23:59:59', 'To')
+# Reference date of the age column
+TODAY = ReportParam('today', 'int', lambda: date.today().strftime('%Y%m%d'), public=False)
+
+REPORTS = {report.number: report for report in [
+    # Location information with general manager and member counts (maintained in club_locationstats)
+    Report(
+        '8', 'Location summary',
+        """
+        SELECT l.name, l.address, l.city, l.province, l.postal_code, l.phone, l.web_address, l.type, l.capacity,
+               ls.general_manager_name,
+               COALESCE(ls.minor_members, 0) AS num_minor_members,
+               COALESCE(ls.major_members, 0) AS num_major_members,
+               COALESCE(ls.team_count, 0) AS num_teams
+        FROM club_location l
+        LEFT JOIN club_locationstats ls ON ls.location_id = l.location_id
+        ORDER BY l.province, l.city
+        """,
+        tables={'club_location', 'club_locationstats'},
+    ),
+    # Secondary family member information for a given family member
+    Report(
+        '9', 'Family members',
+        """
+        SELECT sfm.first_name AS secondary_first_name, sfm.last_name AS secondary_last_name, 
+               sfm.phone AS secondary_phone, cm.member_id, cm.first_name, cm.last_name, 
+               cm.birthdate, cm.ssn, cm.medicare_number, cm.phone, cm.address, cm.city, 
+               cm.province, cm.postal_code, sfm.relationship_type
+        FROM club_familyrelationship fr
+        JOIN club_clubmember cm ON fr.minor_id = cm.member_id
+        LEFT JOIN club_secondaryfamilymember sfm ON sfm.minor_id = cm.member_id
+        WHERE fr.major_id = %(family_member)s
+        """,
+        tables={'club_familyrelationship', 'club_clubmember', 'club_secondaryfamilymember'},
+        params=(ReportParam('family_member', 'int', '101', 'Family member ID'),),
+    ),
+    # Sessions at a given location within a time period with coach and player details
+    Report(
+        '10', 'Session details',
+        """
+        SELECT p.first_name AS coach_first_name, p.last_name AS coach_last_name,
+               s.starts_at AS start_time,
+               s.session_type AS nature, st.team_name, st.score,
+               cm.first_name AS player_first_name, cm.last_name AS player_last_name, pa.position
+        FROM club_sessionteams st
+        JOIN club_sessions s ON st.session_id = s.session_id
+        JOIN club_personnel p ON st.head_coach_id = p.personnel_id
+        JOIN club_playerassignment pa ON st.team_id = pa.team_id
+        JOIN club_clubmember cm ON pa.member_id = cm.member_id
+        WHERE st.location_id = %(location)s
+          AND s.starts_at BETWEEN %(start)s AND %(end)s
+        ORDER BY s.starts_at
+        """,
+        tables={'club_sessionteams', 'club_sessions', 'club_personnel', 'club_playerassignment', 'club_clubmember'},
+        params=(ReportParam('location', 'int', '1', 'Location ID'), START, END),
+    ),
+    # Locations with at least 4 game sessions showing training and game statistics
+    Report(
+        '12', 'Location statistics',
+        """
+        SELECT l.name,
+               SUM(CASE WHEN s.session_type = 'training' THEN 1 ELSE 0 END) AS training_sessions,
+               SUM(CASE WHEN s.session_type = 'training' THEN st.player_count ELSE 0 END) AS training_players,
+               SUM(CASE WHEN s.session_type = 'game' THEN 1 ELSE 0 END) AS game_sessions,
+               SUM(CASE WHEN s.session_type = 'game' THEN st.player_count ELSE 0 END) AS game_players
+        FROM club_sessionteams st
+        JOIN club_sessions s ON st.session_id = s.session_id
+        JOIN club_location l ON st.location_id = l.location_id
+        WHERE s.starts_at BETWEEN %(start)s AND %(end)s
+        GROUP BY l.location_id, l.name
+        HAVING game_sessions >= 4
+        ORDER BY game_sessions DESC
+        """,
+        # st.player_count is maintained from club_playerassignment by updates that send no signal
+        tables={'club_sessionteams', 'club_sessions', 'club_location', 'club_playerassignment'},
+        params=(START, END),
+    ),
+    # Active members who have never been assigned to a team
+    Report(
+        '13', 'Unassigned members',
+        """
+        SELECT cm.member_id, cm.first_name, cm.last_name, 
+               {age} AS age,
+               cm.phone, cm.email, l.name
+        FROM club_clubmember cm
+        JOIN club_location l ON cm.location_id = l.location_id
+        LEFT JOIN club_playerassignment pa ON cm.member_id = pa.member_id
+        WHERE cm.activity = 1 AND pa.member_id IS NULL
+        ORDER BY l.name, age
+        """,
+        tables={'club_clubmember', 'club_location', 'club_playerassignment'},
+        params=(TODAY,),
+    ),
+    # Active adult members with joining date and age
+    Report(
+        '14', 'Adult members',
+        """
+        SELECT cm.member_id, cm.first_name, cm.last_name,
+               MIN(p.payment_date) AS date_of_joining,
+               {age} AS age,
+               cm.phone, cm.email, l.name
+        FROM club_clubmember cm
+        JOIN club_payments p ON cm.member_id = p.member_id
+        JOIN club_location l ON cm.location_id = l.location_id
+        WHERE cm.activity = 1 AND cm.minor = 0
+        GROUP BY cm.member_id, cm.first_name, cm.last_name, cm.birthdate, cm.phone, cm.email, l.name
+        ORDER BY l.name, age
+        """,
+        tables={'club_clubmember', 'club_payments', 'club_location'},
+        params=(TODAY,),
+    ),
+    # Active members who only play Setter position
+    Report(
+        '15', 'Setter-only players',
+        """
+        SELECT cm.member_id, cm.first_name, cm.last_name,
+               {age} AS age,
+               cm.phone, cm.email, l.name AS location_name
+        FROM club_memberplaystats ps
+        JOIN club_clubmember cm ON ps.member_id = cm.member_id
+        JOIN club_location l ON cm.location_id = l.location_id
+        WHERE cm.activity = 1
+          AND (ps.game_positions | ps.training_positions) = {setter}
+        ORDER BY l.name, cm.member_id
+        """,
+        # Positions played are read from club_memberplaystats, maintained from the rosters
+        tables={'club_clubmember', 'club_location', 'club_memberplaystats'},
+        params=(TODAY,),
+    ),
+    # Active members who have played all 4 key positions in games
+    Report(
+        '16', 'Versatile players',
+        """
+        SELECT cm.member_id, cm.first_name, cm.last_name,
+               {age} AS age,
+               cm.phone, cm.email, l.name AS location_name
+        FROM club_memberplaystats ps
+        JOIN club_clubmember cm ON ps.member_id = cm.member_id
+        JOIN club_location l ON cm.location_id = l.location_id
+        WHERE cm.activity = 1
+          AND (ps.game_positions & {key_positions}) = {key_positions}
+        ORDER BY l.name, cm.member_id
+        """,
+        tables={'club_clubmember', 'club_location', 'club_memberplaystats'},
+        params=(TODAY,),
+    ),
+    # Family members who are also personnel coaching at a location
+    Report(
+        '17', 'Family personnel',
+        """
+        SELECT DISTINCT fm.first_name, fm.last_name, fm.phone
+        FROM club_familymember fm
+        JOIN club_personnel p ON p.ssn = fm.ssn
+        JOIN club_sessionteams st ON st.head_coach_id = p.personnel_id
+        JOIN club_clubmember cm ON cm.location_id = st.location_id AND cm.activity = 1
+        WHERE cm.location_id = %(location)s
+        """,
+        tables={'club_familymember', 'club_personnel', 'club_sessionteams', 'club_clubmember'},
+        params=(ReportParam('location', 'int', '1', 'Location ID'),),
+    ),
+    # Active members who have only played in winning teams
+    Report(
+        '18', 'Winning players',
+        """
+        SELECT cm.member_id, cm.first_name, cm.last_name,
+               {age} AS age,
+               cm.phone, cm.email, l.name AS location_name
+        FROM club_memberplaystats ps
+        JOIN club_clubmember cm ON ps.member_id = cm.member_id
+        JOIN club_location l ON cm.location_id = l.location_id
+        WHERE cm.activity = 1
+          AND ps.games_played > 0
+          AND ps.losses = 0
+        ORDER BY l.name, cm.member_id
+        """,
+        # Games played and lost are read from club_memberplaystats, maintained from the rosters and outcomes
+        tables={'club_clubmember', 'club_location', 'club_memberplaystats'},
+        params=(TODAY,),
+    ),
+]}
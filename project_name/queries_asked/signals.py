@@ -0,0 +1,18 @@
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+
+from .cache import invalidate_tables
+from .reports import REPORTS
+
+
+def _invalidate_reports(sender, using, **kwargs):
+    invalidate_tables([sender._meta.db_table], using=using)
+
+
+# Tables read by at least one report
+REPORT_TABLES = set().union(*(report.tables for report in REPORTS.values()))
+
+for model in apps.get_models():
+    if model._meta.db_table in REPORT_TABLES:
+        post_save.connect(_invalidate_reports, sender=model, dispatch_uid=f'report_cache_save_{model.__name__}')
+        post_delete.connect(_invalidate_reports, sender=model, dispatch_uid=f'report_cache_delete_{model.__name__}')
@@ -1,3 +1,274 @@
-from django.test import TestCase
+import csv
+import json
+import re
+import unittest
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from club.models import (
+    ClubMember, Location, LocationStats, Payments, Personnel, PersonnelAssignment, PlayerAssignment, Sessions,
+    SessionTeams
+)
+from django.core.cache import cache
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, Client
+from django.urls import reverse
+from queries_asked.cache import reset_stats
+from queries_asked.reports import REPORTS
+
+
+class ReportQueryTestCase(TestCase):
+    """Test the report queries served by query_view"""
+
+    def setUp(self):
+        cache.clear()
+        reset_stats()
+        self.client = Client()
+        self.location = Location.objects.create(
+            name='Test Location',
+            type='head',
+            address='123 Test St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            phone='514-555-0100',
+            capacity=100
+        )
+        self.manager = Personnel.objects.create(
+            first_name='Gina',
+            last_name='Manager',
+            birthdate=date(1975, 1, 1),
+            ssn='900-00-0001',
+            medicare_number='REPORT0001',
+            phone='514-555-0900',
+            address='1 Manager St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            email='manager@test.com'
+        )
+        PersonnelAssignment.objects.create(
+            personnel=self.manager,
+            location=self.location,
+            assignment_id=1,
+            role='general manager',
+            mandate='salaried',
+            start_date=date(2020, 1, 1)
+        )
+        self.member = ClubMember.objects.create(
+            first_name='Report',
+            last_name='Member',
+            birthdate=date(1990, 1, 1),
+            ssn='900-00-1001',
+            medicare_number='REPORT1001',
+            phone='514-555-0901',
+            address='1 Report St',
+            city='Montreal',
+            province='Quebec',
+            postal_code='H1A 1A1',
+            email='report@test.com',
+            height=170,
+            weight=60,
+            location=self.location,
+            gender='F',
+            minor=False,
+            activity=True
+        )
+
+    def _run(self, query_number, **params):
+        response = self.client.get(reverse('queries_asked:query', args=[query_number]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['columns'], response.context['rows']
+
+    def test_query_8_location_summary(self):
+        columns, rows = self._run('8')
+        row = dict(zip(columns, rows[0]))
+        self.assertEqual(row['general_manager_name'], 'Gina Manager')
+        self.assertEqual(row['num_minor_members'], 0)
+        self.assertEqual(row['num_major_members'], 1)
+        self.assertEqual(row['num_teams'], 0)
+
+    def test_query_13_age_is_computed_in_sql(self):
+        columns, rows = self._run('13')
+        row = dict(zip(columns, rows[0]))
+        today = date.today()
+        self.assertEqual(row['age'], today.year - 1990 - ((today.month, today.day) < (1, 1)))
+
+    def _game(self, session_date, team_number=1, session_type='game'):
+        session = Sessions.objects.create(
+            session_type=session_type,
+            session_date=session_date,
+            session_time='18:00',
+            address='1 Gym St'
+        )
+        team = SessionTeams.objects.create(
+            session=session,
+            team_name=f'Team {session_date}',
+            location=self.location,
+            head_coach=self.manager,
+            team_number=team_number,
+            gender='F'
+        )
+        PlayerAssignment.objects.create(team=team, member=self.member, position='Setter')
+        return team
+
+    def test_query_12_date_range(self):
+        for day in range(1, 5):
+            self._game(date(2024, 3, day))
+        # Outside the report's date range
+        self._game(date(2031, 1, 1))
+        columns, rows = self._run('12')
+        row = dict(zip(columns, rows[0]))
+        self.assertEqual(row['name'], 'Test Location')
+        self.assertEqual(row['game_sessions'], 4)
+        self.assertEqual(row['game_players'], 4)
+
+    def test_date_only_end_includes_the_whole_day(self):
+        # The game starts at 18:00 on the end date
+        self._game(date(2024, 6, 30))
+        columns, rows = self._run('10', location=self.location.pk, start='2024-06-01', end='2024-06-30')
+        self.assertEqual(len(rows), 1)
+        columns, rows = self._run('10', location=self.location.pk, start='2024-06-01', end='2024-06-30 12:00:00')
+        self.assertEqual(rows, [])
+
+    def test_repeated_report_is_served_from_cache(self):
+        self._run('13')
+        with self.assertNumQueries(0):
+            columns, rows = self._run('13')
+        self.assertEqual(rows[0][1], 'Report')
+
+        stats = self.client.get(reverse('queries_asked:cache_stats')).json()
+        self.assertEqual(stats, {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_only_dependent_reports_are_invalidated(self):
+        self._run('13')
+        self._run('8')
+        # Report 13 reads neither payments nor the location statistics, report 8 reads the latter
+        with self.captureOnCommitCallbacks(execute=True):
+            Payments.objects.create(member=self.member, payment_date=date(2024, 1, 1), amount=Decimal('200.00'),
+                                    payment_method='cash', membership_year=2024)
+            LocationStats.objects.get(location=self.location).save()
+        with self.assertNumQueries(0):
+            self._run('13')
+        with self.assertNumQueries(1):
+            self._run('8')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member.first_name = 'Renamed'
+            self.member.save()
+        columns, rows = self._run('13')
+        self.assertEqual(rows[0][1], 'Renamed')
+
+    def test_invalidation_waits_for_the_commit(self):
+        self._run('13')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.member.first_name = 'Renamed'
+            self.member.save()
+        # Until the write commits, a result cached from the rows before it stays valid
+        with self.assertNumQueries(0):
+            self._run('13')
+        for callback in callbacks:
+            callback()
+        columns, rows = self._run('13')
+        self.assertEqual(rows[0][1], 'Renamed')
+
+    def test_csv_and_ndjson_exports_stream_every_row(self):
+        for day in range(1, 6):
+            self._game(date(2024, 3, day))
+        # A batch size smaller than the result makes the export fetch several batches
+        with mock.patch('queries_asked.views.EXPORT_BATCH_SIZE', 2):
+            response = self.client.get(reverse('queries_asked:query', args=['10']), {'format': 'csv'})
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+            lines = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+            self.assertEqual(lines[0][:2], ['coach_first_name', 'coach_last_name'])
+            self.assertEqual(len(lines), 6)
+
+            response = self.client.get(reverse('queries_asked:query', args=['10']), {'format': 'ndjson'})
+            records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+            self.assertEqual(len(records), 5)
+            self.assertEqual(records[0]['position'], 'Setter')
+
+    def test_unknown_export_format_is_rejected(self):
+        response = self.client.get(reverse('queries_asked:query', args=['8']), {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_parameters_are_read_from_the_query_string(self):
+        self._game(date(2024, 3, 1))
+        self._game(date(2025, 6, 1))
+        columns, rows = self._run('10', location=self.location.pk, start='2025-01-01', end='2025-12-31 23:59:59')
+        self.assertEqual([row[columns.index('team_name')] for row in rows], ['Team 2025-06-01'])
+        columns, rows = self._run('10', location=self.location.pk + 1)
+        self.assertEqual(rows, [])
+
+    def test_invalid_parameters_are_rejected(self):
+        response = self.client.get(reverse('queries_asked:query', args=['10']), {'location': 'abc'})
+        self.assertContains(response, 'Invalid location', status_code=400)
+        response = self.client.get(reverse('queries_asked:query', args=['12']), {'start': '2024-13-01'})
+        self.assertEqual(response.status_code, 400)
+        # Private parameters cannot be overridden from the request
+        columns, rows = self._run('13', today='20000101')
+        self.assertGreater(rows[0][columns.index('age')], 10)
+
+    def test_query_18_excludes_members_who_lost_a_game(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            team = self._game(date(2024, 3, 1))
+            opponent = SessionTeams.objects.create(session=team.session, team_name='Opponent',
+                                                   location=self.location, head_coach=self.manager, team_number=2,
+                                                   gender='F', score=1)
+            team.score = 3
+            team.save()
+        columns, rows = self._run('18')
+        self.assertEqual([row[columns.index('member_id')] for row in rows], [self.member.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            opponent.score = 5
+            opponent.save()
+        columns, rows = self._run('18')
+        self.assertEqual(rows, [])
+
+    def test_query_15_and_16_read_positions_played(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._game(date(2024, 3, 1))
+        columns, rows = self._run('15')
+        self.assertEqual([row[columns.index('member_id')] for row in rows], [self.member.pk])
+        columns, rows = self._run('16')
+        self.assertEqual(rows, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for day, position in enumerate(['Libero', 'Outside Hitter', 'Opposite Hitter'], start=2):
+                assignment = self._game(date(2024, 3, day)).playerassignment_set.get()
+                assignment.position = position
+                assignment.save()
+        columns, rows = self._run('15')
+        self.assertEqual(rows, [])
+        columns, rows = self._run('16')
+        self.assertEqual([row[columns.index('member_id')] for row in rows], [self.member.pk])
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Reads SQLite query plans')
+class ReportQueryPlanTestCase(TestCase):
+    """
+    Check that every report can reach the rows it needs through an index.
+    The test database has no ANALYZE statistics, so the planner uses an index whenever one matches the
+    predicates: a full scan here means the index is missing. With statistics of a real dataset, SQLite may
+    still prefer a scan when a report reads most of a table, which is the cheaper plan then.
+    """
+    # Tables with a few rows per location, scanning them is cheaper than any index
+    SMALL_TABLES = {'club_location', 'club_locationstats'}
+
+    def _full_scans(self, report):
+        aliases = {alias: table for table, alias in re.findall(r'(?:FROM|JOIN)\s+(\w+)\s+(\w+)', report.sql)}
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + report.sql, report.clean_params(QueryDict()))
+            details = [row[-1] for row in cursor.fetchall()]
+        # "SCAN cm" on SQLite 3.36+, "SCAN TABLE club_clubmember AS cm" before; subqueries and constants are skipped
+        scanned = (re.match(r'SCAN (?:TABLE )?(\w+)', detail) for detail in details)
+        return {aliases.get(match[1], match[1]) for match in scanned if match} - self.SMALL_TABLES
+
+    def test_reports_do_not_scan_large_tables(self):
+        for number, report in REPORTS.items():
+            with self.subTest(report=number):
+                self.assertEqual(self._full_scans(report), set())
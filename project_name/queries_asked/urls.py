@@ -10,5 +10,6 @@ urlpatterns = [
     path('migrate/', views.migrate_view, name='migrate'),
     path('createsuperuser/', views.createsuperuser_view, name='createsuperuser'),
     path('raw-sql/', views.raw_sql_query_view, name='raw_sql_query'),
+    path('cache-stats/', views.cache_stats_view, name='cache_stats'),
     path('query/<str:query_number>/', views.query_view, name='query'),
 ]